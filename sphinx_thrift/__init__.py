@@ -3,17 +3,69 @@ from typing import Dict, Any
 from sphinx.application import Sphinx
 from sphinx.domains.std import StandardDomain
 
+from sphinx_thrift.cache import ThriftError, load_modules
+
 __version__ = '0.1.0'
 
 
 def setup(app: Sphinx) -> Dict[str, Any]:
-    from sphinx_thrift.documenter import ThriftModuleDocumenter
-    from sphinx_thrift.domain import ThriftDomain
+    from sphinx_thrift.builders import ThriftJSONBuilder
+    from sphinx_thrift.details import (add_script, defer_method_details,
+                                       depart_method_details, method_details,
+                                       visit_method_details)
+    from sphinx_thrift.documenter import (ThriftModuleDocumenter,
+                                          ThriftAutoModuleDirective,
+                                          ThriftAutoGraphDirective,
+                                          prune_cache)
+    from sphinx_thrift.domain import (ExpandMemberTables, ThriftDomain,
+                                      get_updated_docs, process_used_by)
+    from sphinx_thrift.manifest import write_build_manifest
+    from sphinx_thrift.scheduler import compile_modules
+    from sphinx_thrift.shards import (load_document, outdated_documents,
+                                      write_inventory)
 
     app.add_autodocumenter(ThriftModuleDocumenter)
+    app.add_directive(
+        'autothrift_module', ThriftAutoModuleDirective, override=True)
+    app.add_directive('autothrift_graph', ThriftAutoGraphDirective)
     app.add_domain(ThriftDomain)
+    app.add_post_transform(ExpandMemberTables)
+    app.add_builder(ThriftJSONBuilder)
+    app.add_node(
+        method_details, html=(visit_method_details, depart_method_details))
+    app.add_config_value('thrift_cache_dir', None, 'env')
+    app.add_config_value('thrift_cache_size', None, '')
+    app.add_config_value('thrift_compiler', 'thrift', 'env')
+    app.add_config_value('thrift_compile_jobs', None, '')
+    app.add_config_value('thrift_compile_timeout', None, '')
+    app.add_config_value('thrift_render_nodes', False, 'env')
+    app.add_config_value('thrift_table_threshold', None, 'env')
+    app.add_config_value('thrift_show_used_by', True, 'env')
+    app.add_config_value('thrift_constant_max_items', 10, 'env')
+    app.add_config_value('thrift_constant_max_length', 200, 'env')
+    app.add_config_value('thrift_dot', 'dot', 'env')
+    app.add_config_value('thrift_symbol_db', None, 'env')
+    app.add_config_value('thrift_shard', None, 'env')
+    app.add_config_value('thrift_shard_inventories', [], '')
+    app.add_config_value('thrift_lazy_methods', None, 'html')
+    app.add_config_value('thrift_manifest', None, '')
+    app.connect('env-before-read-docs', compile_modules)
+    app.connect('env-get-updated', get_updated_docs)
+    app.connect('doctree-resolved', process_used_by)
+    app.connect('build-finished', prune_cache)
+    app.connect('env-get-outdated', outdated_documents)
+    app.connect('doctree-read', load_document)
+    app.connect('build-finished', write_inventory)
+    app.connect('doctree-resolved', defer_method_details)
+    app.connect('builder-inited', add_script)
+    # after everything else writing to the output directory
+    app.connect('build-finished', write_build_manifest, priority=900)
     StandardDomain.initial_data['labels']['thrift-modindex'] = (
         'thrift-modindex', '', 'Thrift Index')
     StandardDomain.initial_data['anonlabels']['thrift-modindex'] = (
         'thrift-modindex', '')
-    return {'version': __version__}
+    return {
+        'version': __version__,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True
+    }
@@ -0,0 +1,374 @@
+"""A compact binary format of `thrift_ast.Module` decoded on demand.
+
+Layout, all integers little endian::
+
+    header      magic, format version, number of strings and the offsets of
+                the sections below
+    strings     offsets of every string, then their UTF-8 bytes; every
+                distinct string of the module is stored once
+    module      name, doc and namespaces of the module
+    index       for constants, typedefs, enums, structs and services in
+                turn: their number, then name, offset, length and digest of
+                each definition
+    references  the references made by the module, see `references`
+    data        the definitions, one after the other
+
+Values are tagged: ``None``, booleans, integers (zigzag varints), strings
+(varint ids in the string table), lists and AST objects (varint class id
+followed by the attributes in declaration order). A reader only parses the
+header and the index up front; definitions are decoded when first accessed,
+so a page whose definitions all come from the fragment cache decodes none
+of them. The digest of a definition identifies its content without
+decoding it.
+"""
+from typing import (Any, Dict, Iterator, List, Optional, Sequence, Tuple,
+                    Union, overload)
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+import attr
+
+import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.references import Referrer, Target, module_references
+
+MAGIC = b'THAS'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHxxIIIIII')
+_COUNT = struct.Struct('<I')
+_ENTRY = struct.Struct('<III20s')
+
+KINDS = ('constants', 'typedefs', 'enums', 'structs', 'services')
+
+# AST classes by id; append new classes at the end and bump FORMAT_VERSION
+# when changing the attributes of one
+_CLASSES: Tuple[type, ...] = (ast.ListType, ast.SetType, ast.MapType,
+                              ast.ReferenceType, ast.Namespace,
+                              ast.EnumMember, ast.Enum, ast.Typedef,
+                              ast.Field, ast.Struct, ast.ConstantValue,
+                              ast.Constant, ast.Function, ast.Service)
+_CLASS_IDS = {cls: i for i, cls in enumerate(_CLASSES)}
+_ATTRIBUTES = [tuple(a.name for a in attr.fields(cls)) for cls in _CLASSES]
+
+_NONE, _FALSE, _TRUE, _INT, _STR, _LIST, _OBJECT = range(7)
+
+# files are mapped where a mapping does not keep the file from being
+# replaced; before Python 3.13 (without ``trackfd``) every mapping also keeps
+# a duplicate of its file descriptor open until it is freed
+_MMAP = os.name == 'posix'
+_TRACKFD = sys.version_info >= (3, 13)
+
+
+class FormatError(Exception):
+    pass
+
+
+def definition_digest(definition: Any) -> bytes:
+    """Identifies the content of ``definition``, equal for equal
+    definitions of any module."""
+    return hashlib.sha1(repr(definition).encode('utf-8')).digest()
+
+
+class _Encoder:
+    def __init__(self) -> None:
+        self.strings: Dict[str, int] = {}
+
+    def _varint(self, out: bytearray, n: int) -> None:
+        while n >= 0x80:
+            out.append(n & 0x7f | 0x80)
+            n >>= 7
+        out.append(n)
+
+    def value(self, out: bytearray, value: Any) -> None:
+        if value is None:
+            out.append(_NONE)
+        elif value is True or value is False:
+            out.append(_TRUE if value else _FALSE)
+        elif isinstance(value, int):
+            out.append(_INT)
+            self._varint(out, value << 1 if value >= 0 else (~value << 1) | 1)
+        elif isinstance(value, str):
+            out.append(_STR)
+            self._varint(out, self.strings.setdefault(value,
+                                                      len(self.strings)))
+        elif isinstance(value, (list, tuple)):
+            out.append(_LIST)
+            self._varint(out, len(value))
+            for item in value:
+                self.value(out, item)
+        else:
+            try:
+                class_id = _CLASS_IDS[value.__class__]
+            except KeyError:
+                raise FormatError(
+                    f'cannot encode {value.__class__.__name__}') from None
+            out.append(_OBJECT)
+            self._varint(out, class_id)
+            for name in _ATTRIBUTES[class_id]:
+                self.value(out, getattr(value, name))
+
+    def encoded(self, value: Any) -> bytearray:
+        out = bytearray()
+        self.value(out, value)
+        return out
+
+
+def encode_module(module: ast.Module) -> bytes:
+    """``module`` in the binary format."""
+    encoder = _Encoder()
+    module_data = encoder.encoded(
+        [module.name, module.doc, module.namespaces])
+    references = encoder.encoded([[*target, role, list(key)]
+                                  for target, (role, key)
+                                  in module_references(module)])
+    index = bytearray()
+    data = bytearray()
+    for kind in KINDS:
+        definitions = getattr(module, kind)
+        index += _COUNT.pack(len(definitions))
+        for definition in definitions:
+            encoded = encoder.encoded(definition)
+            name = encoder.strings.setdefault(definition.name,
+                                              len(encoder.strings))
+            index += _ENTRY.pack(name, len(data), len(encoded),
+                                 definition_digest(definition))
+            data += encoded
+    strings = [s.encode('utf-8') for s in encoder.strings]
+    string_offsets = bytearray()
+    offset = 0
+    for s in strings:
+        string_offsets += _COUNT.pack(offset)
+        offset += len(s)
+    string_offsets += _COUNT.pack(offset)
+
+    sections = [string_offsets + b''.join(strings), module_data, index,
+                references, data]
+    offsets = []
+    position = _HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(strings), *offsets)
+    return header + b''.join(sections)
+
+
+class Definitions(Sequence[Any]):
+    """The definitions of one kind of a `ModuleFile`, decoded when first
+    accessed."""
+
+    def __init__(self, file: 'ModuleFile',
+                 entries: List[Tuple[int, int, int, bytes]]) -> None:
+        self.file = file
+        self._entries = entries
+        self._decoded: List[Any] = [None] * len(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @overload
+    def __getitem__(self, index: int) -> Any:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Any]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        definition = self._decoded[index]
+        if definition is None:
+            _, offset, _, _ = self._entries[index]
+            definition = self.file.decode(self.file.data_offset + offset)
+            self._decoded[index] = definition
+        return definition
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def name(self, index: int) -> str:
+        return self.file.string(self._entries[index][0])
+
+    def digest(self, index: int) -> bytes:
+        """`definition_digest` of a definition, without decoding it."""
+        return self._entries[index][3]
+
+    def decoded(self) -> int:
+        """The number of definitions decoded so far."""
+        return sum(d is not None for d in self._decoded)
+
+    def __add__(self, other: Any) -> List[Any]:
+        # concatenates like the lists of a parsed module
+        return list(self) + list(other)
+
+    def __radd__(self, other: Any) -> List[Any]:
+        return list(other) + list(self)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def __reduce__(self) -> Any:
+        return list, (list(self), )
+
+
+class ModuleFile:
+    """Reads a module in the binary format from ``buffer``, like a memory
+    map of the file, decoding only what is accessed."""
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap]) -> None:
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        if len(buffer) < _HEADER.size:
+            raise FormatError('truncated header')
+        (magic, version, count, self._strings_offset, module_offset,
+         index_offset, self._references_offset,
+         self.data_offset) = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise FormatError('not a module of this format version')
+        # sections are checked to be in place up front, as definitions are
+        # decoded long after a corrupt file could be compiled again
+        self._string_data = self._strings_offset + (count + 1) * 4
+        if not (_HEADER.size == self._strings_offset <= self._string_data <=
+                module_offset <= index_offset <= self._references_offset <=
+                self.data_offset <= len(buffer)):
+            raise FormatError('truncated or corrupt sections')
+        string_size, = _COUNT.unpack_from(buffer,
+                                          self._string_data - _COUNT.size)
+        if self._string_data + string_size != module_offset:
+            raise FormatError('truncated or corrupt strings')
+        self._strings: List[Optional[str]] = [None] * count
+        self.name, self.doc, self.namespaces = self.decode(module_offset)
+        self._entries: Dict[str, List[Tuple[int, int, int, bytes]]] = {}
+        position = index_offset
+        for kind in KINDS:
+            if position + _COUNT.size > self._references_offset:
+                raise FormatError('truncated index')
+            n, = _COUNT.unpack_from(buffer, position)
+            if position + n * _ENTRY.size > self._references_offset:
+                raise FormatError('truncated index')
+            position += _COUNT.size
+            self._entries[kind] = [
+                _ENTRY.unpack_from(buffer, position + i * _ENTRY.size)
+                for i in range(n)
+            ]
+            position += n * _ENTRY.size
+        size = len(buffer) - self.data_offset
+        if any(offset + length > size or name >= count
+               for entries in self._entries.values()
+               for name, offset, length, _ in entries):
+            raise FormatError('truncated data')
+
+    @classmethod
+    def open(cls, path: str) -> 'ModuleFile':
+        """Map the file at ``path``, or read it where it cannot be
+        mapped."""
+        with open(path, 'rb') as f:
+            if not _MMAP:
+                return cls(f.read())
+            try:
+                if _TRACKFD:
+                    buffer = mmap.mmap(f.fileno(),
+                                       0,
+                                       access=mmap.ACCESS_READ,
+                                       trackfd=False)  # type: ignore
+                else:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                raise FormatError('truncated header') from None
+            except OSError:
+                # out of file descriptors, held by the mappings of older
+                # Pythons
+                return cls(f.read())
+        return cls(buffer)
+
+    def string(self, index: int) -> str:
+        s = self._strings[index]
+        if s is None:
+            start, end = struct.unpack_from('<II', self.buffer,
+                                            self._strings_offset + index * 4)
+            s = str(self.view[self._string_data + start:self._string_data +
+                              end], 'utf-8')
+            if len(s) < 64:
+                # names and types, shared with the parsed modules
+                s = sys.intern(s)
+            self._strings[index] = s
+        return s
+
+    def decode(self, offset: int) -> Any:
+        """The value encoded at ``offset``."""
+        return _Decoder(self, offset).value()
+
+    def definitions(self, kind: str) -> Definitions:
+        return Definitions(self, self._entries[kind])
+
+    def module(self) -> ast.Module:
+        """The module, with definitions decoded when first accessed."""
+        lists = {kind: self.definitions(kind) for kind in KINDS}
+        return ast.Module(self.name, self.namespaces, lists['enums'],
+                          lists['typedefs'], lists['structs'],
+                          lists['constants'], lists['services'], self.doc)
+
+    def references(self) -> List[Tuple[Target, Referrer]]:
+        """The result of `module_references` for the module, stored when
+        the file was written."""
+        return [((module, name), (role, (key[0], key[1], key[2])))
+                for module, name, role, key in self.decode(
+                    self._references_offset)]
+
+
+class _Decoder:
+    def __init__(self, file: ModuleFile, offset: int) -> None:
+        self.file = file
+        self.buffer = file.buffer
+        self.position = offset
+
+    def _varint(self) -> int:
+        buffer = self.buffer
+        n = shift = 0
+        while True:
+            byte = buffer[self.position]
+            self.position += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def value(self) -> Any:
+        tag = self.buffer[self.position]
+        self.position += 1
+        if tag == _STR:
+            return self.file.string(self._varint())
+        if tag == _OBJECT:
+            class_id = self._varint()
+            return _CLASSES[class_id](
+                *[self.value() for _ in _ATTRIBUTES[class_id]])
+        if tag == _LIST:
+            return [self.value() for _ in range(self._varint())]
+        if tag == _INT:
+            n = self._varint()
+            return ~(n >> 1) if n & 1 else n >> 1
+        if tag == _NONE:
+            return None
+        if tag == _FALSE or tag == _TRUE:
+            return tag == _TRUE
+        raise FormatError(f'unknown tag {tag} at {self.position - 1}')
+
+
+def stored_references(module: ast.Module
+                      ) -> Optional[List[Tuple[Target, Referrer]]]:
+    """The references of a module read from a `ModuleFile`, without decoding
+    its definitions; ``None`` for other modules."""
+    if isinstance(module.enums, Definitions):
+        return module.enums.file.references()
+    return None
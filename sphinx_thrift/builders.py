@@ -0,0 +1,89 @@
+from typing import AbstractSet, Any, Dict, Iterable, Optional
+
+import json
+import os
+
+from sphinx.builders import Builder
+from sphinx.util import logging
+
+from sphinx_thrift.cache import ThriftError
+from sphinx_thrift.documenter import module_cache
+from sphinx_thrift.domain import (ObjectKey, anchor, split_version,
+                                  thrift_domain, versioned_key)
+from sphinx_thrift.store import Record, module_records
+
+logger = logging.getLogger(__name__)
+
+
+class ThriftJSONBuilder(Builder):
+    """Writes the documented thrift objects as JSON lines.
+
+    Documents are read as for any other builder, so that the domain knows
+    every object and the page defining it, but nothing is rendered: the
+    write phase is skipped and ``thrift.jsonl`` in the output directory gets
+    one object per line, with its page and anchor and, for objects coming
+    from ``autothrift_module``, the docs and types of its definition.
+    """
+    name = 'thriftjson'
+    format = 'json'
+    epilog = 'The thrift objects are in %(outdir)s/thrift.jsonl.'
+    allow_parallel = True
+    out_suffix = '.html'
+
+    def init(self) -> None:
+        pass
+
+    def get_outdated_docs(self) -> Iterable[str]:
+        # the dump covers all documents, it is rewritten on every build
+        return []
+
+    def get_target_uri(self, docname: str, typ: Optional[str] = None) -> str:
+        return docname + self.out_suffix
+
+    def write_documents(self, docnames: AbstractSet[str]) -> None:
+        pass
+
+    def prepare_writing(self, docnames: AbstractSet[str]) -> None:
+        pass
+
+    def write_doc(self, docname: str, doctree: Any) -> None:
+        pass
+
+    def _module_records(self) -> Dict[ObjectKey, Record]:
+        records: Dict[ObjectKey, Record] = {}
+        cache = module_cache(self.env)
+        sources = self.env.domaindata['thrift']['sources']
+        for qualified, (_, filename) in sources.items():
+            try:
+                module = cache.load(filename)
+            except ThriftError as e:
+                logger.warning('%s', e, location=filename)
+                continue
+            version = split_version(qualified)[0]
+            records.update((versioned_key(key, version), record)
+                           for key, record in module_records(module))
+        return records
+
+    def finish(self) -> None:
+        records = self._module_records()
+        objects = sorted(thrift_domain(self.env).objects.items(),
+                         key=lambda item: (item[0][0] or '', ) + item[0][1:])
+        path = os.path.join(self.outdir, 'thrift.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for key, docname in objects:
+                module, name, kind = key
+                if module is None:
+                    version, name = split_version(name)
+                else:
+                    version, module = split_version(module)
+                record = {
+                    'kind': kind,
+                    'version': version,
+                    'module': module,
+                    'name': name,
+                    'docname': docname,
+                    'uri': self.get_target_uri(docname),
+                    'anchor': anchor(key)
+                }
+                record.update(records.get(key, {}))
+                f.write(json.dumps(record, default=str) + '\n')
@@ -0,0 +1,502 @@
+from typing import (IO, Any, Callable, Dict, Iterable, Iterator, List,
+                    Optional, Tuple, Union)
+
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+from subprocess import DEVNULL, PIPE, Popen, TimeoutExpired, run
+
+import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.binary import FormatError, ModuleFile, encode_module
+from sphinx_thrift.parser import CHUNK_SIZE, load_module, parse_stream
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+CACHE_VERSION = '6'
+
+include_re = re.compile(r'^\s*include\s+["\']([^"\']+)["\']', re.MULTILINE)
+# a problem reported by the thrift compiler, like ``[FAILURE:x.thrift:3] ...``
+diagnostic_re = re.compile(
+    r'^\[(?:FAILURE|ERROR|WARNING):(.+?):(\d+)\]\s*(.*)$', re.MULTILINE)
+
+# modules parsed by this process by key, shared by all files with the same
+# key, and the key last loaded for each absolute path; long running processes
+# (like ``sphinx-thrift watch``) get unchanged modules from here without
+# touching the disk cache, and identical modules of several source trees
+# (like the IDL of several releases) are loaded once
+_memory: Dict[str, ast.Module] = {}
+_paths: Dict[str, str] = {}
+# modules that failed to compile in this process by key, so that a module
+# used on several pages (or timing out) is not compiled again for each;
+# cleared when a build starts
+_failures: Dict[str, 'ThriftError'] = {}
+
+
+class ThriftError(Exception):
+    def __init__(self, filename: str, message: str) -> None:
+        super().__init__(filename, message)
+        self.filename = filename
+        self.message = message
+
+    def __str__(self) -> str:
+        return f'{self.filename}: {self.message}'
+
+    def diagnostics(self) -> List[Tuple[Optional[str], str]]:
+        """``(location, message)`` of every problem the compiler reported,
+        located as ``path:line``; the whole message without a location when
+        the compiler named none."""
+        found: List[Tuple[Optional[str], str]] = [
+            (f'{path}:{line}', message)
+            for path, line, message in diagnostic_re.findall(self.message)
+        ]
+        return found or [(None, str(self))]
+
+
+def clear_failures() -> None:
+    """Compile the modules that failed again when they are next loaded."""
+    _failures.clear()
+
+
+def includes(filename: str) -> List[str]:
+    """Paths of the modules directly included by ``filename``."""
+    with open(filename, encoding='utf-8') as f:
+        try:
+            source = f.read()
+        except UnicodeDecodeError as e:
+            raise ThriftError(filename, f'not UTF-8: {e}') from e
+    directory = os.path.dirname(filename)
+    return [
+        os.path.normpath(os.path.join(directory, inc))
+        for inc in include_re.findall(source)
+    ]
+
+
+@contextlib.contextmanager
+def locked(directory: str, name: str,
+           blocking: bool = True) -> Iterator[bool]:
+    """Hold the lock ``name`` of the cache ``directory``.
+
+    Locks are files in ``directory/locks`` locked with ``flock``, so they
+    are shared by all processes using the directory and released when a
+    process dies. Lock files are never removed, as removing a file someone
+    holds a lock on would let the next process lock a new file at the same
+    path. Yields whether the lock was acquired, which is always the case
+    when ``blocking``. Without ``fcntl`` nothing is locked.
+    """
+    if fcntl is None:
+        yield True
+        return
+    path = os.path.join(directory, 'locks', name + '.lock')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def atomic_write(path: str, write: Callable[[IO[bytes]], Any]) -> None:
+    """Write ``path`` through a temporary file renamed into place, so that
+    concurrent readers see either no file or the complete one."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+
+def touch(path: str) -> None:
+    """Mark a cache entry as used, entries are collected least recently used
+    first."""
+    with contextlib.suppress(OSError):
+        os.utime(path)
+
+
+def parse_size(size: str) -> int:
+    """Bytes in ``size``, a number optionally followed by K, M or G."""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    size = size.strip().upper().rstrip('B')
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def collect_garbage(directory: str, max_size: int) -> Tuple[int, int]:
+    """Remove the least recently used entries of the cache ``directory``
+    until it holds at most ``max_size`` bytes.
+
+    Covers everything in the directory: compiled modules, rendered fragments
+    and graphs. Returns the number of files removed and the bytes freed;
+    nothing is done while another process is collecting the same directory.
+    """
+    with locked(directory, 'gc', blocking=False) as acquired:
+        if not acquired:
+            return 0, 0
+        entries = []
+        for root, dirs, files in os.walk(directory):
+            if root == directory and 'locks' in dirs:
+                dirs.remove('locks')
+            for name in files:
+                if name.endswith('.tmp'):
+                    # being written
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+def _release_reader(process: Popen, fifo: str,
+                    done: threading.Event) -> None:
+    """Unblock the reader of ``fifo`` if ``process`` exits without opening it.
+
+    Opening a named pipe blocks until both ends are open; a compiler that
+    fails before writing its output would leave the reader waiting forever.
+    """
+    process.wait()
+    while not done.is_set():
+        try:
+            os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+            return
+        except OSError:
+            # no reader yet, or it already finished
+            done.wait(0.01)
+
+
+class ModuleCache:
+    """Compiled and parsed thrift modules keyed by the hash of their sources.
+
+    A module's key covers its own source, the sources of everything it
+    includes and the compiler used, so the cache can be shared freely between
+    builds, checkouts and machines. Several processes may use the directory
+    at once: entries are written atomically, and a module is compiled by
+    one process while the others needing it wait for the result. Modules
+    are stored in the format of `sphinx_thrift.binary` and their definitions
+    decoded as they are used.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 compiler: str = 'thrift',
+                 timeout: Optional[float] = None) -> None:
+        self.directory = directory
+        self.compiler = compiler
+        self.timeout = timeout
+
+    def sources(self, filename: str) -> List[str]:
+        """``filename`` followed by everything it includes, transitively."""
+        seen: List[str] = []
+        pending = [os.path.normpath(filename)]
+        while pending:
+            path = pending.pop()
+            if path in seen or not os.path.exists(path):
+                continue
+            seen.append(path)
+            pending.extend(includes(path))
+        return seen
+
+    def key(self, filename: str) -> str:
+        # the module is named after its file
+        name = os.path.basename(filename)
+        digest = hashlib.sha1(
+            f'{CACHE_VERSION}:{self.compiler}:{name}'.encode('utf-8'))
+        for path in self.sources(filename):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def _module_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.ast')
+
+    def compile(self,
+                filename: str,
+                key: Optional[str] = None) -> Tuple[str, str]:
+        """Run the compiler and return the path of the generated XML and
+        what the compiler wrote to stderr."""
+        out = os.path.join(self.directory, 'xml', key or self.key(filename))
+        os.makedirs(out, exist_ok=True)
+        try:
+            result = run(
+                [self.compiler, '--gen', 'xml', '--out', out, filename],
+                stdout=PIPE,
+                stderr=PIPE,
+                timeout=self.timeout)
+        except TimeoutExpired:
+            raise self.timeout_error(filename) from None
+        except OSError as e:
+            raise ThriftError(filename, str(e)) from e
+        if result.returncode != 0:
+            raise self.error(filename, result.returncode, result.stderr)
+        base_name = os.path.splitext(os.path.basename(filename))[0]
+        return (os.path.join(out, base_name + '.xml'),
+                result.stderr.decode('utf-8', 'replace'))
+
+    def error(self, filename: str, returncode: int,
+              stderr: bytes) -> ThriftError:
+        """The error of a compiler run that failed with ``stderr``."""
+        return ThriftError(
+            filename,
+            stderr.decode('utf-8', 'replace').strip()
+            or f'{self.compiler} exited with {returncode}')
+
+    def timeout_error(self, filename: str) -> ThriftError:
+        return ThriftError(
+            filename, f'{self.compiler} did not finish within '
+            f'{self.timeout:g} seconds and was stopped')
+
+    def compile_stream(self, filename: str) -> Tuple[ast.Module, str]:
+        """Run the compiler and parse its XML while it is being written,
+        returning the module and what the compiler wrote to stderr.
+
+        The XML generator of thrift only writes files, so its output file is
+        created up front as a named pipe in a private temporary directory and
+        read by the parser as the compiler produces it: nothing is written to
+        disk and parsing overlaps with compiling.
+        """
+        base_name = os.path.splitext(os.path.basename(filename))[0]
+        out = tempfile.mkdtemp(prefix='sphinx-thrift-')
+        try:
+            fifo = os.path.join(out, base_name + '.xml')
+            os.mkfifo(fifo)
+            with tempfile.TemporaryFile() as stderr:
+                try:
+                    process = Popen(
+                        [self.compiler, '--gen', 'xml', '--out', out, filename],
+                        stdout=DEVNULL,
+                        stderr=stderr)
+                except OSError as e:
+                    raise ThriftError(filename, str(e)) from e
+                done = threading.Event()
+                watcher = threading.Thread(target=_release_reader,
+                                           args=(process, fifo, done),
+                                           daemon=True)
+                watcher.start()
+                # a hung compiler is killed, which releases the reader
+                killed = threading.Event()
+
+                def kill() -> None:
+                    killed.set()
+                    process.kill()
+
+                timer = None
+                if self.timeout is not None:
+                    timer = threading.Timer(self.timeout, kill)
+                    timer.start()
+                module: Optional[ast.Module] = None
+                error: Optional[Exception] = None
+                try:
+                    with open(fifo, 'rb') as f:
+                        chunks = iter(lambda: f.read(CHUNK_SIZE), b'')
+                        try:
+                            module = parse_stream(chunks)
+                        except Exception as e:
+                            error = e
+                            # let the compiler finish writing
+                            for _ in chunks:
+                                pass
+                finally:
+                    done.set()
+                    returncode = process.wait()
+                    watcher.join()
+                    if timer is not None:
+                        timer.cancel()
+                if killed.is_set():
+                    raise self.timeout_error(filename)
+                stderr.seek(0)
+                messages = stderr.read()
+                if returncode != 0:
+                    raise self.error(filename, returncode, messages)
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+        if module is None:
+            raise ThriftError(
+                filename,
+                f'cannot parse the output of {self.compiler}: {error}'
+            ) from error
+        return module, messages.decode('utf-8', 'replace')
+
+    def load(self, filename: str, key: Optional[str] = None) -> ast.Module:
+        """The module compiled from ``filename``, whose `key` may be given
+        when already known."""
+        key = key or self.key(filename)
+        path = os.path.abspath(filename)
+        previous = _paths.get(path)
+        if previous != key:
+            _paths[path] = key
+            if previous is not None and previous not in _paths.values():
+                _memory.pop(previous, None)
+        if key in _failures:
+            raise _failures[key]
+        if key not in _memory:
+            try:
+                _memory[key] = self._load(filename, key)
+            except ThriftError as e:
+                _failures[key] = e
+                raise
+        return _memory[key]
+
+    def path(self, key: str) -> str:
+        """Where the module with ``key`` is cached."""
+        return self._module_path(key)
+
+    def lock_name(self, key: str) -> str:
+        """The lock held while compiling the module with ``key``."""
+        return os.path.join(key[:2], key)
+
+    def note_failure(self, key: str, error: ThriftError) -> None:
+        """Fail loading the module with ``key`` with ``error``, for the
+        rest of the build."""
+        _failures[key] = error
+
+    def _read(self, path: str) -> Optional[ast.Module]:
+        try:
+            module = ModuleFile.open(path).module()
+        except (OSError, FormatError, struct.error, IndexError, ValueError):
+            # missing, or corrupt and compiled again
+            return None
+        touch(path)
+        return module
+
+    def _load(self, filename: str, key: str) -> ast.Module:
+        path = self._module_path(key)
+        module = self._read(path)
+        if module is not None:
+            return module
+        # processes sharing the directory compile every module once: the
+        # others wait for it and read the result
+        with locked(self.directory, self.lock_name(key)):
+            module = self._read(path)
+            if module is None:
+                module, _ = self.compile_module(filename, key)
+                data = encode_module(module)
+                atomic_write(path, lambda f: f.write(data))
+        return module
+
+    def compile_module(self, filename: str,
+                       key: str) -> Tuple[ast.Module, str]:
+        """Compile and parse ``filename``, streaming the XML into the parser
+        where named pipes are available. Returns the module and what the
+        compiler wrote to stderr."""
+        if hasattr(os, 'mkfifo'):
+            return self.compile_stream(filename)
+        xml, messages = self.compile(filename, key)
+        try:
+            return load_module(xml), messages
+        except Exception as e:
+            raise ThriftError(filename, f'cannot parse {xml}: {e}') from e
+
+
+def _load_key(args: Tuple[str, str, str]) -> str:
+    filename, directory, compiler = args
+    cache = ModuleCache(directory, compiler)
+    key = cache.key(filename)
+    try:
+        # into the cache directory only, workers outlive many files
+        cache._load(filename, key)
+    except ThriftError:
+        raise
+    except Exception as e:
+        # anything else would not survive being sent back from the worker
+        raise ThriftError(filename, f'{e.__class__.__name__}: {e}') from None
+    return key
+
+
+def _read_key(cache: ModuleCache, filename: str,
+              key: str) -> Union[ast.Module, ThriftError]:
+    # decoded straight from the cache entry and not kept in memory by this
+    # module, so that streamed modules are freed once the caller drops them
+    module = cache._read(cache.path(key))
+    if module is None:
+        return ThriftError(filename, 'cannot read the compiled module')
+    return module
+
+
+def load_modules(paths: Iterable[str],
+                 workers: Optional[int] = None,
+                 cache_dir: Optional[str] = None,
+                 compiler: str = 'thrift'
+                 ) -> Iterator[Tuple[str, Union[ast.Module, ThriftError]]]:
+    """Compile and parse the thrift files at ``paths`` in ``workers``
+    processes, yielding ``(path, module)`` as each file is done.
+
+    Files that cannot be compiled or parsed yield a `ThriftError` instead of
+    a module. The workers fill the module cache in ``cache_dir`` (a temporary
+    directory by default) and the modules are read from there, their
+    definitions decoded as they are used. Modules are not kept by the cache
+    of this process: each is freed once the caller lets go of it. With one
+    worker the files are loaded in this process, in order.
+    """
+    temporary = None
+    if cache_dir is None:
+        temporary = cache_dir = tempfile.mkdtemp(prefix='sphinx-thrift-')
+    cache = ModuleCache(cache_dir, compiler)
+    try:
+        if workers == 1:
+            for path in paths:
+                try:
+                    key = _load_key((path, cache_dir, compiler))
+                except ThriftError as e:
+                    yield path, e
+                    continue
+                yield path, _read_key(cache, path, key)
+            return
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {
+                pool.submit(_load_key, (path, cache_dir, compiler)): path
+                for path in paths
+            }
+            try:
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        key = future.result()
+                    except ThriftError as e:
+                        yield path, e
+                        continue
+                    except Exception as e:
+                        # the worker died
+                        yield path, ThriftError(path, str(e))
+                        continue
+                    yield path, _read_key(cache, path, key)
+            finally:
+                # when the caller stops early
+                for future in futures:
+                    future.cancel()
+    finally:
+        if temporary is not None:
+            shutil.rmtree(temporary, ignore_errors=True)
@@ -0,0 +1,290 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import argparse
+import os
+import sys
+
+import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.cache import (ThriftError, collect_garbage, load_modules,
+                                 parse_size)
+from sphinx_thrift.references import module_references
+
+
+def find_thrift_files(paths: Iterable[str]) -> List[str]:
+    found: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                found.extend(
+                    os.path.join(root, f) for f in sorted(files)
+                    if f.endswith('.thrift'))
+        else:
+            found.append(path)
+    return found
+
+
+def unresolved_references(modules: Dict[str, ast.Module]
+                          ) -> Iterator[Tuple[str, str, str]]:
+    """Yield ``(module, location, reference)`` for dangling type references.
+
+    ``modules`` maps module names to their AST; references into modules that
+    are not part of it are reported as unresolved.
+    """
+    defined = {
+        name: {
+            d.name
+            for definitions in (m.enums, m.typedefs, m.structs, m.services)
+            for d in definitions
+        }
+        for name, m in modules.items()
+    }
+    for name, module in sorted(modules.items()):
+        for (target_module, target), (_, key) in module_references(module):
+            if target not in defined.get(target_module, ()):
+                yield name, key[1], f'{target_module}.{target}'
+
+
+def check(paths: Sequence[str], cache_dir: str, compiler: str,
+          jobs: Optional[int]) -> int:
+    files = find_thrift_files(paths)
+    modules: Dict[str, ast.Module] = {}
+    sources: Dict[str, str] = {}
+    errors = 0
+    # reported in the order of the files, not in the order they were done
+    results = dict(load_modules(files, jobs, cache_dir, compiler))
+    for filename in files:
+        result = results[filename]
+        if isinstance(result, ThriftError):
+            errors += 1
+            print(f'{result.filename}: error: {result.message}',
+                  file=sys.stderr)
+        elif result.name in sources:
+            if os.path.samefile(filename, sources[result.name]):
+                continue
+            # references would be checked against one of them only
+            errors += 1
+            print(f'{filename}: error: module {result.name} is also defined '
+                  f'by {sources[result.name]}', file=sys.stderr)
+        else:
+            modules[result.name] = result
+            sources[result.name] = filename
+    for module, where, ref in unresolved_references(modules):
+        errors += 1
+        print(f'{sources[module]}: error: unresolved reference {ref} '
+              f'in {where}', file=sys.stderr)
+    print(f'{len(files)} files, {len(modules)} modules parsed, '
+          f'{errors} errors')
+    return 1 if errors else 0
+
+
+def gc(cache_dir: str, max_size: int) -> int:
+    removed, freed = collect_garbage(cache_dir, max_size)
+    print(f'{removed} files removed, {freed} bytes freed')
+    return 0
+
+
+def watch(srcdir: str, outdir: str, builder: str, port: Optional[int],
+          interval: float) -> int:
+    from sphinx_thrift.watch import Watcher, serve
+
+    if port is not None:
+        os.makedirs(outdir, exist_ok=True)
+        serve(outdir, port)
+        print(f'serving {outdir} at http://127.0.0.1:{port}/')
+    try:
+        Watcher(srcdir, outdir, builder).run(interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def query(database: str, name: Optional[str], kind: Optional[str],
+          module: Optional[str], type_: Optional[str]) -> int:
+    from sphinx_thrift.domain import anchor
+    from sphinx_thrift.store import SymbolStore
+
+    if not os.path.exists(database):
+        print(f'{database}: error: no such database', file=sys.stderr)
+        return 1
+    found = 0
+    for key, docname, record in SymbolStore(database).query(
+            name, kind, module, type_):
+        found += 1
+        type_ = record.get('type') or record.get('returns') or record.get(
+            'target') or ''
+        print(f'{anchor(key)}\t{type_}\t{docname}')
+    return 0 if found else 1
+
+
+def shards(srcdir: str, outdir: str, count: int, builder: str,
+           jobs: Optional[int], defines: Sequence[str]) -> int:
+    from sphinx_thrift.shards import build_shards
+
+    overrides = dict(define.split('=', 1) for define in defines)
+    return build_shards(srcdir, outdir, count, builder, jobs, overrides)
+
+
+def merge(outdir: str, shard_dirs: Sequence[str]) -> int:
+    from sphinx_thrift.shards import merge_shards
+
+    try:
+        merge_shards(outdir, shard_dirs)
+    except ThriftError as e:
+        print(f'{e.filename}: error: {e.message}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def changed(old: str, new: str) -> int:
+    from sphinx_thrift.manifest import changed_files, read_manifest
+
+    try:
+        changes, removed = changed_files(
+            read_manifest(old) if os.path.exists(old) else {},
+            read_manifest(new))
+    except ThriftError as e:
+        print(f'{e.filename}: error: {e.message}', file=sys.stderr)
+        return 1
+    for path in changes:
+        print(f'M\t{path}')
+    for path in removed:
+        print(f'D\t{path}')
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='sphinx-thrift')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    check_parser = commands.add_parser(
+        'check',
+        help='compile and parse thrift files, '
+        'reporting errors and filling the cache')
+    check_parser.add_argument(
+        'paths', nargs='+', help='.thrift files or directories to scan')
+    check_parser.add_argument(
+        '--cache-dir',
+        default='.thrift-cache',
+        help='directory of the compiled and parsed cache; point the '
+        'thrift_cache_dir Sphinx option at it to reuse the results')
+    check_parser.add_argument(
+        '--compiler', default='thrift', help='thrift compiler executable')
+    check_parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=None,
+        help='number of worker processes (default: number of CPUs)')
+
+    gc_parser = commands.add_parser(
+        'gc',
+        help='remove the least recently used entries of a cache directory '
+        'beyond a size limit')
+    gc_parser.add_argument(
+        '--cache-dir', default='.thrift-cache', help='cache directory')
+    gc_parser.add_argument(
+        '--max-size',
+        type=parse_size,
+        required=True,
+        help='size to shrink the cache to, in bytes or with a K, M or G '
+        'suffix')
+
+    watch_parser = commands.add_parser(
+        'watch',
+        help='rebuild the documentation whenever sources or thrift files '
+        'change')
+    watch_parser.add_argument('srcdir', help='Sphinx source directory')
+    watch_parser.add_argument('outdir', help='output directory')
+    watch_parser.add_argument(
+        '-b', '--builder', default='html', help='builder to use')
+    watch_parser.add_argument(
+        '--serve',
+        type=int,
+        metavar='PORT',
+        help='also serve the output directory on localhost:PORT')
+    watch_parser.add_argument(
+        '--interval',
+        type=float,
+        default=1.0,
+        help='seconds between checks for changes')
+
+    query_parser = commands.add_parser(
+        'query',
+        help='list documented objects from the symbol database of a build '
+        '(see thrift_symbol_db)')
+    query_parser.add_argument('database', help='symbol database file')
+    query_parser.add_argument(
+        'name', nargs='?', help='object name or its trailing part')
+    query_parser.add_argument(
+        '--kind',
+        help='object kind, like struct, service_method or enum_field')
+    query_parser.add_argument(
+        '--module', help='module name, qualified by version if any')
+    query_parser.add_argument(
+        '--type',
+        help='type of a field or constant, return type of a method or '
+        'target of a type alias')
+
+    shards_parser = commands.add_parser(
+        'shards',
+        help='build the documentation in shards in parallel processes and '
+        'merge them')
+    shards_parser.add_argument('srcdir', help='Sphinx source directory')
+    shards_parser.add_argument('outdir', help='output directory')
+    shards_parser.add_argument(
+        '-n', '--count', type=int, required=True, help='number of shards')
+    shards_parser.add_argument(
+        '-b', '--builder', default='html', help='builder to use')
+    shards_parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=None,
+        help='number of worker processes (default: number of CPUs)')
+    shards_parser.add_argument(
+        '-D',
+        dest='defines',
+        action='append',
+        default=[],
+        metavar='NAME=VALUE',
+        help='override a configuration value')
+
+    merge_parser = commands.add_parser(
+        'merge',
+        help='merge the outputs of shards built with thrift_shard into one '
+        'site')
+    merge_parser.add_argument('outdir', help='output directory')
+    merge_parser.add_argument(
+        'shard_dirs', nargs='+', help='output directories of all shards')
+
+    changed_parser = commands.add_parser(
+        'changed',
+        help='list the files that differ between the manifests of two builds '
+        '(see thrift_manifest), M for added or changed and D for removed')
+    changed_parser.add_argument(
+        'old', help='manifest of the published build, may be missing')
+    changed_parser.add_argument('new', help='manifest of the new build')
+
+    args = parser.parse_args(argv)
+    if args.command == 'changed':
+        return changed(args.old, args.new)
+    if args.command == 'shards':
+        return shards(args.srcdir, args.outdir, args.count, args.builder,
+                      args.jobs, args.defines)
+    if args.command == 'merge':
+        return merge(args.outdir, args.shard_dirs)
+    if args.command == 'query':
+        return query(args.database, args.name, args.kind, args.module,
+                     args.type)
+    if args.command == 'gc':
+        return gc(args.cache_dir, args.max_size)
+    if args.command == 'watch':
+        return watch(args.srcdir, args.outdir, args.builder, args.serve,
+                     args.interval)
+    return check(args.paths, args.cache_dir, args.compiler, args.jobs)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Method details of large services written to separate HTML files.
+
+With ``thrift_lazy_methods`` set, the description of every method of a
+service with at least that many methods (its documentation, parameters and
+exceptions) is moved out of the page into ``_thrift/DOCNAME/ANCHOR.html``
+when the page is written as HTML. The page keeps the signatures, with their
+anchors, and a link to each description that ``thrift-details.js`` replaces
+with the description itself as it scrolls into view or is linked to. The
+links in a description are written relative to its own file, so it can be
+read on its own without scripts, and the script rebases them as it inserts
+the description into the page. The doctree is unchanged otherwise, so the
+descriptions are still indexed for search.
+"""
+from typing import Any, List
+
+import os
+import posixpath
+import re
+
+from docutils import nodes
+from sphinx import addnodes
+from sphinx.application import Sphinx
+from sphinx.util.osutil import relative_uri
+
+DIRECTORY = '_thrift'
+SCRIPT = 'thrift-details.js'
+
+_unsafe_re = re.compile(r'[^\w.-]+')
+_link_re = re.compile(r'(\s(?:href|src)=")([^"]*)"')
+# URLs with a scheme, like ``https:`` or ``mailto:``
+_scheme_re = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+
+class method_details(nodes.General, nodes.Element):
+    """The description of a method, written to the file ``path`` of the
+    output directory and loaded from ``uri`` by the page ``page`` in HTML
+    output."""
+
+
+def _methods(service: addnodes.desc) -> List[addnodes.desc]:
+    return [
+        node for content in service.children
+        if isinstance(content, addnodes.desc_content)
+        for node in content.children if isinstance(node, addnodes.desc)
+        and node.get('domain') == 'thrift'
+        and node.get('objtype') == 'service_method'
+    ]
+
+
+def defer_method_details(app: Sphinx, doctree: nodes.document,
+                         docname: str) -> None:
+    threshold = app.config.thrift_lazy_methods
+    if threshold is None or app.builder.format != 'html':
+        return
+    page = app.builder.get_target_uri(docname)
+    for service in doctree.findall(addnodes.desc):
+        if (service.get('domain') != 'thrift'
+                or service.get('objtype') != 'service'):
+            continue
+        methods = _methods(service)
+        if len(methods) < int(threshold):
+            continue
+        for method in methods:
+            signature = method[0]
+            content = method[-1]
+            if (not isinstance(content, addnodes.desc_content)
+                    or not content.children or not signature['ids']
+                    or any(element['ids']
+                           for element in content.findall(nodes.Element))):
+                # nothing to move, or anchors that must stay on the page
+                continue
+            name = _unsafe_re.sub('-', signature['ids'][0]) + '.html'
+            path = '/'.join([DIRECTORY, docname, name])
+            details = method_details(path=path,
+                                     page=page,
+                                     uri=relative_uri(page, path))
+            details.extend(content.children)
+            content.children = []
+            content += details
+
+
+def _rebase(url: str, page: str, path: str) -> str:
+    """``url``, relative to the output file ``page``, made relative to the
+    output file ``path``."""
+    if url.startswith('/') or _scheme_re.match(url):
+        return url
+    location, sep, rest = url.partition('#')
+    if not location:
+        # the page itself, or an anchor on it
+        return relative_uri(path, page) + sep + rest
+    location, query, rest_query = location.partition('?')
+    target = posixpath.normpath(
+        posixpath.join(posixpath.dirname(page), location))
+    if location.endswith('/'):
+        target += '/'
+    return relative_uri(path, target) + query + rest_query + sep + rest
+
+
+def visit_method_details(self: Any, node: method_details) -> None:
+    node['start'] = len(self.body)
+
+
+def depart_method_details(self: Any, node: method_details) -> None:
+    html = ''.join(self.body[node['start']:])
+    del self.body[node['start']:]
+    html = _link_re.sub(
+        lambda match: match[1] + _rebase(match[2], node['page'], node['path'])
+        + '"', html)
+    path = os.path.join(self.builder.outdir, node['path'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    uri = self.attval(node['uri'])
+    self.body.append(f'<div class="thrift-details" data-src="{uri}">'
+                     f'<a href="{uri}">Show details</a></div>\n')
+
+
+def add_script(app: Sphinx) -> None:
+    if app.config.thrift_lazy_methods is None or app.builder.format != 'html':
+        return
+    app.config.html_static_path.append(
+        os.path.join(os.path.dirname(__file__), 'static'))
+    app.add_js_file(SCRIPT)
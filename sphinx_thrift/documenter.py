@@ -1,13 +1,34 @@
-from typing import Any, Tuple, List, Callable, Dict, Union
-
-from subprocess import check_call
-
+from typing import (Any, Tuple, List, Callable, Dict, Union, Optional,
+                    Sequence)
+
+import hashlib
+import os
+import pickle
+from abc import ABC, abstractmethod
+
+from docutils import nodes
+from docutils.statemachine import StringList
+from docutils.parsers.rst import directives
+from docutils.parsers.rst.states import RSTState
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
 from sphinx.ext.autodoc import Documenter, ModuleDocumenter
+from sphinx.ext.autodoc.directive import AutodocDirective
+from sphinx.util import logging
+from sphinx.util.docutils import SphinxDirective
 
 import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.binary import Definitions, definition_digest
+from sphinx_thrift.cache import (ModuleCache, ThriftError, atomic_write,
+                                 collect_garbage, parse_size, touch)
+from sphinx_thrift.domain import (member_table, note_row_targets, target_ids,
+                                  thrift_domain)
+from sphinx_thrift.shards import owns, stub_sections
 from sphinx_thrift.thrift_ast import (Constant, Typedef, Enum, Struct, Service,
                                       Function)
 
+logger = logging.getLogger(__name__)
+
 
 def typeId(type_: ast.Type) -> str:
     dispatch = {
@@ -25,7 +46,47 @@ def typeId(type_: ast.Type) -> str:
     return dispatch[type_.__class__](type_)
 
 
-class _DirectiveGenerator:
+FieldList = List[Tuple[str, Union[str, Tuple[str, str]]]]
+
+
+def _field_lines(fields: FieldList) -> List[str]:
+    lines = []
+    for name, value in fields:
+        if isinstance(value, str):
+            lines.append(':{}: {}'.format(name, value))
+        else:
+            lines.append(':{} {}: {}'.format(name, *value))
+    return lines
+
+
+def _table_lines(rows: List[Tuple[str, str, str]]) -> List[str]:
+    lines = []
+    for name, value, doc in rows:
+        lines.append(f'{name};{value}')
+        lines.extend('   ' + line for line in doc.splitlines())
+    return lines
+
+
+class _Generator(ABC):
+    @abstractmethod
+    def generate(self,
+                 name: str,
+                 doc: str,
+                 attributes: Dict[str, str] = {},
+                 fields: FieldList = []) -> None:
+        pass
+
+    @abstractmethod
+    def generate_table(self, name: str, attributes: Dict[str, str],
+                       rows: List[Tuple[str, str, str]]) -> None:
+        pass
+
+    @abstractmethod
+    def generate_header(self, name: str, attributes: Dict[str, str]) -> None:
+        pass
+
+
+class _DirectiveGenerator(_Generator):
     def __init__(self,
                  add_line: Callable[[str], None],
                  directive: str,
@@ -43,13 +104,9 @@ class _DirectiveGenerator:
             self.add_line('   :{}: {}'.format(*item))
         self.add_line('')
 
-    def add_fields(self, fields: List[Tuple[str, Union[str, Tuple[str, str]]]]
-                   ) -> None:
-        for name, value in fields:
-            if isinstance(value, str):
-                self.add_line('   :{}: {}'.format(name, value))
-            else:
-                self.add_line('   :{} {}: {}'.format(name, *value))
+    def add_fields(self, fields: FieldList) -> None:
+        for line in _field_lines(fields):
+            self.add_line('   ' + line)
         self.add_line('')
 
     def add_doc(self, doc: str) -> None:
@@ -60,25 +117,178 @@ class _DirectiveGenerator:
                  name: str,
                  doc: str,
                  attributes: Dict[str, str] = {},
-                 fields: List[Tuple[str, Union[str, Tuple[str, str]]]] = []
-                 ) -> None:
+                 fields: FieldList = []) -> None:
         self.add_header(name, attributes)
         self.add_fields(fields)
         self.add_doc(doc)
 
+    def generate_table(self, name: str, attributes: Dict[str, str],
+                       rows: List[Tuple[str, str, str]]) -> None:
+        self.add_header(name, attributes)
+        for line in _table_lines(rows):
+            self.add_line('   ' + line)
+        self.add_line('')
 
-class ThriftDocumenter(Documenter):
-    objtype = 'object'
-    titles_allowed = True
+    def generate_header(self, name: str, attributes: Dict[str, str]) -> None:
+        self.add_header(name, attributes)
 
 
-class ThriftModuleDocumenter(ThriftDocumenter):
-    objtype = 'thrift_module'
+class _NodeRenderer:
+    """Collects the nodes of the directives run by `_NodeGenerator`.
+
+    Top level directives are appended to the current section (or to the
+    result when no title was added yet), nested ones to the content of the
+    last top level directive, mirroring the structure of the RST output.
+    """
+
+    def __init__(self, state: RSTState, lineno: int, source: str) -> None:
+        self.state = state
+        self.lineno = lineno
+        self.source = source
+        self.result: List[nodes.Node] = []
+        self.section: Optional[nodes.section] = None
+        self.content: Optional[nodes.Element] = None
+
+    def add_title(self, title: str) -> None:
+        section = nodes.section()
+        section['names'].append(nodes.fully_normalize_name(title))
+        section += nodes.title(title, title)
+        self.state.document.note_implicit_target(section, section)
+        self.result.append(section)
+        self.section = section
+        self.content = None
+
+    def append(self, result: List[nodes.Node], nested: bool) -> None:
+        if nested:
+            assert (self.content is not None)
+            self.content.extend(result)
+            return
+        if self.section is not None:
+            self.section.extend(result)
+        else:
+            self.result.extend(result)
+        self.content = result[-1][-1]
+
+    def _top_level(self) -> List[nodes.Node]:
+        if self.section is not None:
+            return self.section.children
+        return self.result
+
+    def mark(self) -> int:
+        return len(self._top_level())
+
+    def since(self, mark: int) -> List[nodes.Node]:
+        """Top level nodes appended since `mark` was called."""
+        return self._top_level()[mark:]
+
+    def splice(self, fragment: List[nodes.Node]) -> List[str]:
+        """Append previously rendered nodes, returning their ids."""
+        document = self.state.document
+        elements = [
+            element for node in fragment
+            for element in node.findall(nodes.Element) if target_ids(element)
+        ]
+        for element in elements:
+            if isinstance(element, member_table):
+                note_row_targets(document, element)
+            else:
+                document.note_explicit_target(element)
+        self.append(fragment, False)
+        return [id_ for element in elements for id_ in target_ids(element)]
+
+
+class _NodeGenerator(_Generator):
+    def __init__(self, renderer: _NodeRenderer, directive: str,
+                 indent: int = 0) -> None:
+        self.renderer = renderer
+        self.directive = directive
+        self.nested = indent > 0
+
+    def generate(self,
+                 name: str,
+                 doc: str,
+                 attributes: Dict[str, str] = {},
+                 fields: FieldList = []) -> None:
+        self._run(name, attributes, _field_lines(fields) + ['', doc, ''])
+
+    def generate_table(self, name: str, attributes: Dict[str, str],
+                       rows: List[Tuple[str, str, str]]) -> None:
+        self._run(name, attributes, _table_lines(rows))
+
+    def generate_header(self, name: str, attributes: Dict[str, str]) -> None:
+        self._run(name, attributes, [])
+
+    def _run(self, name: str, attributes: Dict[str, str],
+             lines: List[str]) -> None:
+        renderer = self.renderer
+        state = renderer.state
+        env = state.document.settings.env
+        cls = env.get_domain('thrift').directive(self.directive)
+        options = {
+            option: cls.option_spec[option](value)
+            for option, value in attributes.items()
+        }
+        content = StringList(
+            lines, items=[(renderer.source, i) for i in range(len(lines))])
+        directive = cls('thrift:' + self.directive, [name], options, content,
+                        renderer.lineno, 0, '', state, state.state_machine)
+        renderer.append(directive.run(), self.nested)
+
+
+def module_cache(env: BuildEnvironment) -> ModuleCache:
+    cache_dir = env.config.thrift_cache_dir or os.path.join(
+        env.doctreedir, 'thrift')
+    timeout = env.config.thrift_compile_timeout
+    return ModuleCache(cache_dir, env.config.thrift_compiler,
+                       float(timeout) if timeout is not None else None)
+
+
+def warn_failure(error: ThriftError, location: Any) -> None:
+    """Report a module that cannot be documented, with a warning for each
+    problem the compiler found at its place in the thrift source, or at
+    ``location`` when it named none."""
+    for where, message in error.diagnostics():
+        logger.warning('%s',
+                       message,
+                       location=where or location,
+                       type='thrift',
+                       subtype='compile')
+
+
+def prune_cache(app: Sphinx, exception: Optional[Exception]) -> None:
+    """Keep the cache directory within ``thrift_cache_size`` after a build."""
+    size = app.config.thrift_cache_size
+    if size is None or exception is not None:
+        return
+    collect_garbage(module_cache(app.env).directory, parse_size(str(size)))
+
+
+def read_module(env: BuildEnvironment, filename: str) -> ast.Module:
+    """Load ``filename`` as a dependency of the current document."""
+    cache = module_cache(env)
+    # included modules are dependencies too, so that the page is rebuilt
+    # when a type it references changes
+    for source in cache.sources(filename):
+        env.note_dependency(os.path.abspath(source))
+    return cache.load(filename)
+
+
+def _load_module(env: BuildEnvironment, filename: str) -> ast.Module:
+    module = read_module(env, filename)
+    domain = thrift_domain(env)
+    domain.note_references(module, env.docname)
+    domain.note_source(
+        domain.versioned(module.name, env.docname), os.path.abspath(filename),
+        env.docname)
+    domain.note_definitions(module, env.docname)
+    return module
+
+
+class _ModuleGenerator(ABC):
+    env: BuildEnvironment
     module: ast.Module
 
-    def __init__(self, directive: str, name: str, indent: str = '') -> None:
-        super().__init__(directive, name, indent)
-        self.filename = self.name + '.thrift'
+    def _init_generators(self) -> None:
         self.module_generator = self._create_generator('module')
         self.service_generator = self._create_generator('service')
         self.method_generator = self._create_generator(
@@ -89,43 +299,33 @@ class ThriftModuleDocumenter(ThriftDocumenter):
         self.struct_generator = self._create_generator('struct')
         self.struct_field_generator = self._create_generator(
             'struct_field', indent=3)
+        self.enum_table_generator = self._create_generator(
+            'enum_table', indent=3)
+        self.struct_table_generator = self._create_generator(
+            'struct_table', indent=3)
+        self.used_by_generator = self._create_generator('used_by', indent=3)
         self.constant_generator = self._create_generator('constant')
         self.typedef_generator = self._create_generator('typedef')
 
-    def _create_generator(self, name: str,
-                          indent: int = 0) -> _DirectiveGenerator:
-        return _DirectiveGenerator(self._add_line, name, indent)
+    @abstractmethod
+    def _create_generator(self, name: str, indent: int = 0) -> _Generator:
+        pass
 
-    @classmethod
-    def can_document_member(cls, member: Any, membername: str, isattr: bool,
-                            parent: Any) -> bool:
-        """Called to see if a member can be documented by this documenter."""
-        return False
+    @abstractmethod
+    def _add_title(self, title: str) -> None:
+        pass
 
-    def get_sourcename(self) -> str:
-        return f'{self.filename}:docstring of {self.name}'
+    def _as_table(self, members: List[Any]) -> bool:
+        threshold = self.env.config.thrift_table_threshold
+        return threshold is not None and len(members) >= threshold
 
-    def _add_line(self, content: str) -> None:
-        self.add_line(content, self.get_sourcename())
-
-    def generate(self,
-                 more_content: Any = None,
-                 real_modname: str = None,
-                 check_module: bool = False,
-                 all_members: bool = False) -> None:
-        from sphinx_thrift.parser import load_module
-        import os.path
-
-        self.env.note_dependency(self.filename)
-        base_name = os.path.basename(self.name)
-        check_call([
-            'thrift', '--gen', 'xml', '--out', self.env.doctreedir,
-            self.filename
-        ])
-        self.module = load_module(f'{self.env.doctreedir}/{base_name}.xml')
+    def _generate_module(self) -> None:
+        namespaces = ' '.join(
+            f'{ns.language};{ns.name}' for ns in self.module.namespaces)
         self.module_generator.generate(
             self.module.name,
             self.module.doc,
+            attributes={'namespaces': namespaces} if namespaces else {},
             fields=[(ns.language, ':code:`' + ns.name + '`')
                     for ns in self.module.namespaces])
         self._generate_constants()
@@ -134,48 +334,71 @@ class ThriftModuleDocumenter(ThriftDocumenter):
         self._generate_structs()
         self._generate_services()
 
+    def _generate_definitions(self, definitions: Sequence[Any],
+                              generate: Callable[[Any], None]) -> None:
+        for definition in definitions:
+            generate(definition)
+
+    def _generate_used_by(self, name: str) -> None:
+        if self.env.config.thrift_show_used_by:
+            self.used_by_generator.generate_header(
+                name, {'module': self.module.name})
+
     def _generate_constants(self) -> None:
         if not self.module.constants:
             return
-        self._add_line('Constants')
-        self._add_line('---------')
-        for cons in self.module.constants:
-            self.constant_generator.generate(cons.name, cons.doc, {
-                'module': self.module.name,
-                'type': typeId(cons.type_)
-            })
+        self._add_title('Constants')
+        self._generate_definitions(self.module.constants,
+                                   self._generate_constant)
+
+    def _generate_constant(self, cons: Constant) -> None:
+        attributes = {'module': self.module.name, 'type': typeId(cons.type_)}
+        if cons.value is not None:
+            config = self.env.config
+            attributes['value'] = cons.value.format(
+                config.thrift_constant_max_items,
+                config.thrift_constant_max_length)
+        self.constant_generator.generate(cons.name, cons.doc, attributes)
 
     def _generate_typedefs(self) -> None:
         if not self.module.typedefs:
             return
-        self._add_line('Type aliases')
-        self._add_line('------------')
-        for td in self.module.typedefs:
-            self.typedef_generator.generate(td.name, td.doc, {
-                'module': self.module.name,
-                'target': typeId(td.type_)
-            })
+        self._add_title('Type aliases')
+        self._generate_definitions(self.module.typedefs,
+                                   self._generate_typedef)
+
+    def _generate_typedef(self, td: Typedef) -> None:
+        self.typedef_generator.generate(td.name, td.doc, {
+            'module': self.module.name,
+            'target': typeId(td.type_)
+        })
+        self._generate_used_by(td.name)
 
     def _generate_enum(self, enum: Enum) -> None:
         self.enum_generator.generate(
             enum.name, enum.doc, attributes={'module': self.module.name})
-        for member in enum.members:
-            self.enum_field_generator.generate(
-                member.name,
-                member.doc,
-                attributes={
-                    'module': self.module.name,
-                    'enum': enum.name,
-                    'value': str(member.value)
-                })
+        if self._as_table(enum.members):
+            self.enum_table_generator.generate_table(
+                enum.name, {'module': self.module.name},
+                [(m.name, str(m.value), m.doc) for m in enum.members])
+        else:
+            for member in enum.members:
+                self.enum_field_generator.generate(
+                    member.name,
+                    member.doc,
+                    attributes={
+                        'module': self.module.name,
+                        'enum': enum.name,
+                        'value': str(member.value)
+                    })
+        self._generate_used_by(enum.name)
 
     def _generate_enums(self) -> None:
         if not self.module.enums:
             return
-        self._add_line('Enumerations')
-        self._add_line('------------')
-        for enum in self.module.enums:
-            self._generate_enum(enum)
+        self._add_title('Enumerations')
+        self._generate_definitions(self.module.enums,
+                                   self._generate_enum)
 
     def _generate_struct(self, struct: Struct) -> None:
         attributes = {'module': self.module.name}
@@ -183,25 +406,33 @@ class ThriftModuleDocumenter(ThriftDocumenter):
             attributes['exception'] = ''
         self.struct_generator.generate(
             struct.name, struct.doc, attributes=attributes)
-        for m in struct.fields:
-            member_attrs = {
-                'module': self.module.name,
-                'struct': struct.name,
-                'type': typeId(m.type_)
-            }
-            fields = {}
-            if m.default is not None:
-                fields['default'] = m.default
-            self.struct_field_generator.generate(
-                m.name, m.doc, attributes=member_attrs, fields=fields)
+        if self._as_table(struct.fields):
+            self.struct_table_generator.generate_table(
+                struct.name, {'module': self.module.name},
+                [(f.name, typeId(f.type_), f.doc) for f in struct.fields])
+        else:
+            for m in struct.fields:
+                self._generate_struct_field(struct, m)
+        self._generate_used_by(struct.name)
+
+    def _generate_struct_field(self, struct: Struct, m: ast.Field) -> None:
+        member_attrs = {
+            'module': self.module.name,
+            'struct': struct.name,
+            'type': typeId(m.type_)
+        }
+        fields = {}
+        if m.default is not None:
+            fields['default'] = m.default
+        self.struct_field_generator.generate(
+            m.name, m.doc, attributes=member_attrs, fields=fields)
 
     def _generate_structs(self) -> None:
         if not self.module.structs:
             return
-        self._add_line('Structs')
-        self._add_line('-------')
-        for struct in self.module.structs:
-            self._generate_struct(struct)
+        self._add_title('Structs')
+        self._generate_definitions(self.module.structs,
+                                   self._generate_struct)
 
     def _generate_method(self, service: Service, method: Function) -> None:
         params = ' '.join(
@@ -234,7 +465,227 @@ class ThriftModuleDocumenter(ThriftDocumenter):
     def _generate_services(self) -> None:
         if not self.module.services:
             return
-        self._add_line('Services')
-        self._add_line('--------')
-        for service in self.module.services:
-            self._generate_service(service)
+        self._add_title('Services')
+        self._generate_definitions(self.module.services,
+                                   self._generate_service)
+
+
+class ThriftDocumenter(Documenter):
+    objtype = 'object'
+    titles_allowed = True
+
+
+class ThriftModuleDocumenter(ThriftDocumenter, _ModuleGenerator):
+    objtype = 'thrift_module'
+    module: ast.Module
+
+    def __init__(self, directive: str, name: str, indent: str = '') -> None:
+        super().__init__(directive, name, indent)
+        self.filename = self.name + '.thrift'
+        self._init_generators()
+
+    def _create_generator(self, name: str,
+                          indent: int = 0) -> _DirectiveGenerator:
+        return _DirectiveGenerator(self._add_line, name, indent)
+
+    def _add_title(self, title: str) -> None:
+        self._add_line(title)
+        self._add_line('-' * len(title))
+
+    @classmethod
+    def can_document_member(cls, member: Any, membername: str, isattr: bool,
+                            parent: Any) -> bool:
+        """Called to see if a member can be documented by this documenter."""
+        return False
+
+    def get_sourcename(self) -> str:
+        return f'{self.filename}:docstring of {self.name}'
+
+    def _add_line(self, content: str) -> None:
+        self.add_line(content, self.get_sourcename())
+
+    def generate(self,
+                 more_content: Any = None,
+                 real_modname: str = None,
+                 check_module: bool = False,
+                 all_members: bool = False) -> None:
+        self.module = _load_module(self.env, self.filename)
+        self._generate_module()
+
+
+FRAGMENT_VERSION = '3'
+
+Fragment = List[nodes.Node]
+
+
+class _ModuleNodeGenerator(_ModuleGenerator):
+    """Renders a module to nodes, reusing the nodes of unchanged definitions.
+
+    The nodes rendered for each constant, typedef, enum, struct and service
+    are stored in the cache directory, keyed by a hash of the definition, the
+    rendering options and the page. When the module is rendered again only
+    definitions without a stored rendering run their directives; the others
+    are loaded from the store and their anchors and objects registered, so
+    the cost of re-reading a page follows the size of the change, not of the
+    module.
+    """
+
+    def __init__(self, env: BuildEnvironment, module: ast.Module,
+                 renderer: _NodeRenderer) -> None:
+        self.env = env
+        self.module = module
+        self.renderer = renderer
+        self._init_generators()
+        domain = thrift_domain(env)
+        self.qualified = domain.versioned(module.name, env.docname)
+        self.directory = os.path.join(
+            module_cache(env).directory, 'fragments')
+
+    def _fragment_key(self, digest: bytes) -> str:
+        config = self.env.config
+        options = (f'{FRAGMENT_VERSION}:{self.env.docname}:{self.qualified}:'
+                   f'{config.thrift_table_threshold}:'
+                   f'{config.thrift_show_used_by}:'
+                   f'{config.thrift_constant_max_items}:'
+                   f'{config.thrift_constant_max_length}:')
+        return hashlib.sha1(options.encode('utf-8') + digest).hexdigest()
+
+    def _fragment_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.pickle')
+
+    def _load_fragment(self, key: str) -> Optional[Fragment]:
+        path = self._fragment_path(key)
+        try:
+            with open(path, 'rb') as f:
+                fragment = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        touch(path)
+        return fragment
+
+    def _store_fragment(self, key: str, fragment: Fragment) -> None:
+        # the nodes are part of the document, store copies without the
+        # references to their parents and the document
+        copies = [node.deepcopy() for node in fragment]
+        for node in copies:
+            for element in node.findall():
+                element.document = None
+        atomic_write(
+            self._fragment_path(key),
+            lambda f: pickle.dump(copies, f, pickle.HIGHEST_PROTOCOL))
+
+    def _generate_definitions(self, definitions: Sequence[Any],
+                              generate: Callable[[Any], None]) -> None:
+        # definitions read from the cache have their digests stored, those
+        # with a rendered fragment are never decoded
+        stored = isinstance(definitions, Definitions)
+        ids = self.renderer.state.document.ids
+        for i in range(len(definitions)):
+            key = self._fragment_key(
+                definitions.digest(i) if stored  # type: ignore
+                else definition_digest(definitions[i]))
+            fragment = self._load_fragment(key)
+            if fragment is not None and not any(
+                    id_ in ids for node in fragment
+                    for element in node.findall(nodes.Element)
+                    for id_ in target_ids(element)):
+                self._note_objects(self.renderer.splice(fragment))
+                continue
+            mark = self.renderer.mark()
+            generate(definitions[i])
+            self._store_fragment(key, self.renderer.since(mark))
+
+    def _note_objects(self, ids: List[str]) -> None:
+        from sphinx_thrift.domain import Signature, is_exception
+
+        domain = thrift_domain(self.env)
+        targets = self.renderer.state.document.ids
+        prefix = self.qualified + '.'
+        for id_ in ids:
+            if not id_.startswith(prefix):
+                continue
+            name, _, kind = id_[len(prefix):].rpartition(':')
+            domain.note_object(
+                Signature(kind, name, self.qualified), self.env.docname,
+                kind == 'struct' and is_exception(targets[id_]))
+
+    def generate(self) -> None:
+        self._generate_module()
+
+    def _create_generator(self, name: str,
+                          indent: int = 0) -> _NodeGenerator:
+        return _NodeGenerator(self.renderer, name, indent)
+
+    def _add_title(self, title: str) -> None:
+        self.renderer.add_title(title)
+
+
+class ThriftAutoModuleDirective(AutodocDirective):
+    """``autothrift_module`` that can skip the RST round trip.
+
+    With ``thrift_render_nodes`` enabled the thrift directives are run
+    directly on the parsed module instead of generating RST for them, which
+    produces the same doctree without re-parsing the directive markup.
+    """
+
+    def run(self) -> List[nodes.Node]:
+        name = self.arguments[0]
+        filename = name + '.thrift'
+        renderer = _NodeRenderer(self.state, self.lineno,
+                                 f'{filename}:docstring of {name}')
+        if not owns(self.env, self.env.docname):
+            # rendered by another shard, only keep the sections for the
+            # table of contents
+            for title in stub_sections(self.env):
+                renderer.add_title(title)
+            return renderer.result
+        try:
+            if not self.env.config.thrift_render_nodes:
+                result = super().run()
+            else:
+                module = _load_module(self.env, filename)
+                _ModuleNodeGenerator(self.env, module, renderer).generate()
+                result = renderer.result
+        except ThriftError as e:
+            # the rest of the documentation is still built
+            warn_failure(e, self.get_location())
+            return []
+        thrift_domain(self.env).note_sections([
+            node[0].astext()
+            for node in result if isinstance(node, nodes.section)
+        ], self.env.docname)
+        return result
+
+
+class ThriftAutoGraphDirective(SphinxDirective):
+    """``autothrift_graph``: a diagram of the includes of a module or of the
+    references between its structs, inlined as SVG in HTML output."""
+    required_arguments = 1
+    option_spec = {'graph': lambda arg: directives.choice(
+        arg, ('includes', 'structs'))}
+
+    def run(self) -> List[nodes.Node]:
+        from sphinx_thrift.graphs import (GraphRenderer, include_graph,
+                                          struct_graph)
+
+        if not owns(self.env, self.env.docname):
+            return []
+        filename = self.arguments[0] + '.thrift'
+        try:
+            module = read_module(self.env, filename)
+        except ThriftError as e:
+            warn_failure(e, self.get_location())
+            return []
+        kind = self.options.get('graph', 'includes')
+        if kind == 'structs':
+            graph = struct_graph(module)
+        else:
+            graph = include_graph(filename)
+        renderer = GraphRenderer(
+            os.path.join(module_cache(self.env).directory, 'graphs'),
+            self.config.thrift_dot)
+        svg = renderer.render(f'{module.name} {kind}', graph)
+        return [
+            nodes.raw('', f'<div class="thrift-graph">{svg}</div>',
+                      format='html')
+        ]
@@ -1,25 +1,46 @@
-from typing import Any, Tuple, List, Union, Iterable, Dict, Optional, Callable
+from typing import (AbstractSet, Any, Tuple, List, Iterable, Dict, Optional,
+                    Callable, Set, MutableMapping, TYPE_CHECKING, cast)
 
+import os
 import re
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, replace
 from itertools import groupby
 
 from sphinx.ext.autodoc import Documenter
 from sphinx.directives import ObjectDescription
 from sphinx.roles import XRefRole
-from sphinx.domains import Domain, ObjType, Index
+from sphinx.domains import Domain, ObjType, Index, IndexEntry
+from sphinx.environment import BuildEnvironment
 from sphinx.roles import XRefRole
 from sphinx import addnodes
 from sphinx.addnodes import desc_signature, desc_annotation, desc_name, desc_type, desc_addname, desc_content, pending_xref
-from sphinx.util import docfields
+from sphinx.util import docfields, logging
+from sphinx.transforms.post_transforms import SphinxPostTransform
+from sphinx.util.docutils import SphinxDirective
 from sphinx.util.nodes import make_refnode
 
 from docutils import nodes
+from docutils.statemachine import StringList
 from docutils.parsers.rst.directives import unchanged, unchanged_required, flag
 
+import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.binary import stored_references
+from sphinx_thrift.names import QualifiedNameIndex, split_version, versioned
+from sphinx_thrift.references import Target, Referrer, module_references
+
+if TYPE_CHECKING:
+    from sphinx_thrift.store import SymbolStore
+
+logger = logging.getLogger(__name__)
+
 list_re = re.compile(r'^(list|set)<(.*)>$')
 map_re = re.compile(r'^map<(.*),(.*)>$')
 
+# kinds of objects listed by an index of their own, see `ThriftKindIndex`;
+# structs declared as exceptions count as the kind ``exception``
+BUCKETS = ('service', 'service_method', 'exception')
+
 
 def make_desc_type(content: str) -> desc_type:
     return desc_type(content, content)
@@ -48,6 +69,36 @@ def parse_type(typename: str,
     ]
 
 
+# (module, name, kind) of a documented object; this is what the domain data
+# stores, with the strings interned so that pickle writes each only once
+ObjectKey = Tuple[Optional[str], str, str]
+
+
+def anchor(key: ObjectKey) -> str:
+    module, name, kind = key
+    return f'{module}.{name}:{kind}'
+
+
+def is_exception(signode: desc_signature) -> bool:
+    """Whether ``signode`` is the signature of a struct declared as an
+    exception."""
+    annotation = signode.next_node(desc_annotation)
+    return annotation is not None and annotation.astext() == 'exception'
+
+
+def versioned_key(key: ObjectKey, version: Optional[str]) -> ObjectKey:
+    module, name, kind = key
+    if module is None:
+        return None, versioned(name, version), kind
+    return versioned(module, version), name, kind
+
+
+def parameter_list(arg: str) -> List[Tuple[str, str]]:
+    if arg is None:
+        return []
+    return [(p.split(';')[0], p.split(';')[1]) for p in arg.split()]
+
+
 @dataclass(frozen=True, unsafe_hash=True)
 class Signature:
     kind: str
@@ -57,30 +108,47 @@ class Signature:
     def __str__(self) -> str:
         return f'{self.module}.{self.name}:{self.kind}'
 
+    @property
+    def key(self) -> ObjectKey:
+        module = sys.intern(self.module) if self.module else self.module
+        return module, self.name, sys.intern(self.kind)
+
 
 class ThriftObject(ObjectDescription):
     def add_target_and_index(self, name: Signature, sig: str,
                              signode: desc_signature) -> None:
-        if name not in self.state.document.ids:
-            signode['names'].append(name)
-            signode['ids'].append(name)
+        name = thrift_domain(self.env).qualify(name, self.env.docname)
+        if str(name) not in self.state.document.ids:
+            signode['names'].append(str(name))
+            signode['ids'].append(str(name))
             signode['first'] = (not self.names)
             self.state.document.note_explicit_target(signode)
-            self.env.domaindata['thrift']['objects'][name] = (self.env.docname,
-                                                              self.objtype,
-                                                              str(name))
+            thrift_domain(self.env).note_object(
+                name, self.env.docname,
+                self.objtype == 'struct' and is_exception(signode))
 
 
 class ThriftModule(ThriftObject):
+    option_spec = {'namespaces': parameter_list}
+
     def handle_signature(self, sig: str, signode: Any) -> Signature:
         signode += desc_annotation('module ', 'module ')
         signode += desc_name(sig, sig)
+        domain = thrift_domain(self.env)
+        domain.note_namespaces(
+            domain.versioned(sig, self.env.docname),
+            [name for _, name in self.options.get('namespaces', [])],
+            self.env.docname)
         return Signature(self.objtype, sig, None)
 
 
 class ThriftConstant(ThriftObject):
     required_arguments = 1
-    option_spec = {'module': unchanged_required, 'type': unchanged_required}
+    option_spec = {
+        'module': unchanged_required,
+        'type': unchanged_required,
+        'value': unchanged
+    }
 
     def handle_signature(self, sig: str, signode: desc_signature) -> Signature:
         signode += desc_annotation(self.objtype, self.objtype)
@@ -88,6 +156,9 @@ class ThriftConstant(ThriftObject):
         signode += desc_name(sig, sig)
         signode += desc_type(': ', ': ')
         signode.extend(parse_type(self.options['type'], make_desc_type))
+        if 'value' in self.options:
+            signode += desc_annotation(' = ' + self.options['value'],
+                                       ' = ' + self.options['value'])
         return Signature(self.objtype, sig, self.options['module'])
 
 
@@ -175,10 +246,214 @@ class ThriftService(ThriftObject):
         return Signature(self.objtype, sig, self.options['module'])
 
 
-def parameter_list(arg: str) -> List[Tuple[str, str]]:
-    if arg is None:
+# descriptions kept as text in `member_table` rows: no inline markup or
+# hyperlinks, and nothing the smart quotes transform changes
+plain_re = re.compile(r'^(?:[^\W_]|[\s.,;!?()/+=#%&$-])*$')
+
+
+def is_plain(text: str) -> bool:
+    return (plain_re.match(text) is not None and '--' not in text
+            and '...' not in text)
+
+
+class member_table(nodes.General, nodes.Element):
+    """The members of an enum or struct, kept as plain data until the
+    document is written.
+
+    ``rows`` holds ``(anchor, name, value, description)`` for each member,
+    with an empty anchor for members whose anchor was taken. Descriptions
+    with markup are parsed into the ``entry`` children of the node, in row
+    order, and have ``None`` as description. `ExpandMemberTables` turns the
+    node into a table when the document is written, so the stored doctree
+    of an enum with thousands of members stays small.
+    """
+
+    def targets(self) -> List[str]:
+        return [anchor for anchor, _, _, _ in self['rows'] if anchor]
+
+
+def note_row_targets(document: nodes.document, table: member_table) -> None:
+    """Register the anchors of the rows of ``table`` like explicit
+    targets."""
+    for id_ in table.targets():
+        document.ids[id_] = table
+        document.nameids[id_] = id_
+        document.nametypes[id_] = True
+
+
+def target_ids(element: nodes.Element) -> List[str]:
+    """The anchors defined by ``element``, those of the rows of a
+    `member_table` included."""
+    if isinstance(element, member_table):
+        return element.targets()
+    return element['ids']
+
+
+def make_entry(*children: nodes.Node) -> nodes.entry:
+    return nodes.entry('', nodes.paragraph('', '', *children))
+
+
+class ThriftMemberTable(SphinxDirective):
+    """Members of an enum or struct as the rows of a single table.
+
+    Each row starts with an unindented ``name;value`` line, where the value is
+    the enum value or the field type, followed by the indented description.
+    Rows get the same anchors and object entries as the corresponding
+    ``enum_field`` or ``struct_field`` directives, but no signature nodes or
+    index entries.
+    """
+    has_content = True
+    required_arguments = 1
+    objtype: str
+    headers: Tuple[str, str, str]
+
+    def rows(self) -> List[Tuple[str, str, List[str]]]:
+        rows: List[Tuple[str, str, List[str]]] = []
+        for line in self.content:
+            if line and not line[0].isspace():
+                name, value = line.split(';', 1)
+                rows.append((name, value, []))
+            elif rows:
+                rows[-1][2].append(line[3:])
+        return rows
+
+    @staticmethod
+    def value_nodes(value: str) -> List[nodes.Node]:
+        return [nodes.literal(value, value)]
+
+    def description(self, doc: List[str]) -> nodes.entry:
+        if len(doc) > 1:
+            entry = nodes.entry()
+            self.state.nested_parse(
+                StringList(doc, self.content.source(0)), self.content_offset,
+                entry)
+            return entry
+        # single line descriptions skip the block parser
+        text = doc[0] if doc else ''
+        inline, messages = self.state.inline_text(text, self.lineno)
+        entry = make_entry(*inline)
+        entry.extend(messages)
+        return entry
+
+    def run(self) -> List[nodes.Node]:
+        table = member_table(objtype=self.objtype)
+        rows = []
+        parent = self.arguments[0]
+        domain = thrift_domain(self.env)
+        ids = self.state.document.ids
+        taken: Set[str] = set()
+        for name, value, doc in self.rows():
+            sig = domain.qualify(
+                Signature(self.objtype, parent + '.' + name,
+                          self.options['module']), self.env.docname)
+            id_ = str(sig)
+            if id_ in ids or id_ in taken:
+                id_ = ''
+            else:
+                taken.add(id_)
+                domain.note_object(sig, self.env.docname)
+            text: Optional[str] = None
+            if len(doc) <= 1 and is_plain(doc[0] if doc else ''):
+                text = doc[0] if doc else ''
+            else:
+                table += self.description(doc)
+            rows.append((id_, name, value, text))
+        table['rows'] = rows
+        note_row_targets(self.state.document, table)
+        return [table]
+
+
+class ThriftEnumTable(ThriftMemberTable):
+    option_spec = {'module': unchanged_required}
+    objtype = 'enum_field'
+    headers = ('Name', 'Value', 'Description')
+
+
+class ThriftStructTable(ThriftMemberTable):
+    option_spec = {'module': unchanged_required}
+    objtype = 'struct_field'
+    headers = ('Name', 'Type', 'Description')
+
+    @staticmethod
+    def value_nodes(value: str) -> List[nodes.Node]:
+        return parse_type(value, lambda s: nodes.literal(s, s))
+
+
+MEMBER_TABLES = {
+    table.objtype: table
+    for table in (ThriftEnumTable, ThriftStructTable)
+}
+
+
+def expand_member_table(node: member_table) -> nodes.table:
+    """The table showing the rows of ``node``."""
+    directive = MEMBER_TABLES[node['objtype']]
+    table = nodes.table(classes=['thrift-' + node['objtype'] + 's'])
+    tgroup = nodes.tgroup(cols=3)
+    table += tgroup
+    for width in (2, 2, 6):
+        tgroup += nodes.colspec(colwidth=width)
+    tgroup += nodes.thead(
+        '', nodes.row('', *[make_entry(nodes.Text(h))
+                            for h in directive.headers]))
+    tbody = nodes.tbody()
+    tgroup += tbody
+    parsed = iter(node.children)
+    for id_, name, value, text in node['rows']:
+        row = nodes.row()
+        if id_:
+            row['names'].append(id_)
+            row['ids'].append(id_)
+        row += make_entry(nodes.literal(name, name))
+        row += make_entry(*directive.value_nodes(value))
+        if text is None:
+            row += next(parsed)
+        else:
+            row += make_entry(*([nodes.Text(text)] if text else []))
+        tbody += row
+    return table
+
+
+class ExpandMemberTables(SphinxPostTransform):
+    """Replace the `member_table` nodes of a document being written by
+    tables, before the references to field types are resolved."""
+    default_priority = 5
+
+    def run(self, **kwargs: Any) -> None:
+        for node in list(self.document.findall(member_table)):
+            node.replace_self(expand_member_table(node))
+
+
+class used_by(nodes.General, nodes.Element):
+    """Placeholder for the list of objects referencing a definition.
+
+    Replaced once all documents are read, see `process_used_by`.
+    """
+
+
+class ThriftUsedBy(SphinxDirective):
+    required_arguments = 1
+    option_spec = {'module': unchanged_required}
+
+    def run(self) -> List[nodes.Node]:
+        module = thrift_domain(self.env).versioned(self.options['module'],
+                                                   self.env.docname)
+        return [used_by(module=module, name=self.arguments[0])]
+
+
+class ThriftVersion(SphinxDirective):
+    """Marks the document as part of the documentation of one version.
+
+    Thrift objects documented on the page are qualified by the version, so
+    that several versions of a module can be documented in the same project,
+    and references on the page resolve within the version.
+    """
+    required_arguments = 1
+
+    def run(self) -> List[nodes.Node]:
+        thrift_domain(self.env).note_version(self.env.docname,
+                                             self.arguments[0])
         return []
-    return [(p.split(';')[0], p.split(';')[1]) for p in arg.split()]
 
 
 class ThriftServiceMethod(ThriftObject):
@@ -246,31 +521,27 @@ class ThriftServiceMethod(ThriftObject):
 
 
 class ThriftXRefRole(XRefRole):
-    @staticmethod
-    def find_target(env, target: str) -> Optional[str]:
-        for sig in env.domaindata['thrift']['objects'].keys():
-            if str(sig.module) + '.' + sig.name == target:
-                return target + ':' + sig.kind
-        return None
-
-    def process_link(self, env, refnode, has_explicit_title: bool, title: str,
-                     target: str) -> Tuple[str, str]:
-        return title, ThriftXRefRole.find_target(env, target)
+    pass
 
 
 class ThriftIndex(Index):
     name = 'modindex'
     localname = 'Thrift Index'
     shortname = 'Index'
+    domain: 'ThriftDomain'
 
     def generate(
-            self, docnames: Iterable[str] = None
-    ) -> Tuple[List[Tuple[str, List[List[Union[str, int]]]]], bool]:
+            self, docnames: Optional[Iterable[str]] = None
+    ) -> Tuple[List[Tuple[str, List[IndexEntry]]], bool]:
         entries = []
-        for name, (docname, objtype,
-                   signature) in self.domain.data['objects'].items():
-            entries.append([name.name, 0, docname, signature, objtype, '', ''])
-        content: Dict[str, list] = {}
+        # sorted, objects are kept in the order documents were read, which
+        # changes with incremental and parallel builds
+        for key, docname in sorted(self.domain.objects.items(),
+                                   key=lambda item: (item[0][1], item[0][2],
+                                                     item[0][0] or '')):
+            entries.append(
+                IndexEntry(key[1], 0, docname, anchor(key), key[2], '', ''))
+        content: Dict[str, List[IndexEntry]] = {}
         for key, group in groupby(entries, key=lambda t: t[0][0].upper()):
             if key not in content:
                 content[key] = []
@@ -278,6 +549,78 @@ class ThriftIndex(Index):
         return sorted(content.items(), key=lambda t: t[0]), False
 
 
+class ThriftKindIndex(Index):
+    """The objects of one of the `BUCKETS` of the domain, by name.
+
+    The buckets are filled as objects are noted, so an index is generated
+    from its own objects only, not from all objects of the domain.
+    """
+    bucket = ''
+    domain: 'ThriftDomain'
+
+    def generate(
+            self, docnames: Optional[Iterable[str]] = None
+    ) -> Tuple[List[Tuple[str, List[IndexEntry]]], bool]:
+        content: Dict[str, List[IndexEntry]] = {}
+        for key, docname in sorted(self.domain.bucket(self.bucket),
+                                   key=lambda item: (item[0][1], item[0][0])):
+            module, name, _ = key
+            content.setdefault(name[0].upper(), []).append(
+                IndexEntry(name, 0, docname, anchor(key), module or '', '',
+                           ''))
+        return sorted(content.items(), key=lambda t: t[0]), False
+
+
+class ThriftServiceIndex(ThriftKindIndex):
+    name = 'services'
+    localname = 'Thrift Services'
+    shortname = 'services'
+    bucket = 'service'
+
+
+class ThriftExceptionIndex(ThriftKindIndex):
+    name = 'exceptions'
+    localname = 'Thrift Exceptions'
+    shortname = 'exceptions'
+    bucket = 'exception'
+
+
+class ThriftMethodIndex(ThriftKindIndex):
+    """The methods of every service, grouped by service."""
+    name = 'methods'
+    localname = 'Thrift Methods'
+    shortname = 'methods'
+    bucket = 'service_method'
+
+    def generate(
+            self, docnames: Optional[Iterable[str]] = None
+    ) -> Tuple[List[Tuple[str, List[IndexEntry]]], bool]:
+        objects = self.domain.objects
+        methods = []
+        for key, docname in self.domain.bucket(self.bucket):
+            module, name, _ = key
+            service, _, method = name.rpartition('.')
+            methods.append((service, module, method, key, docname))
+        methods.sort(key=lambda method: method[:3])
+        content: Dict[str, List[IndexEntry]] = {}
+        for (service, module), group in groupby(methods,
+                                                key=lambda m: m[:2]):
+            entries = content.setdefault(service[0].upper(), [])
+            key = (module, service, 'service')
+            owner = objects.get(key)
+            if owner is None:
+                entries.append(
+                    IndexEntry(service, 1, '', '', module or '', '', ''))
+            else:
+                entries.append(
+                    IndexEntry(service, 1, owner, anchor(key), module or '',
+                               '', ''))
+            for _, _, method, key, docname in group:
+                entries.append(
+                    IndexEntry(method, 2, docname, anchor(key), '', '', ''))
+        return sorted(content.items(), key=lambda t: t[0]), True
+
+
 class ThriftDomain(Domain):
     name = 'thrift'
     object_types = {
@@ -298,8 +641,12 @@ class ThriftDomain(Domain):
         'typedef': ThriftTypedef,
         'enum': ThriftEnum,
         'enum_field': ThriftEnumField,
+        'enum_table': ThriftEnumTable,
         'struct': ThriftStruct,
         'struct_field': ThriftStructField,
+        'struct_table': ThriftStructTable,
+        'used_by': ThriftUsedBy,
+        'version': ThriftVersion,
         'service': ThriftService,
         'service_method': ThriftServiceMethod
     }
@@ -314,14 +661,370 @@ class ThriftDomain(Domain):
         'struct_field': ThriftXRefRole(),
         'service': ThriftXRefRole()
     }
-    indices = [ThriftIndex]
-    initial_data: Dict[str, Any] = {'objects': {}}
+    indices = [
+        ThriftIndex, ThriftServiceIndex, ThriftMethodIndex,
+        ThriftExceptionIndex
+    ]
+    initial_data: Dict[str, Any] = {
+        'objects': {},
+        # bucket -> {object key: docname} of the objects of each of BUCKETS
+        'buckets': {bucket: {} for bucket in BUCKETS},
+        # module name -> (docname, [(target, referrer)]) of documented modules
+        'references': {},
+        # targets whose referrers changed since the last build
+        'changed_targets': set(),
+        # module name -> (docname, [namespace]) of documented modules
+        'namespaces': {},
+        # module name -> (docname, path of the .thrift file) of modules
+        # documented with autothrift_module
+        'sources': {},
+        # docname -> version of documents declaring one; module names of
+        # objects in these documents are qualified as ``version/module``
+        'versions': {},
+        # identifies this data to the symbol database, see `objects`
+        'store_token': None,
+        # docname -> titles of the sections generated by each
+        # autothrift_module of the document, in document order
+        'sections': {},
+        # hash of the shard inventories the data of documents owned by other
+        # shards was taken from, see `sphinx_thrift.shards`
+        'shard_inventories': None
+    }
+    data_version = 9
+    _used_by: Optional[Dict[Target, List[Referrer]]] = None
+    _names: Optional[Dict[Optional[str],
+                          QualifiedNameIndex[ObjectKey]]] = None
+    _store: Optional['SymbolStore'] = None
+
+    @property
+    def store(self) -> Optional['SymbolStore']:
+        """The symbol database, if ``thrift_symbol_db`` is set."""
+        path = self.env.config.thrift_symbol_db
+        if not path:
+            return None
+        if self._store is None:
+            from sphinx_thrift.store import SymbolStore
+            import uuid
+
+            if self.data['store_token'] is None:
+                self.data['store_token'] = uuid.uuid4().hex
+            self._store = SymbolStore(os.path.join(self.env.doctreedir, path))
+            self._store.attach(self.data['store_token'])
+        return self._store
+
+    @property
+    def objects(self) -> MutableMapping[ObjectKey, str]:
+        """Documents defining the objects, by object key."""
+        store = self.store
+        return self.data['objects'] if store is None else store
+
+    def _invalidate(self) -> None:
+        self._used_by = None
+        self._names = None
+
+    def note_version(self, docname: str, version: str) -> None:
+        self.data['versions'][docname] = version
+
+    def versioned(self, module: str, docname: str) -> str:
+        """``module`` qualified by the version of ``docname``, if any."""
+        return versioned(module, self.data['versions'].get(docname))
+
+    def qualify(self, sig: Signature, docname: str) -> Signature:
+        if sig.module is None:
+            return replace(sig, name=self.versioned(sig.name, docname))
+        return replace(sig, module=self.versioned(sig.module, docname))
+
+    def note_object(self,
+                    sig: Signature,
+                    docname: str,
+                    exception: bool = False) -> None:
+        """Note the object of ``sig``, a struct declared as an exception if
+        ``exception`` is set."""
+        bucket = 'exception' if exception else sig.kind
+        store = self.store
+        if store is None:
+            docname = sys.intern(docname)
+            self.data['objects'][sig.key] = docname
+            if bucket in BUCKETS:
+                self.data['buckets'][bucket][sig.key] = docname
+            self._names = None
+            return
+        module = sig.module if sig.module is not None else sig.name
+        store.add(sig.key, docname,
+                  self.data['namespaces'].get(module, ('', []))[1])
+        if bucket in BUCKETS:
+            store.add_to_bucket(bucket, sig.key, docname)
+
+    def bucket(self, bucket: str) -> Iterable[Tuple[ObjectKey, str]]:
+        """The objects of ``bucket``, one of `BUCKETS`, and the documents
+        defining them."""
+        store = self.store
+        if store is None:
+            return self.data['buckets'][bucket].items()
+        return store.bucket(bucket)
+
+    def note_namespaces(self, module: str, namespaces: List[str],
+                        docname: str) -> None:
+        self.data['namespaces'][module] = (docname, namespaces)
+        self._names = None
+
+    def note_source(self, module: str, filename: str, docname: str) -> None:
+        self.data['sources'][module] = (docname, filename)
+
+    def note_sections(self, titles: List[str], docname: str) -> None:
+        self.data['sections'].setdefault(docname, []).append(titles)
+
+    def document_data(self) -> Dict[str, Dict[str, Any]]:
+        """The objects, references, namespaces, version and generated
+        sections of every document, as JSON compatible values."""
+        documents: Dict[str, Dict[str, Any]] = {}
+
+        def document(docname: str) -> Dict[str, Any]:
+            return documents.setdefault(
+                docname, {
+                    'objects': [],
+                    'references': {},
+                    'namespaces': {},
+                    'version': None,
+                    'sections': [],
+                    'exceptions': []
+                })
+
+        for key, docname in self.objects.items():
+            document(docname)['objects'].append(list(key))
+        for key, docname in self.bucket('exception'):
+            document(docname)['exceptions'].append(list(key))
+        for module, (docname, refs) in self.data['references'].items():
+            document(docname)['references'][module] = [
+                [list(target), [role, list(key)]]
+                for target, (role, key) in refs
+            ]
+        for module, (docname, names) in self.data['namespaces'].items():
+            document(docname)['namespaces'][module] = names
+        for docname, version in self.data['versions'].items():
+            document(docname)['version'] = version
+        for docname, sections in self.data['sections'].items():
+            document(docname)['sections'] = sections
+        return documents
+
+    def load_document_data(self, docname: str, data: Dict[str, Any]) -> None:
+        """Take over the data of ``docname`` as returned by
+        :meth:`document_data` of another build."""
+        if data['version']:
+            self.note_version(docname, data['version'])
+        for module, names in data['namespaces'].items():
+            self.note_namespaces(module, names, docname)
+        exceptions = {tuple(key) for key in data['exceptions']}
+        for module, name, kind in data['objects']:
+            self.note_object(Signature(kind, name, module), docname,
+                             (module, name, kind) in exceptions)
+        for module, refs in data['references'].items():
+            refs = [(tuple(target), (role, tuple(key)))
+                    for target, (role, key) in refs]
+            self.data['references'][module] = (docname, refs)
+            self.data['changed_targets'].update(target for target, _ in refs)
+        self._used_by = None
+        if data['sections']:
+            self.data['sections'][docname] = data['sections']
+
+    def note_definitions(self, module: ast.Module, docname: str) -> None:
+        """Store the AST data of ``module`` in the symbol database."""
+        store = self.store
+        if store is None:
+            return
+        from sphinx_thrift.store import module_records
+
+        version = self.data['versions'].get(docname)
+        store.add_definitions(
+            docname, ((versioned_key(key, version), record)
+                      for key, record in module_records(module)))
+
+    def note_references(self, module: ast.Module, docname: str) -> None:
+        refs = stored_references(module)
+        if refs is None:
+            refs = module_references(module)
+        version = self.data['versions'].get(docname)
+        if version:
+            refs = [((versioned(target[0], version), target[1]),
+                     (role, versioned_key(key, version)))
+                    for target, (role, key) in refs]
+        self.data['references'][self.versioned(module.name, docname)] = (
+            docname, refs)
+        self.data['changed_targets'].update(target for target, _ in refs)
+        self._used_by = None
+
+    def _name_index(self, version: Optional[str]
+                    ) -> QualifiedNameIndex[ObjectKey]:
+        if self._names is None:
+            # one index per version, objects of other versions do not make
+            # names ambiguous
+            indices: Dict[Optional[str], QualifiedNameIndex[ObjectKey]] = {}
+            namespaces = self.data['namespaces']
+            for key in self.data['objects']:
+                module, name, _ = key
+                ns = namespaces.get(module, ('', []))[1]
+                if module is None:
+                    version_, name = split_version(name)
+                else:
+                    version_, module = split_version(module)
+                index = indices.setdefault(version_, QualifiedNameIndex())
+                index.add(key, module, name, ns)
+            self._names = indices
+        return self._names.get(version) or QualifiedNameIndex()
+
+    def _lookup(self, target: str, version: Optional[str]
+                ) -> Tuple[Optional[ObjectKey], List[ObjectKey]]:
+        store = self.store
+        if store is not None:
+            return store.lookup(target, version)
+        index = self._name_index(version)
+        key = index.lookup(target)
+        return key, [] if key is not None else index.candidates(target)
+
+    def find_object(self, target: str,
+                    version: Optional[str] = None) -> Optional[ObjectKey]:
+        """The object ``target`` refers to, qualified by module, namespace
+        or neither, among the objects of ``version`` or else those documented
+        without a version."""
+        key, _ = self._lookup(target, version)
+        if key is None and version is not None:
+            key, _ = self._lookup(target, None)
+        return key
+
+    def used_by(self, target: Target) -> List[Referrer]:
+        """Objects referencing ``target`` in any documented module."""
+        if self._used_by is None:
+            # one pass over all references, then every lookup is O(1)
+            index: Dict[Target, List[Referrer]] = {}
+            for _, refs in self.data['references'].values():
+                for target_, referrer in refs:
+                    index.setdefault(target_, []).append(referrer)
+            self._used_by = index
+        return self._used_by.get(target, [])
+
+    def clear_doc(self, docname: str) -> None:
+        store = self.store
+        if store is not None:
+            store.remove_doc(docname)
+            # parallel reads clear all documents before forking the readers,
+            # which would wait for this transaction otherwise
+            store.commit()
+        objects = self.data['objects']
+        for key in [k for k, doc in objects.items() if doc == docname]:
+            del objects[key]
+        for bucket in self.data['buckets'].values():
+            for key in [k for k, doc in bucket.items() if doc == docname]:
+                del bucket[key]
+        references = self.data['references']
+        for module in [m for m, (doc, _) in references.items()
+                       if doc == docname]:
+            _, refs = references.pop(module)
+            self.data['changed_targets'].update(target for target, _ in refs)
+        namespaces = self.data['namespaces']
+        for module in [m for m, (doc, _) in namespaces.items()
+                       if doc == docname]:
+            del namespaces[module]
+        sources = self.data['sources']
+        for module in [m for m, (doc, _) in sources.items() if doc == docname]:
+            del sources[module]
+        self.data['versions'].pop(docname, None)
+        self.data['sections'].pop(docname, None)
+        self._invalidate()
+
+    def process_doc(self, env: Any, docname: str,
+                    document: nodes.document) -> None:
+        # this may run in a worker process when reading in parallel, what
+        # it wrote to the symbol database must be visible to the others
+        store = self.store
+        if store is not None:
+            store.commit()
+
+    def merge_domaindata(self, docnames: AbstractSet[str],
+                         otherdata: Dict[str, Any]) -> None:
+        for key, docname in otherdata['objects'].items():
+            if docname in docnames:
+                self.data['objects'][key] = docname
+        for name, bucket in otherdata['buckets'].items():
+            for key, docname in bucket.items():
+                if docname in docnames:
+                    self.data['buckets'][name][key] = docname
+        for module, (docname, refs) in otherdata['references'].items():
+            if docname in docnames:
+                self.data['references'][module] = (docname, refs)
+        for module, (docname, names) in otherdata['namespaces'].items():
+            if docname in docnames:
+                self.data['namespaces'][module] = (docname, names)
+        for module, (docname, filename) in otherdata['sources'].items():
+            if docname in docnames:
+                self.data['sources'][module] = (docname, filename)
+        for docname, version in otherdata['versions'].items():
+            if docname in docnames:
+                self.data['versions'][docname] = version
+        for docname, sections in otherdata['sections'].items():
+            if docname in docnames:
+                self.data['sections'][docname] = sections
+        self.data['changed_targets'].update(otherdata['changed_targets'])
+        self._invalidate()
 
     def resolve_xref(self, env, fromdocname, builder, typ, target, node,
                      contnode):
-        tgt = ThriftXRefRole.find_target(env, target)
-        if tgt is not None:
-            return make_refnode(builder, fromdocname, fromdocname, tgt,
-                                contnode)
-        else:
+        version = self.data['versions'].get(fromdocname)
+        key = self.find_object(target, version)
+        if key is None:
+            _, candidates = self._lookup(target, version)
+            if len(candidates) > 1:
+                logger.warning(
+                    'ambiguous thrift reference %r, it may refer to %s',
+                    target, ', '.join(anchor(c) for c in candidates),
+                    location=node)
             return None
+        return make_refnode(builder, fromdocname, self.objects[key],
+                            anchor(key), contnode)
+
+
+def thrift_domain(env: BuildEnvironment) -> ThriftDomain:
+    """The thrift domain of ``env``."""
+    return cast(ThriftDomain, env.get_domain('thrift'))
+
+
+def get_updated_docs(app: Any, env: Any) -> List[str]:
+    """Documents showing targets whose "Used by" list may have changed."""
+    domain = env.get_domain('thrift')
+    changed: Set[Target] = domain.data['changed_targets']
+    store = domain.store
+    if store is not None:
+        docnames = store.docnames(changed)
+        # reading is done, removed documents included
+        store.commit()
+    else:
+        docnames = {
+            docname
+            for (module, name, _), docname in domain.objects.items()
+            if (module, name) in changed
+        }
+    changed.clear()
+    return sorted(docnames)
+
+
+def process_used_by(app: Any, doctree: nodes.document,
+                    fromdocname: str) -> None:
+    domain = app.env.get_domain('thrift')
+    objects = domain.objects
+    for node in doctree.findall(used_by):
+        referrers = sorted(set(domain.used_by((node['module'],
+                                               node['name']))))
+        if not referrers:
+            node.replace_self([])
+            continue
+        items = nodes.bullet_list()
+        for role, key in referrers:
+            module, name, kind = key
+            qualified = f'{split_version(module)[1]}.{name}'
+            label = nodes.literal(qualified, qualified)
+            if key in objects:
+                label = make_refnode(app.builder, fromdocname, objects[key],
+                                     anchor(key), label)
+            items += nodes.list_item(
+                '', nodes.paragraph('', '', label,
+                                    nodes.Text(f' ({role})')))
+        node.replace_self([nodes.rubric('', 'Used by'), items])
@@ -0,0 +1,198 @@
+from typing import Dict, List, Optional, Tuple
+
+import hashlib
+import os
+import shutil
+from subprocess import run, PIPE
+from xml.sax.saxutils import escape, quoteattr
+
+import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.cache import atomic_write, includes, touch
+from sphinx_thrift.references import module_references
+
+# (source, target, label) of an edge between two nodes of a graph
+Edge = Tuple[str, str, str]
+# node names and edges, both sorted, so that equal graphs have equal sources
+Graph = Tuple[List[str], List[Edge]]
+
+GRAPH_VERSION = '1'
+
+
+def _module_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def include_graph(filename: str) -> Graph:
+    """The modules ``filename`` includes, transitively, with an edge for every
+    ``include`` statement."""
+    nodes = set()
+    edges = set()
+    seen = set()
+    pending = [os.path.normpath(filename)]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        nodes.add(_module_name(path))
+        if not os.path.exists(path):
+            continue
+        for included in includes(path):
+            edges.add((_module_name(path), _module_name(included), ''))
+            pending.append(included)
+    return sorted(nodes), sorted(edges)
+
+
+def struct_graph(module: ast.Module) -> Graph:
+    """Structs of ``module`` and the types their fields refer to."""
+    edges = set()
+    for (target_module, target), (role, key) in module_references(module):
+        if role != 'field':
+            continue
+        struct, field = key[1].split('.', 1)
+        if target_module != module.name:
+            target = f'{target_module}.{target}'
+        edges.add((struct, target, field))
+    nodes = {s.name for s in module.structs}
+    nodes.update(target for _, target, _ in edges)
+    return sorted(nodes), sorted(edges)
+
+
+def to_dot(name: str, graph: Graph) -> str:
+    nodes, edges = graph
+    lines = [f'digraph {quoteattr(name)} {{',
+             '  node [shape=box, fontname="sans-serif", fontsize=10];',
+             '  edge [fontname="sans-serif", fontsize=9];']
+    lines.extend(f'  {quoteattr(node)};' for node in nodes)
+    for source, target, label in edges:
+        attrs = f' [label={quoteattr(label)}]' if label else ''
+        lines.append(f'  {quoteattr(source)} -> {quoteattr(target)}{attrs};')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def _layers(graph: Graph) -> Dict[str, int]:
+    """Longest path from a root to every node, cut short by cycles."""
+    nodes, edges = graph
+    layer = {node: 0 for node in nodes}
+    for _ in nodes:
+        changed = False
+        for source, target, _ in edges:
+            if (source != target and layer[target] <= layer[source]
+                    and layer[source] + 1 < len(nodes)):
+                layer[target] = layer[source] + 1
+                changed = True
+        if not changed:
+            break
+    return layer
+
+
+def layered_svg(graph: Graph) -> str:
+    """A simple SVG drawing of ``graph`` for systems without graphviz.
+
+    Nodes are drawn in rows by their distance from the roots of the graph,
+    with straight edges between them.
+    """
+    nodes, edges = graph
+    layer = _layers(graph)
+    rows: Dict[int, List[str]] = {}
+    for node in nodes:
+        rows.setdefault(layer[node], []).append(node)
+    boxes: Dict[str, Tuple[int, int, int]] = {}
+    width = 0
+    for row, names in sorted(rows.items()):
+        x = 10
+        for node in names:
+            w = 16 + 7 * len(node)
+            boxes[node] = (x, 10 + row * 70, w)
+            x += w + 20
+        width = max(width, x)
+    height = 10 + len(rows) * 70
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+        f'height="{height}" font-family="sans-serif" font-size="11">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" '
+        'markerWidth="6" markerHeight="6" orient="auto">'
+        '<path d="M0,0L10,5L0,10z"/></marker></defs>'
+    ]
+    for source, target, label in edges:
+        sx, sy, sw = boxes[source]
+        tx, ty, tw = boxes[target]
+        x1, y1, x2, y2 = sx + sw // 2, sy + 24, tx + tw // 2, ty
+        if ty <= sy:
+            y1, y2 = sy, ty + 24
+        out.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" '
+                   'stroke="black" marker-end="url(#arrow)"/>')
+        if label:
+            out.append(f'<text x="{(x1 + x2) // 2 + 3}" '
+                       f'y="{(y1 + y2) // 2}">{escape(label)}</text>')
+    for node, (x, y, w) in boxes.items():
+        out.append(f'<rect x="{x}" y="{y}" width="{w}" height="24" '
+                   'fill="white" stroke="black"/>')
+        out.append(f'<text x="{x + 8}" y="{y + 16}">{escape(node)}</text>')
+    out.append('</svg>')
+    return '\n'.join(out) + '\n'
+
+
+class GraphRenderer:
+    """SVG drawings of graphs, cached by the hash of their DOT source.
+
+    The DOT source is generated from nothing but the graph, so a graph whose
+    part of the AST did not change is served from the cache without running
+    ``dot``. Without a ``dot`` executable the graph is drawn by
+    :func:`layered_svg`.
+    """
+
+    def __init__(self, directory: str, dot: str = 'dot') -> None:
+        self.directory = directory
+        self.dot = dot
+
+    def key(self, source: str, renderer: str) -> str:
+        return hashlib.sha1(f'{GRAPH_VERSION}:{renderer}:{source}'.encode(
+            'utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.svg')
+
+    def _run_dot(self, source: str) -> Optional[str]:
+        try:
+            result = run([self.dot, '-Tsvg'],
+                         input=source.encode('utf-8'),
+                         stdout=PIPE,
+                         stderr=PIPE)
+        except OSError:
+            return None
+        svg = result.stdout.decode('utf-8', 'replace')
+        if result.returncode != 0 or '<svg' not in svg:
+            return None
+        # drop the XML declaration and doctype, the SVG is inlined in HTML
+        return svg[svg.find('<svg'):]
+
+    def render(self, name: str, graph: Graph) -> str:
+        source = to_dot(name, graph)
+        renderers = ['layered']
+        if shutil.which(self.dot) is not None:
+            renderers.insert(0, self.dot)
+        svg: Optional[str] = None
+        missing = []
+        for renderer in renderers:
+            path = self._path(self.key(source, renderer))
+            if os.path.exists(path):
+                touch(path)
+                with open(path, encoding='utf-8') as f:
+                    svg = f.read()
+                break
+            missing.append(path)
+            if renderer == 'layered':
+                svg = layered_svg(graph)
+            else:
+                svg = self._run_dot(source)
+            if svg is not None:
+                break
+        assert (svg is not None)
+        data = svg.encode('utf-8')
+        # when dot fails, the drawing replacing its own is cached under its
+        # key too, so that it is not run again for the same graph
+        for path in missing:
+            atomic_write(path, lambda f: f.write(data))
+        return svg
@@ -0,0 +1,83 @@
+"""Content hashes of the files of a build, for publishing only what changed.
+
+The manifest is a JSON file in the output directory mapping the path of
+every file, relative to the directory and with ``/`` separators, to the
+SHA-256 of its content. Comparing the manifests of two builds with
+`changed_files` (or ``sphinx-thrift changed``) lists the files to upload and
+to delete; pages of unchanged modules are byte-identical across builds.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import hashlib
+import json
+import os
+
+from sphinx.application import Sphinx
+
+from sphinx_thrift.cache import ThriftError
+
+MANIFEST_VERSION = 1
+
+# files of the build that are not part of the site: the inventory of a shard
+# build, see `sphinx_thrift.shards`
+_EXCLUDED = ('thrift-shard.json', )
+
+
+def file_hashes(outdir: str, exclude: Tuple[str, ...] = ()) -> Dict[str, str]:
+    """SHA-256 of every file below ``outdir`` by relative path, leaving out
+    the paths in ``exclude``."""
+    hashes = {}
+    for root, dirs, files in os.walk(outdir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, outdir).replace(os.sep, '/')
+            if relative in exclude:
+                continue
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            hashes[relative] = digest.hexdigest()
+    return hashes
+
+
+def write_manifest(outdir: str, name: str) -> None:
+    """Write the manifest of ``outdir`` to the file ``name`` in it."""
+    hashes = file_hashes(outdir, _EXCLUDED + (name, ))
+    path = os.path.join(outdir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest = {'version': MANIFEST_VERSION, 'files': hashes}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write('\n')
+
+
+def read_manifest(path: str) -> Dict[str, str]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ThriftError(path, f'cannot read manifest: {e}') from e
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ThriftError(path, 'manifest of another version')
+    return manifest['files']
+
+
+def changed_files(old: Dict[str, str],
+                  new: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """The files added or changed from ``old`` to ``new``, and the files
+    removed."""
+    changed = sorted(path for path, digest in new.items()
+                     if old.get(path) != digest)
+    removed = sorted(path for path in old if path not in new)
+    return changed, removed
+
+
+def write_build_manifest(app: Sphinx,
+                         exception: Optional[Exception]) -> None:
+    """Write ``thrift_manifest`` after a successful build."""
+    name = app.config.thrift_manifest
+    if not name or exception is not None:
+        return
+    write_manifest(str(app.outdir), name)
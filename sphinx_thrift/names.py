@@ -0,0 +1,97 @@
+from typing import (Any, Dict, Generic, Iterable, List, Optional, Tuple,
+                    TypeVar)
+
+Key = TypeVar('Key')
+
+# how a name was derived from an object, lower is preferred when several
+# objects share a name
+MODULE_QUALIFIED = 0
+NAMESPACE_QUALIFIED = 1
+PARTIAL = 2
+
+_AMBIGUOUS: Any = object()
+
+
+def split_version(module: str) -> Tuple[Optional[str], str]:
+    """The version and the name of a possibly version qualified module."""
+    version, _, name = module.rpartition('/')
+    return version or None, name
+
+
+def versioned(module: str, version: Optional[str]) -> str:
+    return f'{version}/{module}' if version else module
+
+
+def object_names(module: Optional[str], name: str,
+                 namespaces: Iterable[str]) -> Dict[str, int]:
+    """Every way of writing the name of an object, with its priority."""
+    parts = name.split('.')
+    qualified = [(MODULE_QUALIFIED, [module] if module else [])]
+    qualified.extend(
+        (NAMESPACE_QUALIFIED, ns.split('.')) for ns in namespaces)
+    names: Dict[str, int] = {}
+    for priority, prefix in qualified:
+        path = prefix + parts
+        names['.'.join(path)] = priority
+        for i in range(1, len(path)):
+            names.setdefault('.'.join(path[i:]), PARTIAL)
+    return names
+
+
+class QualifiedNameIndex(Generic[Key]):
+    """Maps every way of writing an object's name to the object.
+
+    An object named ``Struct.field`` in module ``Example`` with namespace
+    ``com.acme.example`` can be referred to as ``Example.Struct.field``,
+    ``com.acme.example.Struct.field`` or any trailing part of these, like
+    ``example.Struct.field`` or ``field``. All of these are computed when the
+    index is built, so a lookup is a single dictionary access; names shared
+    by several objects are marked as ambiguous at that time as well.
+    """
+
+    def __init__(self) -> None:
+        self._names: Dict[str, Tuple[int, Key]] = {}
+        self._objects: List[Tuple[Key, Optional[str], str,
+                                  Iterable[str]]] = []
+        self._candidates: Optional[Dict[str, List[Key]]] = None
+
+    def add(self, key: Key, module: Optional[str], name: str,
+            namespaces: Iterable[str] = ()) -> None:
+        self._objects.append((key, module, name, namespaces))
+        self._candidates = None
+        for name_, priority in object_names(module, name,
+                                            namespaces).items():
+            best = self._names.get(name_)
+            if best is None or priority < best[0]:
+                self._names[name_] = (priority, key)
+            elif priority == best[0] and best[1] != key:
+                self._names[name_] = (priority, _AMBIGUOUS)
+
+    def lookup(self, name: str) -> Optional[Key]:
+        """The object called ``name``, if there is exactly one."""
+        entry = self._names.get(name)
+        if entry is None or entry[1] is _AMBIGUOUS:
+            return None
+        return entry[1]
+
+    def ambiguous(self) -> Dict[str, List[Key]]:
+        """Names shared by several objects, with the objects sharing them."""
+        if self._candidates is None:
+            candidates: Dict[str, List[Key]] = {
+                name: []
+                for name, (_, key) in self._names.items()
+                if key is _AMBIGUOUS
+            }
+            for key, module, name_, namespaces in self._objects:
+                names = object_names(module, name_, namespaces)
+                for name, priority in names.items():
+                    if (name in candidates
+                            and self._names[name][0] == priority):
+                        candidates[name].append(key)
+            for keys in candidates.values():
+                keys.sort(key=str)
+            self._candidates = candidates
+        return self._candidates
+
+    def candidates(self, name: str) -> List[Key]:
+        return self.ambiguous().get(name, [])
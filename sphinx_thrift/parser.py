@@ -1,11 +1,17 @@
-from typing import Dict, Callable, List
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple, cast)
 
 from enum import Enum
+import json
+import sys
 
 import xml.etree.ElementTree as ET
 
 import sphinx_thrift.thrift_ast as ast
 
+# bytes read at a time when parsing a file
+CHUNK_SIZE = 64 * 1024
+
 
 class Tag(Enum):
     NAMESPACE = 'namespace'
@@ -21,6 +27,10 @@ class Tag(Enum):
     THROWS = 'throws'
 
 
+# elements holding the value of a constant, as opposed to its type
+VALUE_TAGS = {'int', 'double', 'string', 'list', 'map', 'null'}
+
+
 def parse_list_type(root: ET.Element) -> ast.ListType:
     value_node = root.find('elemType')
     assert (value_node is not None)
@@ -44,7 +54,8 @@ def parse_map_type(root: ET.Element) -> ast.MapType:
 
 def parse_reference_type(root: ET.Element) -> ast.ReferenceType:
     return ast.ReferenceType(
-        module=root.attrib['type-module'], name=root.attrib['type-id'])
+        module=sys.intern(root.attrib['type-module']),
+        name=sys.intern(root.attrib['type-id']))
 
 
 def parse_type(root: ET.Element) -> ast.Type:
@@ -54,7 +65,8 @@ def parse_type(root: ET.Element) -> ast.Type:
         'map': parse_map_type,
         'id': parse_reference_type
     }
-    t = root.attrib['type']
+    # base type names repeat in every field, share them
+    t = sys.intern(root.attrib['type'])
     return type_funcs.get(t, lambda _: t)(root)
 
 
@@ -64,13 +76,51 @@ def parse_namespace(root: ET.Element) -> ast.Namespace:
         name=root.attrib['value'], language=root.attrib['name'])
 
 
+def _container(open_: str, items: List[str]) -> str:
+    text = ','.join(items)
+    return f'{open_}{len(items)}:{len(text)}:{text}'
+
+
+def _value_text(root: ET.Element) -> str:
+    """The value ``root`` in the form of `ast.ConstantValue`."""
+    if root.tag == 'int':
+        return json.dumps(int(root.text or 0))
+    if root.tag == 'double':
+        return json.dumps(float(root.text or 0))
+    if root.tag == 'string':
+        return json.dumps(root.text or '', ensure_ascii=False)
+    if root.tag == 'list':
+        # entries may or may not be wrapped in an <entry> element
+        return _container('[', [
+            _value_text(el[0] if el.tag == 'entry' and len(el) else el)
+            for el in root
+        ])
+    if root.tag == 'map':
+        entries = []
+        for entry in root:
+            key, value = entry.find('key'), entry.find('value')
+            assert (key is not None and len(key))
+            assert (value is not None and len(value))
+            entries.append(f'{_value_text(key[0])}:{_value_text(value[0])}')
+        return _container('{', entries)
+    return 'null'
+
+
+def parse_constant_value(root: ET.Element) -> Optional[ast.ConstantValue]:
+    """The value of the constant ``root``, if the compiler wrote one."""
+    for el in root:
+        if el.tag in VALUE_TAGS:
+            return ast.ConstantValue(_value_text(el))
+    return None
+
+
 def parse_constant(root: ET.Element) -> ast.Constant:
     assert (root.tag == Tag.CONSTANT.value)
     return ast.Constant(
         name=root.attrib['name'],
         doc=root.attrib.get('doc', ''),
         type_=parse_type(root),
-        value=None)
+        value=parse_constant_value(root))
 
 
 def parse_typedef(root: ET.Element) -> ast.Typedef:
@@ -100,10 +150,10 @@ def parse_enum(root: ET.Element) -> ast.Enum:
 def _parse_field_with_tag(tag: str, root: ET.Element) -> ast.Field:
     assert (root.tag == tag)
     return ast.Field(
-        name=root.attrib['name'],
+        name=sys.intern(root.attrib['name']),
         key=int(root.attrib['field-id']),
         doc=root.get('doc', ''),
-        required=root.get('required', 'required'),
+        required=sys.intern(root.get('required', 'required')),
         type_=parse_type(root))
 
 
@@ -159,42 +209,109 @@ def parse_service(root: ET.Element) -> ast.Service:
         doc=root.attrib.get('doc', ''),
         functions=[parse_method(m) for m in root])
 
+class _ModuleParts:
+    """The definitions of a module, collected one element at a time."""
+
+    def __init__(self) -> None:
+        self.namespaces: List[ast.Namespace] = []
+        self.typedefs: List[ast.Typedef] = []
+        self.constants: List[ast.Constant] = []
+        self.enums: List[ast.Enum] = []
+        self.structs: List[ast.Struct] = []
+        self.exceptions: List[ast.Struct] = []
+        self.services: List[ast.Service] = []
+        self._parsers: Dict[str, Callable[[ET.Element], None]] = {
+            Tag.NAMESPACE.value:
+            lambda el: self.namespaces.append(parse_namespace(el)),
+            Tag.TYPEDEF.value:
+            lambda el: self.typedefs.append(parse_typedef(el)),
+            Tag.CONSTANT.value:
+            lambda el: self.constants.append(parse_constant(el)),
+            Tag.ENUM.value:
+            lambda el: self.enums.append(parse_enum(el)),
+            Tag.STRUCT.value:
+            lambda el: self.structs.append(parse_struct(el)),
+            Tag.EXCEPTION.value:
+            lambda el: self.exceptions.append(parse_exception(el)),
+            Tag.SERVICE.value:
+            lambda el: self.services.append(parse_service(el)),
+        }
+
+    def add(self, el: ET.Element) -> None:
+        parse = self._parsers.get(el.tag)
+        if parse is not None:
+            parse(el)
+
+    def module(self, root: ET.Element) -> ast.Module:
+        assert(root.tag == 'document')
+        return ast.Module(
+            name=root.attrib['name'],
+            doc=root.attrib.get('doc', ''),
+            namespaces=self.namespaces,
+            typedefs=self.typedefs,
+            constants=self.constants,
+            enums=self.enums,
+            structs=self.structs + self.exceptions,
+            services=self.services)
+
+
 def parse_module(root: ET.Element) -> ast.Module:
-    assert(root.tag == 'document')
-    return ast.Module(
-        name=root.attrib['name'],
-        doc=root.attrib.get('doc', ''),
-        namespaces=[
-            parse_namespace(ns) for ns in root.findall(Tag.NAMESPACE.value)
-        ],
-        typedefs=[
-            parse_typedef(td) for td in root.findall(Tag.TYPEDEF.value)
-        ],
-        constants=[
-            parse_constant(const) for const in root.findall(Tag.CONSTANT.value)
-        ],
-        enums=[parse_enum(enum) for enum in root.findall(Tag.ENUM.value)],
-        structs=[
-            parse_struct(struct) for struct in root.findall(Tag.STRUCT.value)
-        ] + [
-            parse_exception(exc) for exc in root.findall(Tag.EXCEPTION.value)
-        ],
-        services=[
-            parse_service(service) for service in root.findall(Tag.SERVICE.value)
-        ]
-    )
+    parts = _ModuleParts()
+    for el in root:
+        parts.add(el)
+    return parts.module(root)
+
+
+def _strip_namespaces(el: ET.Element) -> None:
+    if '}' in el.tag:
+        el.tag = el.tag.split('}', 1)[1]  # strip all namespaces
+    for at in list(el.attrib.keys()): # strip namespaces of attributes too
+        if '}' in at:
+            newat = at.split('}', 1)[1]
+            el.attrib[newat] = el.attrib[at]
+            del el.attrib[at]
+
+
+def parse_stream(chunks: Iterable[bytes]) -> ast.Module:
+    """Parse the XML of a module while it is being read or generated.
+
+    ``chunks`` are successive pieces of the XML document. Each definition is
+    turned into its AST as soon as its closing tag arrives and is then
+    dropped from the element tree, so parsing overlaps with producing the
+    XML and the tree of the whole module is never held in memory.
+    """
+    parser: 'ET.XMLPullParser[ET.Element]' = ET.XMLPullParser(
+        events=('start', 'end'))
+    parts = _ModuleParts()
+    document: Optional[ET.Element] = None
+    depth = 0
+
+    def handle_events() -> None:
+        nonlocal document, depth
+        # only start and end events are requested, and they carry elements
+        events = cast(Iterator[Tuple[str, ET.Element]], parser.read_events())
+        for event, el in events:
+            if event == 'start':
+                depth += 1
+                # <document> is the only child of <idl>
+                if depth == 2 and el.tag.rpartition('}')[2] == 'document':
+                    document = el
+                continue
+            depth -= 1
+            _strip_namespaces(el)
+            if depth == 2 and document is not None:
+                parts.add(el)
+                document.remove(el)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        handle_events()
+    parser.close()
+    handle_events()
+    assert(document is not None)
+    return parts.module(document)
+
 
 def load_module(filename: str) -> ast.Module:
-    et = ET.iterparse(filename)
-    for _, el in et:
-        if '}' in el.tag:
-            el.tag = el.tag.split('}', 1)[1]  # strip all namespaces
-        for at in el.attrib.keys(): # strip namespaces of attributes too
-            if '}' in at:
-                newat = at.split('}', 1)[1]
-                el.attrib[newat] = el.attrib[at]
-                del el.attrib[at]
-    root = et.root  # type: ignore
-    docu = root.find('document')
-    assert(docu is not None)
-    return parse_module(docu)
+    with open(filename, 'rb') as f:
+        return parse_stream(iter(lambda: f.read(CHUNK_SIZE), b''))
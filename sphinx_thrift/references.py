@@ -0,0 +1,49 @@
+from typing import Iterator, List, Optional, Tuple
+
+import sphinx_thrift.thrift_ast as ast
+
+# (module, name) of a referenced definition
+Target = Tuple[str, str]
+# a place referencing a target: the role of the reference ('field',
+# 'argument', ...) and the (module, name, kind) of the referring object
+Referrer = Tuple[str, Tuple[Optional[str], str, str]]
+
+
+def type_references(type_: ast.Type) -> Iterator[ast.ReferenceType]:
+    """References to definitions anywhere inside ``type_``."""
+    if isinstance(type_, ast.ReferenceType):
+        yield type_
+    elif isinstance(type_, ast.MapType):
+        yield from type_references(type_.keyType)
+        yield from type_references(type_.valueType)
+    elif isinstance(type_, (ast.ListType, ast.SetType)):
+        yield from type_references(type_.valueType)
+
+
+def referring_types(module: ast.Module
+                    ) -> Iterator[Tuple[Referrer, ast.Type]]:
+    """Every type used in ``module`` with the object that uses it."""
+    name = module.name
+    for td in module.typedefs:
+        yield ('typedef', (name, td.name, 'typedef')), td.type_
+    for const in module.constants:
+        yield ('constant', (name, const.name, 'constant')), const.type_
+    for struct in module.structs:
+        for field in struct.fields:
+            yield ('field', (name, f'{struct.name}.{field.name}',
+                             'struct_field')), field.type_
+    for service in module.services:
+        for func in service.functions:
+            key = (name, f'{service.name}.{func.name}', 'service_method')
+            yield ('returns', key), func.returnType
+            for arg in func.arguments:
+                yield (f'argument {arg.name}', key), arg.type_
+            for exc in func.exceptions:
+                yield (f'throws {exc.name}', key), exc.type_
+
+
+def module_references(module: ast.Module) -> List[Tuple[Target, Referrer]]:
+    """``(target, referrer)`` pairs for all references made by ``module``."""
+    return [((ref.module or module.name, ref.name), referrer)
+            for referrer, type_ in referring_types(module)
+            for ref in type_references(type_)]
@@ -0,0 +1,113 @@
+"""Compiling the thrift modules of a build up front, concurrently.
+
+Before Sphinx reads the outdated documents, the modules they document with
+``autothrift_module`` and ``autothrift_graph`` are compiled by a pool of
+``thrift_compile_jobs`` threads: each runs a compiler, stopped after
+``thrift_compile_timeout`` seconds, parses its output as it is written and
+stores the module in the module cache. A module that fails is marked as
+failed for the rest of the build; the pages documenting it get warnings at
+the problems the compiler reported, and all other modules are documented as
+usual.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+from sphinx.util import logging
+
+from sphinx_thrift.binary import encode_module
+from sphinx_thrift.cache import (ModuleCache, ThriftError, atomic_write,
+                                 clear_failures, diagnostic_re, locked)
+from sphinx_thrift.documenter import module_cache
+from sphinx_thrift.shards import owns
+
+logger = logging.getLogger(__name__)
+
+directive_re = re.compile(
+    r'^\s*\.\.\s+autothrift_(?:module|graph)::\s*(\S+)\s*$', re.MULTILINE)
+
+
+class CompileScheduler:
+    """Compiles thrift modules into a `ModuleCache`, running up to ``jobs``
+    compilers at once."""
+
+    def __init__(self, cache: ModuleCache, jobs: Optional[int] = None) -> None:
+        self.cache = cache
+        self.jobs = jobs or os.cpu_count() or 1
+
+    def compile(self, filenames: Iterable[str]
+                ) -> Dict[str, Optional[ThriftError]]:
+        """Compile the modules of ``filenames`` missing from the cache,
+        returning the error of every file, ``None`` for those that are
+        cached now."""
+        filenames = list(dict.fromkeys(filenames))
+        with ThreadPoolExecutor(self.jobs) as executor:
+            results = list(executor.map(self._compile, filenames))
+        errors = {}
+        for filename, (error, messages) in zip(filenames, results):
+            # logged here, Sphinx's warning handlers expect a single thread
+            for location, line, message in diagnostic_re.findall(messages):
+                logger.warning('%s',
+                               message,
+                               location=f'{location}:{line}',
+                               type='thrift',
+                               subtype='compile')
+            errors[filename] = error
+        return errors
+
+    def _compile(self,
+                 filename: str) -> Tuple[Optional[ThriftError], str]:
+        """Compile ``filename`` into the cache unless it is there, returning
+        the error and what the compiler wrote to stderr; runs in a worker
+        thread."""
+        cache = self.cache
+        key = cache.key(filename)
+        path = cache.path(key)
+        if os.path.exists(path):
+            return None, ''
+        # a module being compiled by another process is waited for, like
+        # ModuleCache does, and then found in the cache
+        with locked(cache.directory, cache.lock_name(key)):
+            if os.path.exists(path):
+                return None, ''
+            try:
+                module, messages = cache.compile_module(filename, key)
+            except ThriftError as e:
+                cache.note_failure(key, e)
+                return e, ''
+            data = encode_module(module)
+            atomic_write(path, lambda f: f.write(data))
+        return None, messages
+
+
+def documented_modules(env: BuildEnvironment,
+                       docnames: Iterable[str]) -> List[str]:
+    """The thrift files documented in ``docnames``, by the arguments of
+    their ``autothrift_module`` and ``autothrift_graph`` directives."""
+    filenames: Set[str] = set()
+    for docname in docnames:
+        if not owns(env, docname):
+            continue
+        try:
+            with open(env.doc2path(docname),
+                      encoding=env.config.source_encoding) as f:
+                source = f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        filenames.update(name + '.thrift'
+                         for name in directive_re.findall(source))
+    return sorted(filenames)
+
+
+def compile_modules(app: Sphinx, env: BuildEnvironment,
+                    docnames: List[str]) -> None:
+    """Compile the modules of the documents about to be read."""
+    clear_failures()
+    filenames = documented_modules(env, docnames)
+    if filenames:
+        CompileScheduler(module_cache(env),
+                         app.config.thrift_compile_jobs).compile(filenames)
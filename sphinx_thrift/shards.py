@@ -0,0 +1,358 @@
+"""Building the documentation in shards that are merged into one site.
+
+Every document belongs to one of ``count`` shards by the hash of its name.
+A shard build reads all documents, but only the documents it owns have
+their thrift modules compiled and rendered. The thrift domain data of the
+other documents (objects, references, namespaces and generated sections) is
+taken from the inventories the shards owning them wrote in an earlier pass,
+so the domain indices, "Used by" lists and references across shards come out
+the same in every shard. The merge copies the pages of every document from
+the shard owning it and combines the search indexes.
+"""
+from typing import (Any, Collection, Dict, Iterable, List, Optional, Sequence,
+                    Tuple)
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+from sphinx_thrift.cache import ThriftError
+from sphinx_thrift.details import DIRECTORY
+from sphinx_thrift.domain import thrift_domain
+from sphinx_thrift.manifest import write_manifest
+
+INVENTORY = 'thrift-shard.json'
+INVENTORY_VERSION = 2
+
+# inventories read by this process, by path, with the mtime they were read at
+_inventories: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """``(index, count)`` of a shard written as ``index/count``."""
+    index, _, count = value.partition('/')
+    shard = int(index), int(count)
+    if not 0 <= shard[0] < shard[1]:
+        raise ValueError(f'invalid shard {value!r}, expected INDEX/COUNT '
+                         'with 0 <= INDEX < COUNT')
+    return shard
+
+
+def shard_of(docname: str, count: int) -> int:
+    """The shard owning ``docname``, stable across builds and machines."""
+    digest = hashlib.sha1(docname.encode('utf-8')).hexdigest()
+    return int(digest, 16) % count
+
+
+def owns(env: BuildEnvironment, docname: str) -> bool:
+    """Whether the current build renders the thrift modules of ``docname``."""
+    shard = env.config.thrift_shard
+    if not shard:
+        return True
+    index, count = parse_shard(str(shard))
+    return shard_of(docname, count) == index
+
+
+def read_inventory(path: str) -> Dict[str, Any]:
+    try:
+        mtime = os.stat(path).st_mtime
+        cached = _inventories.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, encoding='utf-8') as f:
+            inventory = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ThriftError(path, f'cannot read shard inventory: {e}') from e
+    if inventory.get('version') != INVENTORY_VERSION:
+        raise ThriftError(path, 'shard inventory of another version')
+    _inventories[path] = mtime, inventory
+    return inventory
+
+
+def _documents(paths: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    documents: Dict[str, Dict[str, Any]] = {}
+    for path in paths:
+        documents.update(read_inventory(path)['documents'])
+    return documents
+
+
+def _fingerprint(paths: Iterable[str]) -> str:
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def outdated_documents(app: Sphinx, env: BuildEnvironment, added: Any,
+                       changed: Any, removed: Any) -> List[str]:
+    """Documents of other shards whose data changed with the inventories."""
+    if not app.config.thrift_shard:
+        return []
+    domain = thrift_domain(env)
+    fingerprint = _fingerprint(app.config.thrift_shard_inventories)
+    if domain.data['shard_inventories'] == fingerprint:
+        return []
+    domain.data['shard_inventories'] = fingerprint
+    return sorted(docname for docname in env.found_docs
+                  if not owns(env, docname))
+
+
+def load_document(app: Sphinx, doctree: Any) -> None:
+    """Take the thrift domain data of a document of another shard from its
+    inventory."""
+    env = app.env
+    if owns(env, env.docname):
+        return
+    data = _documents(app.config.thrift_shard_inventories).get(env.docname)
+    if data is not None:
+        thrift_domain(env).load_document_data(env.docname, data)
+
+
+def stub_sections(env: BuildEnvironment) -> List[str]:
+    """Titles of the sections the next ``autothrift_module`` of the current
+    document generated in the shard owning the document."""
+    index: int = env.temp_data.get('thrift_stub') or 0
+    env.temp_data['thrift_stub'] = index + 1
+    data = _documents(env.config.thrift_shard_inventories).get(env.docname)
+    sections = data['sections'] if data is not None else []
+    return sections[index] if index < len(sections) else []
+
+
+def _output_files(app: Sphinx, docname: str) -> List[str]:
+    files = []
+    get_outfilename = getattr(app.builder, 'get_outfilename', None)
+    if get_outfilename is not None:
+        files.append(os.path.relpath(get_outfilename(docname), app.outdir))
+    outdir = glob.escape(str(app.outdir))
+    files.extend(
+        os.path.relpath(path, app.outdir) for path in glob.glob(
+            os.path.join(outdir, '_sources', glob.escape(docname) + '.*')))
+    # method details of large services, see `sphinx_thrift.details`
+    files.extend(
+        os.path.relpath(path, app.outdir) for path in sorted(
+            glob.glob(
+                os.path.join(outdir, DIRECTORY, glob.escape(docname),
+                             '*.html'))))
+    return files
+
+
+def write_inventory(app: Sphinx, exception: Optional[Exception]) -> None:
+    """Write the inventory of the shard after building it."""
+    if not app.config.thrift_shard or exception is not None:
+        return
+    env = app.env
+    index, count = parse_shard(str(app.config.thrift_shard))
+    data = thrift_domain(env).document_data()
+    documents = {}
+    for docname in sorted(env.found_docs):
+        if not owns(env, docname):
+            continue
+        documents[docname] = dict(
+            data.get(docname, {
+                'objects': [],
+                'references': {},
+                'namespaces': {},
+                'version': None,
+                'sections': [],
+                'exceptions': []
+            }),
+            files=_output_files(app, docname))
+    path = os.path.join(app.outdir, INVENTORY)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(
+            {
+                'version': INVENTORY_VERSION,
+                'shard': index,
+                'count': count,
+                'manifest': app.config.thrift_manifest,
+                'documents': documents
+            },
+            f,
+            sort_keys=True)
+
+
+def _search_index(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return None
+    return json.loads(text[text.index('(') + 1:text.rindex(')')])
+
+
+def _doc_indices(value: Any) -> List[int]:
+    return value if isinstance(value, list) else [value]
+
+
+def merge_search_indexes(indexes: Sequence[Dict[str, Any]],
+                         owned: Sequence[Collection[str]]) -> Dict[str, Any]:
+    """One search index from the indexes of several shards, taking every
+    document from the index of the shard in ``owned`` listing it."""
+    docnames = sorted(name for names in owned for name in names)
+    position = {name: i for i, name in enumerate(docnames)}
+    merged: Dict[str, Any] = {
+        'docnames': docnames,
+        'envversion': indexes[0]['envversion'],
+        'filenames': [''] * len(docnames),
+        'titles': [''] * len(docnames),
+        'terms': {},
+        'titleterms': {},
+        'alltitles': {},
+        'indexentries': {},
+        'objects': {},
+        'objnames': {},
+        'objtypes': {}
+    }
+    objtypes: Dict[str, int] = {}
+    for index, names in zip(indexes, owned):
+        # document numbers of this index to merged ones, for owned documents
+        mapping = {
+            i: position[name]
+            for i, name in enumerate(index['docnames']) if name in names
+        }
+        for i, new in mapping.items():
+            merged['filenames'][new] = index['filenames'][i]
+            merged['titles'][new] = index['titles'][i]
+        for field in ('terms', 'titleterms'):
+            for term, value in index[field].items():
+                docs = [mapping[i] for i in _doc_indices(value) if i in mapping]
+                if docs:
+                    merged[field].setdefault(term, []).extend(docs)
+        for field in ('alltitles', 'indexentries'):
+            for title, entries in index.get(field, {}).items():
+                entries = [[mapping[entry[0]]] + entry[1:]
+                           for entry in entries if entry[0] in mapping]
+                if entries:
+                    merged[field].setdefault(title, []).extend(entries)
+        types = {}
+        for number, objtype in index['objtypes'].items():
+            types[int(number)] = objtypes.setdefault(objtype, len(objtypes))
+            merged['objtypes'][str(types[int(number)])] = objtype
+            merged['objnames'][str(types[int(number)])] = (
+                index['objnames'][number])
+        for prefix, objects in index['objects'].items():
+            objects = [[mapping[obj[0]], types[obj[1]]] + obj[2:]
+                       for obj in objects if obj[0] in mapping]
+            if objects:
+                merged['objects'].setdefault(prefix, []).extend(objects)
+    for field in ('terms', 'titleterms'):
+        merged[field] = {
+            term: docs[0] if len(docs) == 1 else sorted(docs)
+            for term, docs in merged[field].items()
+        }
+    return merged
+
+
+def merge_shards(outdir: str, shard_dirs: Sequence[str]) -> None:
+    """Combine the outputs of all shards of a build into ``outdir``.
+
+    Everything not belonging to a single document (static files, indices,
+    the thrift domain index) is the same in all shards and taken from the
+    first one; the pages of each document come from the shard owning it.
+    """
+    inventories = [
+        read_inventory(os.path.join(directory, INVENTORY))
+        for directory in shard_dirs
+    ]
+    count = inventories[0]['count']
+    shards = sorted(inventory['shard'] for inventory in inventories)
+    if shards != list(range(count)):
+        raise ThriftError(
+            shard_dirs[0],
+            f'expected the outputs of shards 0 to {count - 1}, got {shards}')
+    shutil.copytree(shard_dirs[0], outdir, dirs_exist_ok=True)
+    os.remove(os.path.join(outdir, INVENTORY))
+    for directory, inventory in zip(shard_dirs[1:], inventories[1:]):
+        for document in inventory['documents'].values():
+            for name in document['files']:
+                target = os.path.join(outdir, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(os.path.join(directory, name), target)
+    indexes = [
+        _search_index(os.path.join(directory, 'searchindex.js'))
+        for directory in shard_dirs
+    ]
+    found = [index for index in indexes if index is not None]
+    if len(found) == len(indexes):
+        merged = merge_search_indexes(
+            found, [set(inv['documents']) for inv in inventories])
+        with open(os.path.join(outdir, 'searchindex.js'), 'w',
+                  encoding='utf-8') as f:
+            f.write('Search.setIndex(' +
+                    json.dumps(merged, sort_keys=True, separators=(',', ':'))
+                    + ')')
+    manifest = inventories[0].get('manifest')
+    if manifest:
+        # the copied one covers the first shard only
+        write_manifest(outdir, manifest)
+
+
+def _build(args: Tuple[str, str, str, str, Dict[str, Any]]) -> int:
+    srcdir, outdir, doctreedir, builder, overrides = args
+    # pool processes build one shard after another
+    with patch_docutils(srcdir), docutils_namespace():
+        app = Sphinx(srcdir,
+                     srcdir,
+                     outdir,
+                     doctreedir,
+                     builder,
+                     confoverrides=overrides,
+                     status=None,
+                     freshenv=False)
+        app.build()
+    return app.statuscode
+
+
+def build_shards(srcdir: str,
+                 outdir: str,
+                 count: int,
+                 builder: str = 'html',
+                 jobs: Optional[int] = None,
+                 overrides: Optional[Dict[str, Any]] = None,
+                 workdir: Optional[str] = None) -> int:
+    """Build ``srcdir`` in ``count`` shards in parallel processes and merge
+    them into ``outdir``, the way shards are built on separate machines.
+
+    Shard outputs and environments are kept in ``workdir``, by default
+    ``outdir`` followed by ``-shards``, for incremental rebuilds.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    work = workdir or os.path.normpath(outdir) + '-shards'
+    overrides = dict(overrides or {})
+
+    def shard_args(index: int, phase: str,
+                   builder: str) -> Tuple[str, str, str, str, Dict[str, Any]]:
+        shard_dir = os.path.join(work, str(index))
+        return (srcdir, os.path.join(shard_dir, phase),
+                os.path.join(shard_dir, 'doctrees'), builder,
+                dict(overrides, thrift_shard=f'{index}/{count}'))
+
+    with ProcessPoolExecutor(jobs) as pool:
+        # read every shard, writing the inventories of its documents
+        status = max(
+            pool.map(_build, [
+                shard_args(i, 'inventory', 'thriftjson') for i in range(count)
+            ]))
+        if status:
+            return status
+        inventories = [
+            os.path.join(work, str(i), 'inventory', INVENTORY)
+            for i in range(count)
+        ]
+        overrides['thrift_shard_inventories'] = inventories
+        status = max(
+            pool.map(_build,
+                     [shard_args(i, builder, builder) for i in range(count)]))
+    if status:
+        return status
+    merge_shards(outdir,
+                 [os.path.join(work, str(i), builder) for i in range(count)])
+    return 0
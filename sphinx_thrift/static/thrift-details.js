@@ -0,0 +1,70 @@
+// Replaces the links to method details written to separate files (see
+// sphinx_thrift/details.py) with the details, once they are about to scroll
+// into view or their method is linked to. Without scripts, or when the files
+// cannot be fetched (like from file:// URLs), the links stay. Links in the
+// files are relative to the files and rebased onto the page.
+(function () {
+  'use strict';
+
+  function rebase(content, base) {
+    ['href', 'src'].forEach(function (attribute) {
+      content.querySelectorAll('[' + attribute + ']').forEach(function (el) {
+        el.setAttribute(attribute,
+                        new URL(el.getAttribute(attribute), base).href);
+      });
+    });
+  }
+
+  function load(placeholder) {
+    if (placeholder.dataset.loading) {
+      return;
+    }
+    placeholder.dataset.loading = 'true';
+    var src = new URL(placeholder.dataset.src, document.baseURI);
+    fetch(src).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      return response.text();
+    }).then(function (html) {
+      var template = document.createElement('template');
+      template.innerHTML = html;
+      rebase(template.content, src);
+      placeholder.replaceWith(template.content);
+    }).catch(function () {
+      delete placeholder.dataset.loading;
+    });
+  }
+
+  function loadTarget() {
+    var id = decodeURIComponent(window.location.hash.slice(1));
+    var target = id && document.getElementById(id);
+    var method = target && target.closest('dl');
+    var placeholder = method &&
+        method.querySelector(':scope > dd > .thrift-details');
+    if (placeholder) {
+      load(placeholder);
+    }
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    var placeholders = document.querySelectorAll('.thrift-details');
+    if ('IntersectionObserver' in window) {
+      var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+          if (entry.isIntersecting) {
+            observer.unobserve(entry.target);
+            load(entry.target);
+          }
+        });
+      }, {rootMargin: '1000px 0px'});
+      placeholders.forEach(function (placeholder) {
+        observer.observe(placeholder);
+      });
+    } else {
+      placeholders.forEach(load);
+    }
+    loadTarget();
+  });
+  window.addEventListener('hashchange', loadTarget);
+})();
@@ -0,0 +1,353 @@
+from typing import (Any, Dict, Iterable, Iterator, List, MutableMapping,
+                    Optional, Set, Tuple)
+
+import json
+import os
+import sqlite3
+
+import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.documenter import typeId
+from sphinx_thrift.domain import ObjectKey, Target
+from sphinx_thrift.names import object_names, split_version
+
+Record = Dict[str, Any]
+
+
+def _fields(fields: List[ast.Field]) -> List[Record]:
+    return [{
+        'name': f.name,
+        'key': f.key,
+        'type': typeId(f.type_),
+        'doc': f.doc
+    } for f in fields]
+
+
+def module_records(module: ast.Module) -> Iterator[Tuple[ObjectKey, Record]]:
+    """AST data of every object defined in ``module``, by object key."""
+    name = module.name
+    yield (None, name, 'module'), {
+        'doc': module.doc,
+        'namespaces': {ns.language: ns.name
+                       for ns in module.namespaces}
+    }
+    for const in module.constants:
+        yield (name, const.name, 'constant'), {
+            'doc': const.doc,
+            'type': typeId(const.type_),
+            # complete, truncation is for rendered pages only
+            'value': const.value.format() if const.value is not None else None
+        }
+    for td in module.typedefs:
+        yield (name, td.name, 'typedef'), {
+            'doc': td.doc,
+            'target': typeId(td.type_)
+        }
+    for enum in module.enums:
+        yield (name, enum.name, 'enum'), {'doc': enum.doc}
+        for member in enum.members:
+            yield (name, f'{enum.name}.{member.name}', 'enum_field'), {
+                'doc': member.doc,
+                'value': member.value
+            }
+    for struct in module.structs:
+        yield (name, struct.name, 'struct'), {
+            'doc': struct.doc,
+            'exception': struct.isException,
+            'union': struct.isUnion
+        }
+        for field in struct.fields:
+            yield (name, f'{struct.name}.{field.name}', 'struct_field'), {
+                'doc': field.doc,
+                'key': field.key,
+                'type': typeId(field.type_),
+                'required': field.required
+            }
+    for service in module.services:
+        yield (name, service.name, 'service'), {'doc': service.doc}
+        for func in service.functions:
+            yield (name, f'{service.name}.{func.name}', 'service_method'), {
+                'doc': func.doc,
+                'oneway': func.oneway,
+                'returns': typeId(func.returnType),
+                'arguments': _fields(func.arguments),
+                'throws': _fields(func.exceptions)
+            }
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS objects (
+    module TEXT NOT NULL, name TEXT NOT NULL, kind TEXT NOT NULL,
+    docname TEXT NOT NULL, PRIMARY KEY (module, name, kind));
+CREATE INDEX IF NOT EXISTS objects_docname ON objects (docname);
+CREATE INDEX IF NOT EXISTS objects_kind ON objects (kind);
+CREATE TABLE IF NOT EXISTS names (
+    version TEXT NOT NULL, name TEXT NOT NULL, priority INTEGER NOT NULL,
+    module TEXT NOT NULL, object TEXT NOT NULL, kind TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS names_name ON names (version, name, priority);
+CREATE INDEX IF NOT EXISTS names_object ON names (module, object, kind);
+CREATE TABLE IF NOT EXISTS definitions (
+    module TEXT NOT NULL, name TEXT NOT NULL, kind TEXT NOT NULL,
+    docname TEXT NOT NULL, type TEXT, data TEXT NOT NULL,
+    PRIMARY KEY (module, name, kind));
+CREATE INDEX IF NOT EXISTS definitions_docname ON definitions (docname);
+CREATE INDEX IF NOT EXISTS definitions_type ON definitions (type);
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket TEXT NOT NULL, module TEXT NOT NULL, name TEXT NOT NULL,
+    kind TEXT NOT NULL, docname TEXT NOT NULL,
+    PRIMARY KEY (bucket, module, name, kind));
+CREATE INDEX IF NOT EXISTS buckets_docname ON buckets (docname);
+CREATE TABLE IF NOT EXISTS suffixes (
+    field TEXT NOT NULL, suffix TEXT NOT NULL,
+    module TEXT NOT NULL, name TEXT NOT NULL, kind TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS suffixes_suffix ON suffixes (field, suffix);
+CREATE INDEX IF NOT EXISTS suffixes_object ON suffixes (module, name, kind);
+'''
+
+# modules are stored as '' for module objects, whose key has no module
+Row = Tuple[str, str, str]
+
+
+def _row(key: ObjectKey) -> Row:
+    module, name, kind = key
+    return module or '', name, kind
+
+
+def _key(row: Row) -> ObjectKey:
+    module, name, kind = row
+    return module or None, name, kind
+
+
+def _suffixes(name: str) -> List[str]:
+    """``name`` and its last dotted components, like ``A.B`` and ``B`` for
+    ``A.B``."""
+    parts = name.split('.')
+    return ['.'.join(parts[i:]) for i in range(len(parts))]
+
+
+def _type(record: Record) -> Optional[str]:
+    for field in ('type', 'returns', 'target'):
+        if field in record:
+            return record[field]
+    return None
+
+
+class SymbolStore(MutableMapping[ObjectKey, str]):
+    """Documented thrift objects in an SQLite database.
+
+    Maps object keys to the document defining them, like the ``objects`` of
+    the domain data, and also holds every name an object can be referred to
+    by and the AST data of objects documented from thrift files. Everything
+    is queried through indexes when needed, so a build does not load all
+    objects up front, and the file can be queried after the build (see
+    ``sphinx-thrift query``).
+
+    Connections are not shared with forked processes: a process opens its
+    own on first use.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def commit(self) -> None:
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.commit()
+
+    def attach(self, token: str) -> None:
+        """Empty the store unless it was last filled for ``token``.
+
+        The token identifies the domain data the store belongs to, so a fresh
+        environment does not see the objects of a previous one.
+        """
+        row = self.db.execute(
+            "SELECT value FROM meta WHERE key = 'token'").fetchone()
+        if row is not None and row[0] == token:
+            return
+        for table in ('objects', 'names', 'definitions', 'buckets',
+                      'suffixes'):
+            self.db.execute(f'DELETE FROM {table}')
+        self.db.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('token', ?)", (token, ))
+        self.db.commit()
+
+    def __getitem__(self, key: ObjectKey) -> str:
+        row = self.db.execute(
+            'SELECT docname FROM objects '
+            'WHERE module = ? AND name = ? AND kind = ?', _row(key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def __setitem__(self, key: ObjectKey, docname: str) -> None:
+        self.add(key, docname)
+
+    def __delitem__(self, key: ObjectKey) -> None:
+        if key not in self:
+            raise KeyError(key)
+        for table in ('objects', 'definitions', 'buckets', 'suffixes'):
+            self.db.execute(
+                f'DELETE FROM {table} '
+                'WHERE module = ? AND name = ? AND kind = ?', _row(key))
+        self.db.execute(
+            'DELETE FROM names WHERE module = ? AND object = ? AND kind = ?',
+            _row(key))
+
+    def __iter__(self) -> Iterator[ObjectKey]:
+        for row in self.db.execute(
+                'SELECT module, name, kind FROM objects '
+                'ORDER BY module, name, kind'):
+            yield _key(row)
+
+    def __len__(self) -> int:
+        return self.db.execute('SELECT count(*) FROM objects').fetchone()[0]
+
+    def items(self) -> Iterator[Tuple[ObjectKey, str]]:  # type: ignore
+        for module, name, kind, docname in self.db.execute(
+                'SELECT module, name, kind, docname FROM objects '
+                'ORDER BY module, name, kind'):
+            yield _key((module, name, kind)), docname
+
+    def add(self, key: ObjectKey, docname: str,
+            namespaces: Iterable[str] = ()) -> None:
+        row = _row(key)
+        module, name, kind = key
+        if module is None:
+            version, name = split_version(name)
+        else:
+            version, module = split_version(module)
+        self.db.execute(
+            'DELETE FROM names WHERE module = ? AND object = ? AND kind = ?',
+            row)
+        self.db.execute('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)',
+                        row + (docname, ))
+        self._set_suffixes('name', row, row[1])
+        self.db.executemany(
+            'INSERT INTO names VALUES (?, ?, ?, ?, ?, ?)',
+            [(version or '', name_, priority) + row
+             for name_, priority in object_names(module, name,
+                                                 namespaces).items()])
+
+    def add_definitions(self, docname: str,
+                        records: Iterable[Tuple[ObjectKey, Record]]) -> None:
+        rows = [(_row(key), _type(record), record)
+                for key, record in records]
+        self.db.executemany(
+            'INSERT OR REPLACE INTO definitions VALUES (?, ?, ?, ?, ?, ?)',
+            [row + (docname, type_, json.dumps(record))
+             for row, type_, record in rows])
+        for row, type_, _ in rows:
+            self._set_suffixes('type', row, type_)
+
+    def _set_suffixes(self, field: str, row: Row,
+                      value: Optional[str]) -> None:
+        # the suffixes ``query`` matches names and types by
+        self.db.execute(
+            'DELETE FROM suffixes '
+            'WHERE field = ? AND module = ? AND name = ? AND kind = ?',
+            (field, ) + row)
+        if value is not None:
+            self.db.executemany(
+                'INSERT INTO suffixes VALUES (?, ?, ?, ?, ?)',
+                [(field, suffix) + row for suffix in _suffixes(value)])
+
+    def add_to_bucket(self, bucket: str, key: ObjectKey,
+                      docname: str) -> None:
+        self.db.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)',
+                        (bucket, ) + _row(key) + (docname, ))
+
+    def bucket(self, bucket: str) -> Iterator[Tuple[ObjectKey, str]]:
+        """The objects of ``bucket`` of the domain and their documents, see
+        `sphinx_thrift.domain.BUCKETS`."""
+        for module, name, kind, docname in self.db.execute(
+                'SELECT module, name, kind, docname FROM buckets '
+                'WHERE bucket = ? ORDER BY module, name, kind', (bucket, )):
+            yield _key((module, name, kind)), docname
+
+    def remove_doc(self, docname: str) -> None:
+        self.db.execute(
+            'DELETE FROM suffixes WHERE (module, name, kind) IN '
+            '(SELECT module, name, kind FROM objects WHERE docname = ? '
+            'UNION SELECT module, name, kind FROM definitions '
+            'WHERE docname = ?)', (docname, docname))
+        self.db.execute(
+            'DELETE FROM names WHERE (module, object, kind) IN '
+            '(SELECT module, name, kind FROM objects WHERE docname = ?)',
+            (docname, ))
+        for table in ('objects', 'definitions', 'buckets'):
+            self.db.execute(f'DELETE FROM {table} WHERE docname = ?',
+                            (docname, ))
+
+    def lookup(self, name: str, version: Optional[str]
+               ) -> Tuple[Optional[ObjectKey], List[ObjectKey]]:
+        """The object called ``name`` in ``version`` if there is exactly
+        one, else the objects sharing the name."""
+        rows = self.db.execute(
+            'SELECT priority, module, object, kind FROM names '
+            'WHERE version = ? AND name = ? ORDER BY priority',
+            (version or '', name)).fetchall()
+        best = {
+            _key(row[1:])
+            for row in rows if row[0] == rows[0][0]
+        }
+        if len(best) == 1:
+            return best.pop(), []
+        return None, sorted(best, key=str)
+
+    def docnames(self, targets: Iterable[Target]) -> Set[str]:
+        """Documents defining any of ``targets``."""
+        docnames: Set[str] = set()
+        for module, name in targets:
+            docnames.update(row[0] for row in self.db.execute(
+                'SELECT docname FROM objects WHERE module = ? AND name = ?',
+                (module, name)))
+        return docnames
+
+    def query(self,
+              name: Optional[str] = None,
+              kind: Optional[str] = None,
+              module: Optional[str] = None,
+              type_: Optional[str] = None
+              ) -> Iterator[Tuple[ObjectKey, str, Record]]:
+        """Objects matching all given criteria, with their AST data.
+
+        ``name`` and ``type_`` match the full name or its last components
+        exactly, so ``User`` matches ``Shared.User``. The type of a method is
+        its return type, the type of a type alias the aliased type.
+        """
+        conditions = []
+        parameters: List[Any] = []
+        for field, value in (('name', name), ('type', type_)):
+            if value is not None:
+                conditions.append(
+                    '(o.module, o.name, o.kind) IN (SELECT module, name, kind '
+                    'FROM suffixes WHERE field = ? AND suffix = ?)')
+                parameters.extend([field, value])
+        if kind is not None:
+            conditions.append('o.kind = ?')
+            parameters.append(kind)
+        if module is not None:
+            conditions.append('o.module = ?')
+            parameters.append(module)
+        where = ' AND '.join(conditions) or '1'
+        for *row, docname, data in self.db.execute(
+                'SELECT o.module, o.name, o.kind, o.docname, d.data '
+                'FROM objects o LEFT JOIN definitions d '
+                'ON o.module = d.module AND o.name = d.name '
+                f'AND o.kind = d.kind WHERE {where} '
+                'ORDER BY o.module, o.name, o.kind', parameters):
+            yield _key(tuple(row)), docname, json.loads(data or '{}')
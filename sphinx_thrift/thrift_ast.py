@@ -1,4 +1,6 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Sequence, Union
+
+import json
 
 import attr
 
@@ -6,56 +8,56 @@ AtomicType = str
 Type = Union[AtomicType, 'ListType', 'SetType', 'MapType', 'ReferenceType']
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class ListType:
     valueType: Type
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class SetType:
     valueType: Type
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class MapType:
     keyType: Type
     valueType: Type
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class ReferenceType:
     module: str
     name: str
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Namespace:
     name: str
     language: str
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class EnumMember:
     name: str
     value: int
     doc: str = ''
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Enum:
     name: str
     members: List[EnumMember]
     doc: str = ''
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Typedef:
     name: str
     type_: Type
     doc: str = ''
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Field:
     key: int
     name: str
@@ -66,7 +68,7 @@ class Field:
     type: Optional[Any] = None
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Struct:
     name: str
     isException: bool
@@ -75,15 +77,100 @@ class Struct:
     doc: str = ''
 
 
-@attr.s(auto_attribs=True)
+_decoder = json.JSONDecoder()
+
+
+class _Full(Exception):
+    """The formatted value is longer than its maximum length."""
+
+
+class _ValueFormatter:
+    """Formats a `ConstantValue` in thrift syntax, decoding only the entries
+    it shows and stopping once the text is longer than ``max_length``."""
+
+    def __init__(self, data: str, max_items: Optional[int],
+                 max_length: Optional[int]) -> None:
+        self.data = data
+        self.max_items = max_items
+        self.max_length = max_length
+        self.parts: List[str] = []
+        self.length = 0
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+        self.length += len(text)
+        if self.max_length is not None and self.length > self.max_length:
+            raise _Full()
+
+    def value(self, pos: int) -> int:
+        """Format the value at ``pos`` of the data, returning where it
+        ends."""
+        data = self.data
+        open_ = data[pos]
+        if open_ not in '[{':
+            value, end = _decoder.raw_decode(data, pos)
+            self.write(
+                json.dumps(value, ensure_ascii=False)
+                if isinstance(value, str) else repr(value))
+            return end
+        count_end = data.index(':', pos)
+        length_end = data.index(':', count_end + 1)
+        count = int(data[pos + 1:count_end])
+        pos = length_end + 1
+        # the entries not shown are skipped without decoding them
+        end = pos + int(data[count_end + 1:length_end])
+        shown = count if self.max_items is None else min(
+            count, self.max_items)
+        self.write(open_)
+        for i in range(shown):
+            if i:
+                self.write(', ')
+                pos += 1
+            pos = self.value(pos)
+            if open_ == '{':
+                self.write(': ')
+                pos = self.value(pos + 1)
+        if count > shown:
+            self.write(f'{", " if shown else ""}... {count - shown} more')
+        self.write('}' if open_ == '{' else ']')
+        return end
+
+
+@attr.s(auto_attribs=True, slots=True)
+class ConstantValue:
+    """The value of a constant as compact text, decoded only for rendering.
+
+    Strings and numbers are stored as JSON, lists as ``[COUNT:LENGTH:ITEMS``
+    and maps as ``{COUNT:LENGTH:ENTRIES``: the number of items, the length
+    of their text and the items separated by ``,``, map entries as
+    ``KEY:VALUE``. Constants can be lookup tables with thousands of entries;
+    as a single string they are cheap to pickle, load and keep in memory
+    with their module, and rendering skips the entries it does not show.
+    """
+    data: str
+
+    def format(self,
+               max_items: Optional[int] = None,
+               max_length: Optional[int] = None) -> str:
+        """The value in thrift syntax, showing at most ``max_items`` entries
+        of every list and map and at most ``max_length`` characters."""
+        formatter = _ValueFormatter(self.data, max_items, max_length)
+        try:
+            formatter.value(0)
+        except _Full:
+            return ''.join(formatter.parts)[:max_length] + ' ...'
+        return ''.join(formatter.parts)
+
+
+@attr.s(auto_attribs=True, slots=True)
 class Constant:
     name: str
     type_: Type
-    value: Any
+    value: Optional[ConstantValue]
     doc: str = ''
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Function:
     name: str
     oneway: bool
@@ -93,20 +180,22 @@ class Function:
     doc: str = ''
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Service:
     name: str
     functions: List[Function]
     doc: str = ''
 
 
-@attr.s(auto_attribs=True)
+@attr.s(auto_attribs=True, slots=True)
 class Module:
+    # definitions are sequences: modules read from the cache decode them on
+    # demand, see `sphinx_thrift.binary.Definitions`
     name: str
     namespaces: List[Namespace]
-    enums: List[Enum]
-    typedefs: List[Typedef]
-    structs: List[Struct]
-    constants: List[Constant]
-    services: List[Service]
+    enums: Sequence[Enum]
+    typedefs: Sequence[Typedef]
+    structs: Sequence[Struct]
+    constants: Sequence[Constant]
+    services: Sequence[Service]
     doc: str = ''
@@ -0,0 +1,148 @@
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+import os
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
+from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return -1.0
+
+
+def _walk(root: str, suffixes: Tuple[str, ...], skip: str) -> Iterator[str]:
+    """The files below ``root`` ending with one of ``suffixes``, outside of
+    hidden directories and ``skip``."""
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [
+            d for d in dirs if not d.startswith('.')
+            and os.path.join(directory, d) != skip
+        ]
+        for name in files:
+            if name.endswith(suffixes):
+                yield os.path.join(directory, name)
+
+
+class Watcher:
+    """Rebuilds a Sphinx project in-process whenever its sources change.
+
+    Builds are incremental: Sphinx re-reads only the documents whose sources
+    or dependencies changed, and parsed thrift modules stay in the memory of
+    this process, so only the modules whose source or includes changed are
+    compiled and parsed again.
+    """
+
+    def __init__(self,
+                 srcdir: str,
+                 outdir: str,
+                 builder: str = 'html',
+                 confoverrides: Optional[Dict[str, Any]] = None,
+                 status: Optional[IO] = sys.stdout) -> None:
+        self.srcdir = os.path.abspath(srcdir)
+        self.outdir = os.path.abspath(outdir)
+        self.builder = builder
+        self.confoverrides = confoverrides or {}
+        self.status = status
+        self.app: Optional[Sphinx] = None
+        self.dependents: Dict[str, List[str]] = {}
+        self.mtimes: Dict[str, float] = {}
+        self.suffixes: Tuple[str, ...] = ('.rst', )
+        self.roots: List[str] = []
+
+    def build(self) -> None:
+        # every build registers the nodes, directives and roles of the
+        # extensions with docutils again, like sphinx-build in a fresh process
+        with patch_docutils(self.srcdir), docutils_namespace():
+            self.app = Sphinx(
+                self.srcdir,
+                self.srcdir,
+                self.outdir,
+                os.path.join(self.outdir, '.doctrees'),
+                self.builder,
+                confoverrides=self.confoverrides,
+                status=self.status,
+                warning=sys.stderr)
+            self.app.build()
+        self._collect(self.app.env)
+
+    def _collect(self, env: BuildEnvironment) -> None:
+        self.dependents = {}
+        for docname, deps in env.dependencies.items():
+            for dep in deps:
+                path = os.path.normpath(os.path.join(self.srcdir, str(dep)))
+                self.dependents.setdefault(path, []).append(docname)
+        self.suffixes = tuple(env.config.source_suffix)
+        # the directories of included modules outside the source directory
+        self.roots = []
+        for directory in sorted({
+                os.path.dirname(path)
+                for path in self.dependents if path.endswith('.thrift')
+        }):
+            if not any(directory == root or directory.startswith(root + os.sep)
+                       for root in [self.srcdir] + self.roots):
+                self.roots.append(directory)
+        files = list(self.dependents)
+        files.extend(str(env.doc2path(doc)) for doc in env.found_docs)
+        files.append(os.path.join(self.srcdir, 'conf.py'))
+        files.extend(self._scan())
+        self.mtimes = {path: _mtime(path) for path in files}
+
+    def _scan(self) -> Set[str]:
+        """The documents and modules in the source directory and the
+        modules in the directories of included modules."""
+        found = set(
+            _walk(self.srcdir, self.suffixes + ('.thrift', ), self.outdir))
+        for root in self.roots:
+            found.update(_walk(root, ('.thrift', ), self.outdir))
+        return found
+
+    def changed(self) -> List[str]:
+        """The files changed, removed or added since the last build."""
+        changed = {
+            path
+            for path, mtime in self.mtimes.items() if _mtime(path) != mtime
+        }
+        changed.update(self._scan() - self.mtimes.keys())
+        return sorted(changed)
+
+    def _report(self, changed: List[str]) -> None:
+        docs = sorted(
+            {doc
+             for path in changed for doc in self.dependents.get(path, [])})
+        print(f'{len(changed)} changed: ' + ', '.join(
+            os.path.relpath(path, self.srcdir) for path in changed))
+        if docs:
+            print('pages depending on changed modules: ' + ', '.join(docs))
+
+    def run(self, interval: float = 1.0) -> None:
+        self.build()
+        while True:
+            time.sleep(interval)
+            changed = self.changed()
+            if not changed:
+                continue
+            self._report(changed)
+            try:
+                self.build()
+            except Exception as e:
+                # keep watching, the next change may fix it
+                print(f'build failed: {e}', file=sys.stderr)
+                self.mtimes.update((path, _mtime(path)) for path in changed)
+
+
+def serve(directory: str, port: int) -> ThreadingHTTPServer:
+    """Serve ``directory`` on localhost from a background thread."""
+    handler = partial(SimpleHTTPRequestHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
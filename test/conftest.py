@@ -0,0 +1,76 @@
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+FAKE_COMPILER = '''\
+#!{python}
+# Stands in for ``thrift --gen xml --out DIR FILE``: writes the XML that sits
+# next to FILE to DIR, or fails if there is none. Like thrift it opens the
+# output file for writing, which may be a named pipe.
+import os, sys
+out, filename = sys.argv[4], sys.argv[5]
+xml = os.path.splitext(filename)[0] + '.xml'
+if not os.path.exists(xml):
+    sys.stderr.write('[FAILURE:%s:1] cannot compile\\n' % filename)
+    sys.exit(1)
+with open(xml, 'rb') as src:
+    with open(os.path.join(out, os.path.basename(xml)), 'wb') as dst:
+        dst.write(src.read())
+'''
+
+
+@pytest.fixture
+def fake_compiler(tmp_path) -> str:
+    path = tmp_path / 'fake-thrift'
+    path.write_text(FAKE_COMPILER.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def write_module(directory, name: str, body: str, includes=()) -> str:
+    """Write ``name.thrift`` and the XML the compiler would produce for it."""
+    thrift = os.path.join(str(directory), name + '.thrift')
+    with open(thrift, 'w') as f:
+        f.writelines(f'include "{inc}.thrift"\n' for inc in includes)
+    with open(os.path.join(str(directory), name + '.xml'), 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<idl xmlns="http://thrift.apache.org/xml/idl">\n'
+                f'<document name="{name}">\n' + textwrap.dedent(body) +
+                '</document>\n</idl>\n')
+    return thrift
+
+
+def build_docs(srcdir,
+               compiler: str,
+               builder: str = 'html',
+               freshenv: bool = True,
+               warning=None,
+               parallel: int = 1,
+               **confoverrides):
+    """Build the project in ``srcdir`` and return the Sphinx application."""
+    from sphinx.application import Sphinx
+    from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+    srcdir = str(srcdir)
+    conf = os.path.join(srcdir, 'conf.py')
+    if not os.path.exists(conf):
+        with open(conf, 'w') as f:
+            f.write("extensions = ['sphinx.ext.autodoc', 'sphinx_thrift']\n")
+    # like sphinx-build, keep each build's docutils registrations to itself
+    with patch_docutils(srcdir), docutils_namespace():
+        app = Sphinx(
+            srcdir,
+            srcdir,
+            os.path.join(srcdir, '_build', builder),
+            os.path.join(srcdir, '_build', 'doctrees'),
+            builder,
+            confoverrides=dict(thrift_compiler=compiler, **confoverrides),
+            status=None,
+            warning=warning,
+            freshenv=freshenv,
+            parallel=parallel)
+        app.build()
+    return app
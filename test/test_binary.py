@@ -0,0 +1,80 @@
+import mmap
+
+import pytest
+
+import sphinx_thrift.thrift_ast as ast
+from sphinx_thrift.binary import (FormatError, ModuleFile, definition_digest,
+                                  encode_module, stored_references)
+from sphinx_thrift.references import module_references
+
+
+def make_module() -> ast.Module:
+    user = ast.ReferenceType('Shared', 'User')
+    return ast.Module(
+        'Example', [ast.Namespace('com.acme.example', 'java')],
+        [ast.Enum('Color', [ast.EnumMember('RED', -1, 'Red')], 'Colors')],
+        [ast.Typedef('Users', ast.ListType(user))], [
+            ast.Struct('Node', False, False, [
+                ast.Field(1, 'owner', user, 'optional', 'Owner'),
+                ast.Field(2, 'tags', ast.MapType('string', ast.SetType('i64')))
+            ], 'A node'),
+            ast.Struct('Failure', True, False, [], 'Üh oh')
+        ], [
+            ast.Constant('LIMITS', ast.ListType('i64'),
+                         ast.ConstantValue('[3:5:0,1,2')),
+            ast.Constant('EMPTY', 'string', None)
+        ], [
+            ast.Service('Nodes', [
+                ast.Function('get', False, ast.ReferenceType('', 'Node'), [
+                    ast.Field(1, 'id', 'i64')
+                ], [ast.Field(1, 'failure', ast.ReferenceType('', 'Failure'))],
+                             'Get a node'),
+                ast.Function('ping', True, 'void', [], [])
+            ])
+        ], 'The example module')
+
+
+def test_round_trip() -> None:
+    module = make_module()
+    read = ModuleFile(encode_module(module)).module()
+    assert (read == module)
+    assert (repr(read) == repr(module))
+    assert (read.enums + read.structs == module.enums + module.structs)
+    assert ([] + read.typedefs == module.typedefs)
+    assert (stored_references(read) == module_references(module))
+    assert (stored_references(module) is None)
+
+
+def test_definitions_are_decoded_on_demand(tmp_path) -> None:
+    module = make_module()
+    path = tmp_path / 'Example.ast'
+    path.write_bytes(encode_module(module))
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    read = ModuleFile(buffer).module()
+    assert ((read.name, read.doc, read.namespaces) ==
+            (module.name, module.doc, module.namespaces))
+    structs = read.structs
+    assert (len(structs) == 2 and structs.name(1) == 'Failure')
+    assert (structs.digest(1) == definition_digest(module.structs[1]))
+    assert (structs.decoded() == 0)
+    assert (structs[1] == module.structs[1])
+    assert (structs.decoded() == 1)
+    assert (read.services.decoded() == 0)
+    # names are shared with the rest of the module
+    assert (structs[0].fields[0].type_.name is read.typedefs[0].type_.valueType
+            .name)
+
+
+def test_invalid_files() -> None:
+    data = encode_module(make_module())
+    with pytest.raises(FormatError):
+        ModuleFile(b'PK' + data[2:])
+    with pytest.raises(FormatError):
+        ModuleFile(data[:-10])
+    with pytest.raises(FormatError):
+        ModuleFile(data[:10])
+    # a truncated file is rejected when opened, not when decoded later
+    for size in range(len(data)):
+        with pytest.raises(FormatError):
+            ModuleFile(data[:size])
@@ -0,0 +1,199 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from sphinx_thrift import cli
+from sphinx_thrift.cache import (ModuleCache, ThriftError, _memory,
+                                 collect_garbage)
+
+from test.conftest import build_docs, write_module
+
+SHARED = '''
+<struct name="User">
+  <field name="id" field-id="1" type="i64" />
+</struct>
+'''
+
+SERVICE = '''
+<service name="Users">
+  <method name="get">
+    <returns type="id" type-module="Shared" type-id="User" />
+    <arg name="id" field-id="1" type="i64" />
+  </method>
+  <method name="find">
+    <returns type="id" type-module="Shared" type-id="Account" />
+  </method>
+</service>
+'''
+
+
+def test_check_reports_errors(tmp_path, fake_compiler, capsys) -> None:
+    idl = tmp_path / 'idl'
+    idl.mkdir()
+    write_module(idl, 'Shared', SHARED)
+    write_module(idl, 'Service', SERVICE, includes=['Shared'])
+    (idl / 'Broken.thrift').write_text('struct {')
+    (idl / 'Latin.thrift').write_bytes(b'// caf\xe9\n')
+    (idl / 'other').mkdir()
+    duplicate = write_module(idl / 'other', 'Shared', SHARED)
+    cache_dir = str(tmp_path / 'cache')
+
+    status = cli.main([
+        'check', str(idl), '--cache-dir', cache_dir, '--compiler',
+        fake_compiler, '-j', '2'
+    ])
+
+    err = capsys.readouterr().err
+    assert (status == 1)
+    assert ('Broken.thrift: error:' in err)
+    assert ('Latin.thrift: error: not UTF-8' in err)
+    assert (f'{duplicate}: error: module Shared is also defined by '
+            f'{idl / "Shared.thrift"}' in err)
+    assert ('unresolved reference Shared.Account in Users.find' in err)
+    assert ('Shared.User' not in err)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_load_modules(tmp_path, fake_compiler, workers) -> None:
+    from sphinx_thrift import load_modules
+
+    shared = write_module(tmp_path, 'Shared', SHARED)
+    service = write_module(tmp_path, 'Service', SERVICE, includes=['Shared'])
+    broken = str(tmp_path / 'Broken.thrift')
+    with open(broken, 'w') as f:
+        f.write('struct {')
+    paths = [shared, broken, service]
+    cached = len(_memory)
+    results = dict(
+        load_modules(paths, workers, str(tmp_path / 'cache'), fake_compiler))
+    # streamed modules are not kept alive by the process-wide cache
+    assert (len(_memory) == cached)
+    assert (sorted(results) == sorted(paths))
+    assert (results[shared].structs[0].name == 'User')
+    assert ([f.name for f in results[service].services[0].functions] ==
+            ['get', 'find'])
+    assert (isinstance(results[broken], ThriftError))
+    assert ('cannot compile' in results[broken].message)
+
+    # stopping early leaves no work behind
+    loaded = load_modules(paths * 10, workers, compiler=fake_compiler)
+    assert (next(loaded)[0] in paths)
+    loaded.close()
+
+
+def test_cache_is_reused(tmp_path, fake_compiler) -> None:
+    thrift = write_module(tmp_path, 'Shared', SHARED)
+    cache = ModuleCache(str(tmp_path / 'cache'), fake_compiler)
+    module = cache.load(thrift)
+    os.remove(str(tmp_path / 'Shared.xml'))
+    assert (cache.load(thrift) == module)
+    assert (module.structs[0].name == 'User')
+
+
+def test_corrupt_cache_entries_are_compiled_again(tmp_path,
+                                                  fake_compiler) -> None:
+    thrift = write_module(tmp_path, 'Shared', SHARED)
+    cache = ModuleCache(str(tmp_path / 'cache'), fake_compiler)
+    key = cache.key(thrift)
+    cache.load(thrift, key)
+    with open(cache.path(key), 'r+b') as f:
+        f.truncate(os.path.getsize(cache.path(key)) - 3)
+    # as read by another process
+    module = ModuleCache(str(tmp_path / 'cache'), fake_compiler)._load(
+        thrift, key)
+    assert (module.structs[0].name == 'User')
+
+
+def test_cache_key_covers_includes(tmp_path, fake_compiler) -> None:
+    write_module(tmp_path, 'Shared', SHARED)
+    thrift = write_module(tmp_path, 'Service', SERVICE, includes=['Shared'])
+    cache = ModuleCache(str(tmp_path / 'cache'), fake_compiler)
+    key = cache.key(thrift)
+    with open(str(tmp_path / 'Shared.thrift'), 'a') as f:
+        f.write('// changed\n')
+    assert (cache.key(thrift) != key)
+
+
+def test_query_symbol_database(tmp_path, fake_compiler, capsys) -> None:
+    write_module(tmp_path, 'Shared', SHARED)
+    service = write_module(tmp_path, 'Service', SERVICE, includes=['Shared'])
+    (tmp_path / 'index.rst').write_text(
+        f'Index\n=====\n\n.. autothrift_module:: {tmp_path / "Shared"}\n\n'
+        f'.. autothrift_module:: {service[:-7]}\n')
+    app = build_docs(tmp_path, fake_compiler, thrift_symbol_db='symbols.db')
+    assert (app.env.domaindata['thrift']['objects'] == {})
+    html = (tmp_path / '_build' / 'html' / 'index.html').read_text()
+    assert ('href="#Shared.User:struct"' in html)
+    database = str(tmp_path / '_build' / 'doctrees' / 'symbols.db')
+
+    assert (cli.main(
+        ['query', database, '--kind', 'service_method', '--type', 'User'])
+            == 0)
+    assert (capsys.readouterr().out ==
+            'Service.Users.get:service_method\tShared.User\tindex\n')
+    assert (cli.main(['query', database, 'id']) == 0)
+    assert (capsys.readouterr().out ==
+            'Shared.User.id:struct_field\ti64\tindex\n')
+    assert (cli.main(['query', database, 'Missing']) == 1)
+
+
+def test_query_matches_names_exactly(tmp_path) -> None:
+    from sphinx_thrift.store import SymbolStore
+
+    store = SymbolStore(str(tmp_path / 'symbols.db'))
+    for name in ('foo_bar', 'fooXbar', 'FOO_BAR', 'Outer.foo_bar'):
+        store.add(('M', name, 'struct'), 'index')
+    # no wildcards or case folding in user input
+    assert ([key for key, _, _ in store.query('foo_bar')] ==
+            [('M', 'Outer.foo_bar', 'struct'), ('M', 'foo_bar', 'struct')])
+    del store[('M', 'Outer.foo_bar', 'struct')]
+    store.remove_doc('index')
+    assert (list(store.query('foo_bar')) == [])
+    assert (store.db.execute('SELECT count(*) FROM suffixes').fetchone() ==
+            (0, ))
+
+
+def test_invalid_compiler_output(tmp_path, fake_compiler) -> None:
+    thrift = write_module(tmp_path, 'Shared', SHARED)
+    with open(str(tmp_path / 'Shared.xml'), 'a') as f:
+        f.write('<idl>')
+    cache = ModuleCache(str(tmp_path / 'cache'), fake_compiler)
+    with pytest.raises(ThriftError, match='cannot parse'):
+        cache.load(thrift)
+
+
+def test_shared_cache_compiles_once(tmp_path, fake_compiler) -> None:
+    thrift = write_module(tmp_path, 'Shared', SHARED)
+    log = tmp_path / 'compiled'
+    compiler = tmp_path / 'counting-thrift'
+    compiler.write_text(
+        f'#!{sys.executable}\n'
+        'import os, sys, time\n'
+        f'open({str(log)!r}, "a").write("x\\n")\n'
+        'time.sleep(0.2)\n'
+        f'os.execv({fake_compiler!r}, [{fake_compiler!r}] + sys.argv[1:])\n')
+    compiler.chmod(compiler.stat().st_mode | stat.S_IEXEC)
+    # four processes need the module at the same time
+    status = cli.check([thrift] * 4, str(tmp_path / 'cache'), str(compiler),
+                       4)
+    assert (status == 0)
+    assert (log.read_text() == 'x\n')
+
+
+def test_collect_garbage(tmp_path) -> None:
+    cache = tmp_path / 'cache'
+    for i, name in enumerate(['aa/old.pickle', 'bb/new.pickle',
+                              'fragments/cc/used.pickle']):
+        path = cache / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * 100)
+        os.utime(str(path), (1000 + i, 1000 + i))
+    (cache / 'locks').mkdir()
+    (cache / 'locks' / 'aa.lock').write_text('')
+    assert (collect_garbage(str(cache), 250) == (1, 100))
+    assert (not (cache / 'aa' / 'old.pickle').exists())
+    assert ((cache / 'bb' / 'new.pickle').exists())
+    assert (collect_garbage(str(cache), 0) == (2, 200))
+    assert ((cache / 'locks' / 'aa.lock').exists())
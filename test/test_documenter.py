@@ -0,0 +1,307 @@
+import pytest
+
+from test.conftest import build_docs, write_module
+
+EXAMPLE = '''
+<namespace name="java" value="com.acme.example" />
+<typedef name="MyInteger" type="i32" doc="An integer" />
+<const name="LIMIT" type="i32" doc="A constant"><int>10</int></const>
+<enum name="Operation" doc="Operations">
+  <member name="ADD" value="1" doc="Addition" />
+  <member name="SUBTRACT" value="2" />
+</enum>
+<struct name="Work" doc="Some work">
+  <field name="num1" field-id="1" type="i32" doc="first" />
+  <field name="op" field-id="2" type="id" type-module="Example" type-id="Operation" />
+  <field name="tags" field-id="3" type="list"><elemType type="string" /></field>
+</struct>
+<exception name="InvalidOperation">
+  <field name="what" field-id="1" type="i32" />
+</exception>
+<service name="Calculator" doc="The calculator">
+  <method name="ping"><returns type="void" /></method>
+  <method name="calculate" doc="Calculates">
+    <returns type="i32" />
+    <arg name="logid" field-id="1" type="i32" doc="log id" />
+    <arg name="w" field-id="2" type="id" type-module="Example" type-id="Work" doc="the work" />
+    <throws name="ouch" field-id="1" type="id" type-module="Example" type-id="InvalidOperation" doc="on error" />
+  </method>
+  <method name="zip" oneway="true"><returns type="void" /></method>
+</service>
+'''
+
+INDEX = '''
+Reference
+=========
+
+.. autothrift_module:: {path}
+
+See :thrift:struct:`Example.Work`, :thrift:struct:`com.acme.example.Work`
+and :thrift:enum:`Operation`.
+'''
+
+
+def make_project(tmp_path):
+    thrift = write_module(tmp_path, 'Example', EXAMPLE)
+    (tmp_path / 'index.rst').write_text(INDEX.format(path=thrift[:-7]))
+    return tmp_path
+
+
+def test_node_rendering_matches_rst(tmp_path, fake_compiler) -> None:
+    project = make_project(tmp_path)
+    rst = build_docs(project, fake_compiler, thrift_render_nodes=False)
+    rst_tree = rst.env.get_doctree('index').pformat()
+    html = (project / '_build' / 'html' / 'index.html').read_text()
+    # headerlink, argument type of calculate and the two references
+    assert (html.count('href="#Example.Work:struct"') == 4)
+    # headerlink, type of Work.op and the reference
+    assert (html.count('href="#Example.Operation:enum"') == 3)
+    direct = build_docs(project, fake_compiler, thrift_render_nodes=True)
+    assert ('Example.Calculator.calculate:service_method' in rst_tree)
+    assert (direct.env.get_doctree('index').pformat() == rst_tree)
+
+
+def test_table_rendering(tmp_path, fake_compiler) -> None:
+    project = make_project(tmp_path)
+    app = build_docs(project, fake_compiler, thrift_table_threshold=2)
+    html = (project / '_build' / 'html' / 'index.html').read_text()
+    assert ('<tr class="row-odd" id="Example.Operation.SUBTRACT:enum_field">'
+            in html)
+    assert ('<tr class="row-even" id="Example.Work.num1:struct_field">'
+            in html)
+    doctree = app.env.get_doctree('index').pformat()
+    assert ('thrift:enum_field' not in doctree)
+    # rows are stored as data and only become table nodes when written
+    assert ('<member_table' in doctree and '<row' not in doctree)
+    objects = app.env.domaindata['thrift']['objects']
+    assert (objects[('Example', 'Work.tags', 'struct_field')] == 'index')
+    # InvalidOperation has a single field, below the threshold
+    assert (html.count('<table') == 2)
+    assert ('id="Example.InvalidOperation.what:struct_field"' in html)
+
+    # the rows of tables taken from rendered fragments keep their anchors
+    for _ in range(2):
+        app = build_docs(project, fake_compiler, thrift_table_threshold=2,
+                         thrift_render_nodes=True)
+        assert ((project / '_build' / 'html' / 'index.html').read_text()
+                == html)
+        objects = app.env.domaindata['thrift']['objects']
+        assert (objects[('Example', 'Work.tags', 'struct_field')] == 'index')
+
+
+def test_lazy_method_details(tmp_path, fake_compiler) -> None:
+    project = make_project(tmp_path)
+    build_docs(project, fake_compiler, thrift_lazy_methods=3)
+    out = project / '_build' / 'html'
+    html = (out / 'index.html').read_text()
+    details = out / '_thrift' / 'index'
+    # ping and zip have no description
+    assert ([path.name for path in details.iterdir()] ==
+            ['Example.Calculator.calculate-service_method.html'])
+    calculate = (details /
+                 'Example.Calculator.calculate-service_method.html').read_text()
+    # the signature and its anchor stay on the page, the description moves
+    assert ('id="Example.Calculator.calculate:service_method"' in html)
+    assert ('data-src="_thrift/index/'
+            'Example.Calculator.calculate-service_method.html"' in html)
+    assert ('Calculates' in calculate and 'Calculates' not in html)
+    assert ('log id' in calculate and 'log id' not in html)
+    assert ('thrift-details.js' in html)
+    assert ((out / '_static' / 'thrift-details.js').exists())
+    # descriptions are still searchable
+    assert ('calcul' in (out / 'searchindex.js').read_text())
+
+
+def test_lazy_method_details_links(tmp_path, fake_compiler) -> None:
+    thrift = write_module(
+        tmp_path, 'Links', """
+<struct name="Work" />
+<service name="Worker">
+  <method name="work" doc="Does :thrift:struct:`Links.Work`, see :thrift:struct:`Example.Work`">
+    <returns type="void" />
+  </method>
+  <method name="rest"><returns type="void" /></method>
+</service>
+""")
+    project = make_project(tmp_path)
+    with open(project / 'index.rst', 'a') as f:
+        f.write('\n.. toctree::\n\n   sub/links\n')
+    (project / 'sub').mkdir()
+    (project / 'sub' / 'links.rst').write_text(
+        f'Links\n=====\n\n.. autothrift_module:: {thrift[:-7]}\n')
+    build_docs(project, fake_compiler, thrift_lazy_methods=2)
+    work = (project / '_build' / 'html' / '_thrift' / 'sub' / 'links' /
+            'Links.Worker.work-service_method.html').read_text()
+    # links are relative to the description, not to the page
+    assert ('href="../../../sub/links.html#Links.Work:struct"' in work)
+    assert ('href="../../../index.html#Example.Work:struct"' in work)
+
+
+def test_constant_values(tmp_path, fake_compiler) -> None:
+    entries = ''.join(f'<entry><int>{i}</int></entry>' for i in range(1000))
+    write_module(
+        tmp_path, 'Example', f'''
+<const name="TABLE" type="list"><elemType type="i32" /><list>{entries}</list></const>
+<const name="NAME" type="string"><string>a "name"</string></const>''')
+    (tmp_path / 'index.rst').write_text(
+        f'Reference\n=========\n\n.. autothrift_module:: {tmp_path / "Example"}\n')
+    app = build_docs(tmp_path, fake_compiler, thrift_constant_max_items=3)
+    text = app.env.get_doctree('index').astext()
+    assert ('TABLE: list<i32> = [0, 1, 2, ... 997 more]' in text)
+    assert ('NAME: string = "a \\"name\\""' in text)
+
+
+USER = '''
+<struct name="User">
+  <field name="id" field-id="1" type="i64" />
+</struct>
+'''
+
+USERS = '''
+<service name="Users">
+  <method name="get">
+    <returns type="id" type-module="Shared" type-id="User" />
+  </method>
+</service>
+'''
+
+
+def test_used_by(tmp_path, fake_compiler) -> None:
+    shared = write_module(tmp_path, 'Shared', USER)
+    service = write_module(tmp_path, 'Service', USERS, includes=['Shared'])
+    (tmp_path / 'index.rst').write_text(
+        'Index\n=====\n\n.. toctree::\n\n   shared\n   service\n')
+    (tmp_path / 'shared.rst').write_text(
+        f'Shared\n======\n\n.. autothrift_module:: {shared[:-7]}\n')
+    (tmp_path / 'service.rst').write_text(
+        f'Service\n=======\n\n.. autothrift_module:: {service[:-7]}\n')
+    build_docs(tmp_path, fake_compiler)
+    html = tmp_path / '_build' / 'html' / 'shared.html'
+    assert ('href="service.html#Service.Users.get:service_method"'
+            in html.read_text())
+
+    # only service.rst is outdated, but shared.html must be rewritten too
+    write_module(tmp_path, 'Service', '', includes=['Shared'])
+    with open(service, 'a') as f:
+        f.write('// Users removed\n')
+    app = build_docs(tmp_path, fake_compiler, freshenv=False)
+    assert ('Used by' not in html.read_text())
+    assert (app.env.get_domain('thrift').used_by(('Shared', 'User')) == [])
+
+
+@pytest.mark.parametrize('symbol_db', [None, 'symbols.db'])
+def test_kind_indices(tmp_path, fake_compiler, symbol_db) -> None:
+    project = make_project(tmp_path)
+    html = project / '_build' / 'html'
+    for _ in range(2):
+        # the second build takes the objects from the rendered fragments
+        app = build_docs(project, fake_compiler,
+                         thrift_render_nodes=True,
+                         thrift_symbol_db=symbol_db)
+        domain = app.env.get_domain('thrift')
+        assert ([key for key, _ in domain.bucket('exception')] == [
+            ('Example', 'InvalidOperation', 'struct')])
+        services = (html / 'thrift-services.html').read_text()
+        assert ('href="index.html#Example.Calculator:service"' in services)
+        assert ('Work' not in services)
+        methods = (html / 'thrift-methods.html').read_text()
+        assert ([methods.index(f'#Example.Calculator.{name}:service_method')
+                 for name in ('calculate', 'ping', 'zip')] ==
+                sorted(methods.index(f'#Example.Calculator.{name}:')
+                       for name in ('calculate', 'ping', 'zip')))
+        exceptions = (html / 'thrift-exceptions.html').read_text()
+        assert ('#Example.InvalidOperation:struct' in exceptions)
+        assert ('#Example.Work:struct' not in exceptions)
+
+    (project / 'index.rst').write_text('Reference\n=========\n')
+    app = build_docs(project, fake_compiler, freshenv=False,
+                     thrift_symbol_db=symbol_db)
+    domain = app.env.get_domain('thrift')
+    for bucket in ('service', 'service_method', 'exception'):
+        assert (list(domain.bucket(bucket)) == [])
+
+
+def test_json_export(tmp_path, fake_compiler) -> None:
+    import json
+
+    project = make_project(tmp_path)
+    build_docs(project, fake_compiler, builder='thriftjson')
+    out = project / '_build' / 'thriftjson'
+    assert (not (out / 'index.html').exists())
+    lines = (out / 'thrift.jsonl').read_text().splitlines()
+    records = {r['anchor']: r for r in map(json.loads, lines)}
+    calculate = records['Example.Calculator.calculate:service_method']
+    assert (calculate['arguments'][1] == {
+        'name': 'w',
+        'key': 2,
+        'type': 'Example.Work',
+        'doc': 'the work'
+    })
+    assert (records['Example.Operation.ADD:enum_field']['value'] == 1)
+    assert (records['None.Example:module']['namespaces'] == {
+        'java': 'com.acme.example'})
+    work = records['Example.Work:struct']
+    assert ((work['docname'], work['uri'], work['doc']) == (
+        'index', 'index.html', 'Some work'))
+
+
+def test_versions(tmp_path, fake_compiler) -> None:
+    for version in ('1.0', '2.0'):
+        directory = tmp_path / version
+        directory.mkdir()
+        write_module(directory, 'Shared', USER)
+        service = write_module(
+            directory, 'Service', USERS, includes=['Shared'])
+        with open(service, 'a') as f:
+            f.write(f'// version {version}\n')
+        name = 'v' + version[0]
+        (tmp_path / f'{name}.rst').write_text(
+            f'{version}\n===\n\n.. thrift:version:: {version}\n\n'
+            f'.. autothrift_module:: {directory / "Shared"}\n\n'
+            f'.. autothrift_module:: {service[:-7]}\n\n'
+            'See :thrift:struct:`User`.\n')
+    (tmp_path / 'index.rst').write_text(
+        'Index\n=====\n\n.. toctree::\n\n   v1\n   v2\n')
+    app = build_docs(tmp_path, fake_compiler)
+    objects = app.env.domaindata['thrift']['objects']
+    assert (objects[('1.0/Shared', 'User', 'struct')] == 'v1')
+    assert (objects[('2.0/Shared', 'User', 'struct')] == 'v2')
+    html = (tmp_path / '_build' / 'html' / 'v2.html').read_text()
+    # return type of Users.get and the reference
+    assert (html.count('href="#2.0/Shared.User:struct"') == 2)
+    # used by
+    assert ('href="#2.0/Service.Users.get:service_method"' in html)
+    assert ('1.0/' not in html)
+    # the identical Shared module is compiled once for both versions
+    cache = tmp_path / '_build' / 'doctrees' / 'thrift'
+    assert (len(list(cache.glob('??/*.ast'))) == 3)
+
+
+def test_node_rendering_reuses_definitions(tmp_path, fake_compiler,
+                                           monkeypatch) -> None:
+    from sphinx_thrift.documenter import _NodeGenerator
+
+    project = make_project(tmp_path)
+    first = build_docs(project, fake_compiler, thrift_render_nodes=True)
+    tree = first.env.get_doctree('index').pformat()
+    runs = []
+    run = _NodeGenerator._run
+
+    def counting_run(self, name, attributes, lines):
+        runs.append(name)
+        run(self, name, attributes, lines)
+
+    monkeypatch.setattr(_NodeGenerator, '_run', counting_run)
+    again = build_docs(project, fake_compiler, thrift_render_nodes=True)
+    assert (runs == ['Example'])
+    assert (again.env.get_doctree('index').pformat() == tree)
+    objects = again.env.domaindata['thrift']['objects']
+    assert (objects[('Example', 'Calculator.zip', 'service_method')] ==
+            'index')
+
+    write_module(project, 'Example', EXAMPLE.replace('first', 'the first'))
+    with open(project / 'Example.thrift', 'a') as f:
+        f.write('// changed\n')
+    runs.clear()
+    build_docs(project, fake_compiler, thrift_render_nodes=True)
+    assert (runs == ['Example', 'Work', 'num1', 'op', 'tags', 'Work'])
@@ -0,0 +1,79 @@
+import stat
+import sys
+
+import sphinx_thrift.graphs as graphs
+from sphinx_thrift.graphs import GraphRenderer, include_graph, struct_graph
+from sphinx_thrift.thrift_ast import Field, Module, ReferenceType, Struct
+
+from test.conftest import build_docs, write_module
+
+
+def make_module() -> Module:
+    user = ReferenceType(module='Shared', name='User')
+    fields = [
+        Field(key=1, name='owner', type_=user),
+        Field(key=2, name='parent', type_=ReferenceType('Example', 'Node'))
+    ]
+    return Module('Example', [], [], [], [Struct('Node', False, False, fields)],
+                  [], [])
+
+
+def test_graphs(tmp_path) -> None:
+    module = make_module()
+    # includes are drawn whether types of the module are used or not
+    write_module(tmp_path, 'Base', '')
+    write_module(tmp_path, 'Shared', '', includes=['Base'])
+    write_module(tmp_path, 'Constants', '', includes=['Base'])
+    example = write_module(tmp_path, 'Example', '',
+                           includes=['Shared', 'Constants', 'Missing'])
+    assert (include_graph(example) == (
+        ['Base', 'Constants', 'Example', 'Missing', 'Shared'],
+        [('Constants', 'Base', ''), ('Example', 'Constants', ''),
+         ('Example', 'Missing', ''), ('Example', 'Shared', ''),
+         ('Shared', 'Base', '')]))
+    assert (struct_graph(module) == (['Node', 'Shared.User'], [
+        ('Node', 'Node', 'parent'), ('Node', 'Shared.User', 'owner')
+    ]))
+
+
+def test_render_is_cached(tmp_path, monkeypatch) -> None:
+    renderer = GraphRenderer(str(tmp_path), dot=str(tmp_path / 'no-dot'))
+    svg = renderer.render('Example', struct_graph(make_module()))
+    assert ('>Shared.User</text>' in svg)
+
+    def fail(graph):
+        raise AssertionError('graph rendered again')
+
+    monkeypatch.setattr(graphs, 'layered_svg', fail)
+    assert (renderer.render('Example', struct_graph(make_module())) == svg)
+
+
+def test_failing_dot_runs_once(tmp_path) -> None:
+    log = tmp_path / 'dot.log'
+    dot = tmp_path / 'broken-dot'
+    dot.write_text(f'#!{sys.executable}\n'
+                   f'open({str(log)!r}, "a").write("run\\n")\n'
+                   'raise SystemExit(1)\n')
+    dot.chmod(dot.stat().st_mode | stat.S_IEXEC)
+    renderer = GraphRenderer(str(tmp_path / 'cache'), dot=str(dot))
+    svg = renderer.render('Example', struct_graph(make_module()))
+    assert ('>Shared.User</text>' in svg)
+    # the drawing replacing the one of dot is reused for the graph
+    assert (renderer.render('Example', struct_graph(make_module())) == svg)
+    assert (log.read_text() == 'run\n')
+
+
+def test_graph_directive(tmp_path, fake_compiler) -> None:
+    write_module(tmp_path, 'Shared', '<struct name="User" />')
+    example = write_module(
+        tmp_path, 'Example', '''
+<struct name="Node">
+  <field name="owner" field-id="1" type="id" type-module="Shared" type-id="User" />
+</struct>''', includes=['Shared'])
+    (tmp_path / 'index.rst').write_text(
+        f'Graph\n=====\n\n.. autothrift_graph:: {example[:-7]}\n'
+        '   :graph: structs\n')
+    build_docs(tmp_path, fake_compiler, thrift_dot='no-dot')
+    html = (tmp_path / '_build' / 'html' / 'index.html').read_text()
+    assert ('<div class="thrift-graph"><svg' in html)
+    assert ('>owner</text>' in html)
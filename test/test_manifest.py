@@ -0,0 +1,57 @@
+import json
+
+from sphinx_thrift import cli
+from sphinx_thrift.manifest import changed_files, file_hashes, read_manifest
+from sphinx_thrift.shards import build_shards
+
+from test.conftest import build_docs, write_module
+from test.test_shards import USER, make_project
+
+
+def test_unchanged_modules_give_identical_files(tmp_path,
+                                                fake_compiler) -> None:
+    src = make_project(tmp_path)
+    build_docs(src, fake_compiler, thrift_manifest='manifest.json')
+    manifest = src / '_build' / 'html' / 'manifest.json'
+    first = read_manifest(str(manifest))
+    assert ('shared.html' in first and 'manifest.json' not in first)
+
+    # reading a page again in an incremental build changes nothing
+    shared = (src / 'shared.rst').read_text()
+    (src / 'shared.rst').write_text(shared + '\n')
+    build_docs(src, fake_compiler, freshenv=False,
+               thrift_manifest='manifest.json')
+    (src / 'shared.rst').write_text(shared)
+    build_docs(src, fake_compiler, freshenv=False,
+               thrift_manifest='manifest.json')
+    assert (read_manifest(str(manifest)) == first)
+
+    old = tmp_path / 'old.json'
+    old.write_text(manifest.read_text())
+    write_module(src, 'Shared', USER.replace('A user', 'Somebody'))
+    with open(src / 'Shared.thrift', 'a') as f:
+        f.write('// changed\n')
+    build_docs(src, fake_compiler, freshenv=False,
+               thrift_manifest='manifest.json')
+    changes, removed = changed_files(first, read_manifest(str(manifest)))
+    assert ('shared.html' in changes and 'users.html' not in changes)
+    assert ('index.html' not in changes and removed == [])
+
+    assert (cli.main(['changed', str(old), str(manifest)]) == 0)
+    assert (cli.main(['changed', str(tmp_path / 'none.json'),
+                      str(manifest)]) == 0)
+
+
+def test_merged_shards_have_their_manifest(tmp_path, fake_compiler) -> None:
+    src = make_project(tmp_path)
+    merged = tmp_path / 'merged'
+    assert (build_shards(str(src),
+                         str(merged),
+                         2,
+                         jobs=2,
+                         overrides={
+                             'thrift_compiler': fake_compiler,
+                             'thrift_manifest': 'manifest.json'
+                         }) == 0)
+    manifest = json.loads((merged / 'manifest.json').read_text())
+    assert (manifest['files'] == file_hashes(str(merged), ('manifest.json', )))
@@ -0,0 +1,143 @@
+import gc
+import os
+import pickle
+import tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+from sphinx_thrift.cache import ModuleCache, _memory, _paths
+
+from test.conftest import build_docs, write_module
+
+# Memory budgets as multiples of the size of the XML the compiler writes for
+# a module, about one and a half times what was measured when they were set.
+# Memory must also grow linearly with the module: relative to its size, a
+# module four times as large may take at most a tenth more than the smaller
+# one. A failure means memory use grew; raise a budget only knowing why.
+COMPILE_PEAK = 11.0  # compiling, parsing and caching a module
+LOADED = 0.6  # a module loaded from the cache, before decoding definitions
+DECODED = 4.0  # ... once all its definitions are decoded
+DOMAIN_DATA = 7.0  # the domain data of a page documenting the module
+DOCTREE = 450.0  # its doctree, with nodes rendered directly
+GROWTH = 1.1
+
+
+def synthetic_idl(scale: int, name: str) -> Tuple[str, int]:
+    """The XML of the module ``name`` with ``scale`` structs of 10 fields
+    each, an enum and a service per 10 structs, and the number of objects in
+    it."""
+    parts = []
+    objects = 0
+    for s in range(scale):
+        fields = ''.join(
+            f'<field name="f{f}" field-id="{f + 1}" type="id" '
+            f'type-module="{name}" type-id="S{(s + f) % scale}" '
+            f'doc="Field {f} of S{s}" />' if f % 2 else
+            f'<field name="f{f}" field-id="{f + 1}" type="i64" />'
+            for f in range(10))
+        parts.append(f'<struct name="S{s}" doc="Struct {s}">{fields}</struct>')
+        objects += 11
+    for e in range(scale // 10):
+        members = ''.join(f'<member name="M{m}" value="{m}" />'
+                          for m in range(10))
+        parts.append(f'<enum name="E{e}" doc="Enum {e}">{members}</enum>')
+        methods = ''.join(
+            f'<method name="m{m}" doc="Method {m}">'
+            f'<returns type="id" type-module="{name}" type-id="S{m}" />'
+            f'<arg name="id" field-id="1" type="i64" /></method>'
+            for m in range(10))
+        parts.append(f'<service name="Service{e}">{methods}</service>')
+        objects += 11 + 21
+    return '\n'.join(parts), objects
+
+
+def traced(function: Callable[[], Any]) -> Tuple[Any, int, int]:
+    """The result of ``function`` with the memory it allocated and still
+    holds, and its peak allocation."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, retained, peak
+
+
+def decode(module: Any) -> list:
+    """All definitions of ``module``, decoded."""
+    return [
+        definition
+        for definitions in (module.enums, module.typedefs, module.structs,
+                            module.constants, module.services)
+        for definition in definitions
+    ]
+
+
+def module_memory(tmp_path, fake_compiler, scale: int) -> Dict[str, float]:
+    """The memory of a module of ``scale`` loaded through `ModuleCache`, as
+    multiples of the size of its XML."""
+    body, _ = synthetic_idl(scale, f'Big{scale}')
+    thrift = write_module(tmp_path, f'Big{scale}', body)
+    source = os.path.getsize(thrift[:-7] + '.xml')
+    cache = ModuleCache(str(tmp_path / 'cache'), fake_compiler)
+    key = cache.key(thrift)
+    _, _, compile_peak = traced(lambda: cache.load(thrift, key))
+    # loaded again from the file in the cache
+    del _memory[key], _paths[os.path.abspath(thrift)]
+    module, loaded, _ = traced(lambda: cache.load(thrift, key))
+    assert (len(module.structs) == scale)
+    _, decoded, _ = traced(lambda: decode(module))
+    del _memory[key], _paths[os.path.abspath(thrift)]
+    measured = {
+        'compile_peak': compile_peak,
+        'loaded': loaded,
+        'decoded': decoded
+    }
+    return {name: value / source for name, value in measured.items()}
+
+
+def test_module_memory(tmp_path, fake_compiler) -> None:
+    small = module_memory(tmp_path, fake_compiler, 250)
+    large = module_memory(tmp_path, fake_compiler, 1000)
+    assert (large['compile_peak'] <= COMPILE_PEAK)
+    assert (large['loaded'] <= LOADED)
+    assert (large['decoded'] <= DECODED)
+    for name, value in large.items():
+        assert (value <= small[name] * GROWTH), name
+
+
+def loaded_size(value: Any) -> int:
+    """Memory taken by ``value`` once loaded, the way Sphinx loads the
+    environment and doctrees."""
+    pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return traced(lambda: pickle.loads(pickled))[1]
+
+
+def page_memory(tmp_path, fake_compiler, scale: int) -> Dict[str, float]:
+    """The memory of the domain data and doctree of a page documenting a
+    module of ``scale``, as multiples of the size of its XML."""
+    project = tmp_path / str(scale)
+    project.mkdir()
+    body, objects = synthetic_idl(scale, f'Big{scale}')
+    thrift = write_module(project, f'Big{scale}', body)
+    source = os.path.getsize(thrift[:-7] + '.xml')
+    (project / 'index.rst').write_text(
+        f'Big\n===\n\n.. autothrift_module:: {thrift[:-7]}\n')
+    app = build_docs(project, fake_compiler, thrift_render_nodes=True)
+    data = app.env.domaindata['thrift']
+    # method arguments are not objects of the domain, the module is
+    assert (len(data['objects']) == objects - scale + 1)
+    measured = {
+        'domain_data': loaded_size(data),
+        'doctree': loaded_size(app.env.get_doctree('index'))
+    }
+    return {name: value / source for name, value in measured.items()}
+
+
+def test_domain_data_and_doctree_memory(tmp_path, fake_compiler) -> None:
+    small = page_memory(tmp_path, fake_compiler, 30)
+    large = page_memory(tmp_path, fake_compiler, 120)
+    assert (large['domain_data'] <= DOMAIN_DATA)
+    assert (large['doctree'] <= DOCTREE)
+    for name, value in large.items():
+        assert (value <= small[name] * GROWTH), name
@@ -0,0 +1,38 @@
+from sphinx_thrift.names import QualifiedNameIndex
+
+
+def make_index() -> QualifiedNameIndex:
+    index: QualifiedNameIndex = QualifiedNameIndex()
+    index.add('a.User', 'A', 'User', ['com.acme.a', 'a'])
+    index.add('a.User.id', 'A', 'User.id', ['com.acme.a', 'a'])
+    index.add('b.User', 'B', 'User', ['com.acme.b'])
+    index.add('module A', None, 'A')
+    return index
+
+
+def test_qualified_names() -> None:
+    index = make_index()
+    assert (index.lookup('A.User') == 'a.User')
+    assert (index.lookup('com.acme.a.User') == 'a.User')
+    assert (index.lookup('acme.b.User') == 'b.User')
+    assert (index.lookup('b.User') == 'b.User')
+    assert (index.lookup('User.id') == 'a.User.id')
+    assert (index.lookup('id') == 'a.User.id')
+    assert (index.lookup('A') == 'module A')
+    assert (index.lookup('C.User') is None)
+
+
+def test_ambiguous_names() -> None:
+    index = make_index()
+    assert (index.lookup('User') is None)
+    assert (index.candidates('User') == ['a.User', 'b.User'])
+    assert (index.ambiguous() == {'User': ['a.User', 'b.User']})
+
+
+def test_qualified_names_win_over_partial_ones() -> None:
+    index: QualifiedNameIndex = QualifiedNameIndex()
+    index.add('user', 'Api', 'User', ['com.acme'])
+    # "com.acme.User" is only a partial name of this one
+    index.add('other user', 'Other', 'User', ['org.com.acme'])
+    assert (index.lookup('com.acme.User') == 'user')
+    assert (index.lookup('acme.User') is None)
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+from test.conftest import build_docs, write_module
+
+SHARED = '''
+<struct name="User" doc="A user">
+  <field name="id" field-id="1" type="i64" />
+</struct>
+<exception name="NotFound" />
+'''
+
+SERVICE = '''
+<service name="{name}">
+  <method name="get">
+    <returns type="id" type-module="Shared" type-id="User" />
+    <throws name="e" field-id="1" type="id" type-module="Shared" type-id="NotFound" />
+  </method>
+  <method name="put">
+    <returns type="void" />
+    <arg name="user" field-id="1" type="id" type-module="Shared" type-id="User" />
+  </method>
+</service>
+'''
+
+# more documents than Sphinx reads serially
+SERVICES = 8
+
+
+def make_project(directory):
+    directory.mkdir()
+    shared = write_module(directory, 'Shared', SHARED)
+    pages = ['shared']
+    (directory / 'shared.rst').write_text(
+        f'Shared\n======\n\n.. autothrift_module:: {shared[:-7]}\n')
+    for i in range(SERVICES):
+        name = f'Service{i}'
+        path = write_module(directory, name, SERVICE.format(name=f'Users{i}'),
+                            includes=['Shared'])
+        pages.append(name.lower())
+        (directory / f'{name.lower()}.rst').write_text(
+            f'{name}\n{"=" * len(name)}\n\n'
+            f'.. autothrift_module:: {path[:-7]}\n')
+    (directory / 'index.rst').write_text(
+        'Index\n=====\n\n.. toctree::\n\n' +
+        ''.join(f'   {page}\n' for page in pages))
+    return directory
+
+
+def domain_state(app):
+    domain = app.env.get_domain('thrift')
+    return {
+        'objects': sorted(domain.objects.items(), key=str),
+        'used_by': sorted(domain.used_by(('Shared', 'User'))),
+        'indices': [index(domain).generate() for index in domain.indices]
+    }
+
+
+@pytest.mark.parametrize('symbol_db', [None, 'symbols.db'])
+def test_parallel_build_matches_serial_build(tmp_path, fake_compiler,
+                                             symbol_db) -> None:
+    serial = build_docs(make_project(tmp_path / 'serial'), fake_compiler,
+                        thrift_symbol_db=symbol_db)
+    warnings = io.StringIO()
+    parallel = build_docs(make_project(tmp_path / 'parallel'),
+                          fake_compiler,
+                          warning=warnings,
+                          parallel=4,
+                          thrift_symbol_db=symbol_db)
+    assert (parallel.is_parallel_allowed('read'))
+    assert ('serial' not in warnings.getvalue())
+    state = domain_state(serial)
+    assert (len(state['used_by']) == 2 * SERVICES)
+    assert (domain_state(parallel) == state)
+    html = tmp_path / 'parallel' / '_build' / 'html'
+    assert ('href="service3.html#Service3.Users3.put:service_method"'
+            in (html / 'shared.html').read_text())
@@ -101,13 +101,16 @@ def test_nested_list_parser() -> None:
 constant_parser_data = [
     ('<const name="Variable" type="string" doc="documentation"><string>value</string></const>',
      ast.Constant(
-         name='Variable', type_='string', doc='documentation', value=None)),
+         name='Variable',
+         type_='string',
+         doc='documentation',
+         value=ast.ConstantValue('"value"'))),
     ('<const name="Variable" type="list" doc="documentation"><valueType type="double" /><list /></const>',
      ast.Constant(
          name='Variable',
          type_=ast.ListType('double'),
          doc='documentation',
-         value=None))
+         value=ast.ConstantValue('[0:0:')))
 ]
 
 
@@ -202,3 +205,54 @@ def test_method_parser() -> None:
         returnType='void',
         arguments=[ast.Field(name='logid', key=1, type_='i32')])
     assert (parser.parse_method(tree) == expected)
+
+
+def test_parse_stream() -> None:
+    source = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<idl xmlns="http://thrift.apache.org/xml/idl">'
+              '<document name="Example" doc="docs">'
+              '<exception name="Failed" />'
+              '<struct name="User" />'
+              '<enum name="Color"><member name="RED" value="1" /></enum>'
+              '</document></idl>').encode('utf-8')
+    # byte by byte, definitions complete at any point of the input
+    module = parser.parse_stream(source[i:i + 1] for i in range(len(source)))
+    assert (module.name == 'Example')
+    assert (module.doc == 'docs')
+    # structs before exceptions, as for a complete tree
+    assert ([s.name for s in module.structs] == ['User', 'Failed'])
+    assert (module.enums[0].name == 'Color')
+    with pytest.raises(ET.ParseError):
+        parser.parse_stream([source[:-20]])
+
+
+def test_constant_value() -> None:
+    tree = ET.fromstring('''
+    <const name="Table" type="map">
+      <keyType type="i32" /><valueType type="list"><elemType type="string" /></valueType>
+      <map>
+        <entry><key><int>1</int></key><value><list><entry><string>a</string></entry></list></value></entry>
+        <entry><key><int>2</int></key><value><list /></value></entry>
+      </map>
+    </const>''')
+    value = parser.parse_constant(tree).value
+    assert (value is not None)
+    assert (value.format() == '{1: ["a"], 2: []}')
+    assert (value.format(max_items=1) == '{1: ["a"], ... 1 more}')
+    assert (value.format(max_length=6) == '{1: [" ...')
+    # separators in strings are kept as they are
+    tree = ET.fromstring('<const name="Names" type="list">'
+                         '<elemType type="string" /><list>'
+                         '<string>a:b, [c</string><string>d</string></list>'
+                         '</const>')
+    value = parser.parse_constant(tree).value
+    assert (value is not None)
+    assert (value.format() == '["a:b, [c", "d"]')
+
+
+def test_constant_value_is_decoded_as_far_as_shown() -> None:
+    # the entries not shown are never decoded
+    value = ast.ConstantValue('[3:11:1,2,garbage')
+    assert (value.format(max_items=2) == '[1, 2, ... 1 more]')
+    value = ast.ConstantValue('[2:8:"a",junk')
+    assert (value.format(max_length=2) == '[" ...')
@@ -0,0 +1,125 @@
+import io
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+from sphinx_thrift.cache import ModuleCache, ThriftError, locked
+from sphinx_thrift.scheduler import CompileScheduler
+
+from test.conftest import FAKE_COMPILER, build_docs, write_module
+
+# runs the fake compiler after logging its start and end to LOG and waiting
+# DELAY seconds
+SLOW_COMPILER = '''\
+#!{python}
+import subprocess, sys, time
+with open({log!r}, 'a') as f:
+    f.write('start\\n')
+time.sleep({delay})
+status = subprocess.call([{fake!r}] + sys.argv[1:])
+with open({log!r}, 'a') as f:
+    f.write('end\\n')
+sys.exit(status)
+'''
+
+USER = '<struct name="User" doc="A user" />'
+
+
+def slow_compiler(tmp_path, fake_compiler, delay: float) -> str:
+    path = tmp_path / 'slow-thrift'
+    path.write_text(
+        SLOW_COMPILER.format(python=sys.executable,
+                             log=str(tmp_path / 'compiler.log'),
+                             delay=delay,
+                             fake=fake_compiler))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_failures_are_isolated(tmp_path, fake_compiler) -> None:
+    good = write_module(tmp_path, 'Good', USER)
+    broken = tmp_path / 'Broken.thrift'
+    broken.write_text('struct {')
+    (tmp_path / 'index.rst').write_text(
+        'Index\n=====\n\n.. toctree::\n\n   good\n   broken\n')
+    (tmp_path / 'good.rst').write_text(
+        f'Good\n====\n\n.. autothrift_module:: {good[:-7]}\n')
+    (tmp_path / 'broken.rst').write_text(
+        f'Broken\n======\n\n.. autothrift_module:: {str(broken)[:-7]}\n')
+    warnings = io.StringIO()
+    app = build_docs(tmp_path, fake_compiler, warning=warnings)
+    assert (app.statuscode == 0)
+    # the compiler's location of the problem
+    assert (f'{broken}:1: WARNING: cannot compile' in warnings.getvalue())
+    html = tmp_path / '_build' / 'html'
+    assert ('id="Good.User:struct"' in (html / 'good.html').read_text())
+    assert ('Broken' in (html / 'broken.html').read_text())
+
+
+def test_hung_compilers_are_stopped(tmp_path, fake_compiler) -> None:
+    good = write_module(tmp_path, 'Good', USER)
+    (tmp_path / 'index.rst').write_text(
+        f'Index\n=====\n\n.. autothrift_module:: {good[:-7]}\n')
+    warnings = io.StringIO()
+    start = time.monotonic()
+    build_docs(tmp_path,
+               slow_compiler(tmp_path, fake_compiler, 30),
+               warning=warnings,
+               thrift_compile_timeout=0.5)
+    assert (time.monotonic() - start < 20)
+    assert ('did not finish within 0.5 seconds' in warnings.getvalue())
+    # compiled once, not again when the page is read
+    log = (tmp_path / 'compiler.log').read_text()
+    assert (log == 'start\n')
+
+
+def test_load_stops_hung_compiler(tmp_path, fake_compiler) -> None:
+    good = write_module(tmp_path, 'Good', USER)
+    cache = ModuleCache(str(tmp_path / 'cache'),
+                        slow_compiler(tmp_path, fake_compiler, 30),
+                        timeout=0.5)
+    with pytest.raises(ThriftError, match='did not finish'):
+        cache.load(good)
+
+
+def test_concurrency_is_bounded(tmp_path, fake_compiler) -> None:
+    paths = [write_module(tmp_path, f'M{i}', USER) for i in range(5)]
+    broken = str(tmp_path / 'Broken.thrift')
+    with open(broken, 'w') as f:
+        f.write('struct {')
+    cache = ModuleCache(str(tmp_path / 'cache'),
+                        slow_compiler(tmp_path, fake_compiler, 0.2))
+    results = CompileScheduler(cache, jobs=2).compile(paths + [broken])
+    assert ([results[p] for p in paths] == [None] * 5)
+    assert (isinstance(results[broken], ThriftError))
+    running = most = 0
+    for line in (tmp_path / 'compiler.log').read_text().splitlines():
+        running += 1 if line == 'start' else -1
+        most = max(most, running)
+    assert (most == 2)
+    # the compiled modules are in the cache, the failure is remembered
+    assert (cache.load(paths[0]).structs[0].name == 'User')
+    with pytest.raises(ThriftError):
+        cache.load(broken)
+
+
+def test_waits_for_modules_compiled_elsewhere(tmp_path, fake_compiler) -> None:
+    good = write_module(tmp_path, 'Good', USER)
+    cache = ModuleCache(str(tmp_path / 'cache'), fake_compiler)
+    key = cache.key(good)
+    results = {}
+    scheduler = CompileScheduler(cache)
+    # held like another process compiling the module would
+    with locked(cache.directory, cache.lock_name(key)):
+        thread = threading.Thread(
+            target=lambda: results.update(scheduler.compile([good])))
+        thread.start()
+        time.sleep(0.2)
+        assert (thread.is_alive())
+    thread.join()
+    assert (results == {good: None})
+    assert (os.path.exists(cache.path(key)))
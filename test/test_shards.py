@@ -0,0 +1,64 @@
+import json
+
+from sphinx_thrift.shards import build_shards, shard_of
+
+from test.conftest import build_docs, write_module
+
+USER = '''
+<struct name="User" doc="A user">
+  <field name="id" field-id="1" type="i64" />
+</struct>
+'''
+
+USERS = '''
+<service name="Users">
+  <method name="get">
+    <returns type="id" type-module="Shared" type-id="User" />
+  </method>
+</service>
+'''
+
+
+def make_project(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    shared = write_module(src, 'Shared', USER)
+    service = write_module(src, 'Service', USERS, includes=['Shared'])
+    (src / 'conf.py').write_text(
+        "extensions = ['sphinx.ext.autodoc', 'sphinx_thrift']\n")
+    (src / 'index.rst').write_text(
+        'Index\n=====\n\n.. toctree::\n   :maxdepth: 2\n\n   shared\n   users\n')
+    (src / 'shared.rst').write_text(
+        f'Shared\n======\n\n.. autothrift_module:: {shared[:-7]}\n')
+    (src / 'users.rst').write_text(
+        f'Users\n=====\n\nSee :thrift:struct:`User`.\n\n'
+        f'.. autothrift_module:: {service[:-7]}\n')
+    return src
+
+
+def test_sharded_build_matches_single_build(tmp_path, fake_compiler) -> None:
+    # the two modules are rendered by different shards
+    assert (shard_of('shared', 2) != shard_of('users', 2))
+    src = make_project(tmp_path)
+    build_docs(src, fake_compiler)
+    single = src / '_build' / 'html'
+    merged = tmp_path / 'merged'
+    status = build_shards(str(src),
+                          str(merged),
+                          2,
+                          jobs=2,
+                          overrides={'thrift_compiler': fake_compiler})
+    assert (status == 0)
+    for page in ('index.html', 'shared.html', 'users.html',
+                 'thrift-modindex.html'):
+        assert ((merged / page).read_text() == (single / page).read_text())
+    users = (merged / 'users.html').read_text()
+    assert ('href="shared.html#Shared.User:struct"' in users)
+    assert ('href="users.html#Service.Users.get:service_method"'
+            in (merged / 'shared.html').read_text())
+
+    def search_index(directory):
+        text = (directory / 'searchindex.js').read_text()
+        return json.loads(text[text.index('(') + 1:text.rindex(')')])
+
+    assert (search_index(merged) == search_index(single))
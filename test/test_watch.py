@@ -0,0 +1,86 @@
+import io
+import re
+
+from sphinx_thrift.watch import Watcher
+
+from test.conftest import write_module
+
+SHARED = '''
+<struct name="User">
+  <field name="id" field-id="1" type="i64" />
+</struct>
+'''
+
+
+def test_rebuilds_pages_of_changed_modules(tmp_path, fake_compiler,
+                                           capsys) -> None:
+    write_module(tmp_path, 'Shared', SHARED)
+    service = write_module(tmp_path, 'Service', '', includes=['Shared'])
+    other = write_module(tmp_path, 'Other', '')
+    (tmp_path / 'conf.py').write_text(
+        "extensions = ['sphinx.ext.autodoc', 'sphinx_thrift']\n")
+    (tmp_path / 'index.rst').write_text(
+        'Index\n=====\n\n.. toctree::\n\n   service\n   other\n')
+    (tmp_path / 'service.rst').write_text(
+        f'Service\n=======\n\n.. autothrift_module:: {service[:-7]}\n')
+    (tmp_path / 'other.rst').write_text(
+        f'Other\n=====\n\n.. autothrift_module:: {other[:-7]}\n')
+    status = io.StringIO()
+    watcher = Watcher(
+        str(tmp_path),
+        str(tmp_path / '_build'),
+        confoverrides={'thrift_compiler': fake_compiler},
+        status=status)
+    watcher.build()
+    assert (watcher.changed() == [])
+
+    shared = tmp_path / 'Shared.thrift'
+    shared.write_text('// changed\n')
+    assert (watcher.changed() == [str(shared)])
+    assert (watcher.dependents[str(shared)] == ['service'])
+
+    status.seek(0)
+    status.truncate()
+    watcher.build()
+    output = re.sub('\x1b\\[[0-9;]*m', '', status.getvalue())
+    assert ('0 added, 1 changed, 0 removed' in output)
+    assert ('reading sources... [100%] service' in output)
+    # nodes and directives are registered anew, without warnings
+    assert ('already registered' not in capsys.readouterr().err)
+    assert (watcher.changed() == [])
+
+
+def test_notices_added_and_removed_files(tmp_path, fake_compiler) -> None:
+    docs = tmp_path / 'docs'
+    idl = tmp_path / 'idl'
+    docs.mkdir()
+    idl.mkdir()
+    service = write_module(idl, 'Service', '')
+    (docs / 'conf.py').write_text(
+        "extensions = ['sphinx.ext.autodoc', 'sphinx_thrift']\n")
+    (docs / 'index.rst').write_text(
+        'Index\n=====\n\n.. toctree::\n\n   service\n')
+    (docs / 'service.rst').write_text(
+        f'Service\n=======\n\n.. autothrift_module:: {service[:-7]}\n')
+    watcher = Watcher(
+        str(docs),
+        str(docs / '_build'),
+        confoverrides={'thrift_compiler': fake_compiler},
+        status=None)
+    watcher.build()
+    assert (watcher.changed() == [])
+
+    page = docs / 'other.rst'
+    page.write_text('Other\n=====\n')
+    module = idl / 'nested' / 'Other.thrift'
+    module.parent.mkdir()
+    module.write_text('')
+    # files in the build directory are not sources
+    (docs / '_build' / 'new.rst').write_text('')
+    assert (watcher.changed() == [str(page), str(module)])
+
+    watcher.build()
+    assert (watcher.changed() == [])
+    page.unlink()
+    module.unlink()
+    assert (watcher.changed() == [str(page), str(module)])